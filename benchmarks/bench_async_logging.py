@@ -0,0 +1,80 @@
+"""Benchmarks the latency of the iterations of a loop that logs like the commenter loop, with the
+log records written synchronously by the loop and with the asynchronous (queue-backed) logging.
+
+The log file is written through a handler that sleeps `--disk-latency` ms on every flush to
+simulate a slow disk.
+
+Example:
+    python -m benchmarks.bench_async_logging --iterations 500 --disk-latency 2
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from youbot import AsyncLogging, ColorLogger
+
+
+class SlowFileHandler(logging.FileHandler):
+
+    def __init__(self, filename: str, latency: float) -> None:
+        super().__init__(filename)
+        self.latency = latency
+
+    def flush(self) -> None:
+        super().flush()
+        time.sleep(self.latency)
+
+
+def run_loop(logger: ColorLogger, iterations: int, records: int) -> list:
+    """ Returns the latency of every iteration in ms. """
+
+    latencies = []
+    for ind in range(iterations):
+        start = time.perf_counter()
+        sum(range(2000))  # The work of the iteration
+        for record in range(records):
+            logger.info(f"Iteration {ind}: will comment on https://youtube.com/watch?v={record}")
+            logger.debug(f"Iteration {ind}: {record} uploads checked")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summary(latencies: list) -> str:
+    percentiles = statistics.quantiles(latencies, n=100)
+    return f'p50: {percentiles[49]:8.3f} ms  p99: {percentiles[98]:8.3f} ms  ' \
+           f'max: {max(latencies):8.3f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the loop latency with sync and async logging.')
+    parser.add_argument('--iterations', type=int, default=500, help='Number of loop iterations')
+    parser.add_argument('--records', type=int, default=3, help='Info (and debug) records per iteration')
+    parser.add_argument('--disk-latency', type=float, default=2, help='Ms per write of the log file')
+    args = parser.parse_args()
+
+    ColorLogger.log_level = logging.DEBUG
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler = SlowFileHandler(os.path.join(tmp_dir, 'bench.log'), args.disk_latency / 1000)
+        handler.setFormatter(logging.Formatter(fmt=ColorLogger.log_fmt, datefmt=ColorLogger.log_date_fmt))
+        logger = ColorLogger(logger_name='BenchAsyncLogging')
+        logging.getLogger('BenchAsyncLogging').handlers = [handler]
+        sync_latencies = run_loop(logger, args.iterations, args.records)
+
+        async_logging = AsyncLogging(queue_size=10000, handlers=[handler]).start()
+        async_latencies = run_loop(logger, args.iterations, args.records)
+        start = time.perf_counter()
+        async_logging.stop()
+        drain_time = time.perf_counter() - start
+        handler.close()
+
+    print(f'sync  logging: {summary(sync_latencies)}')
+    print(f'async logging: {summary(async_latencies)}  '
+          f'(queue drained in {drain_time:.2f} s, {async_logging.queue.dropped} records dropped)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Benchmarks the batched, parallel and asyncio detection paths against the sequential
+`get_uploads`.
+
+Example:
+    python -m benchmarks.bench_batch_uploads --channels 300 --latency 0.02
+"""
+
+import argparse
+import time
+
+from benchmarks.fake_youtube import FakeYoutubeServer, build_fake_youtube
+
+
+def run(youtube, method: str, channels, fake: FakeYoutubeServer):
+    fake.round_trips = 0
+    fake.not_modified = 0
+    start = time.perf_counter()
+    uploads = list(getattr(youtube, method)(channels=channels, max_posted_hours=2))
+    return time.perf_counter() - start, len(uploads), fake.round_trips, fake.not_modified
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the uploads detection paths.')
+    parser.add_argument('--channels', type=int, default=300, help='Number of channels')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds of latency per HTTP round trip')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    channels = [f'UC{ind:022d}' for ind in range(args.channels)]
+    fake = FakeYoutubeServer(channels, latency=args.latency).start()
+    try:
+        for method in ('get_uploads', 'get_uploads_batch', 'get_uploads_parallel',
+                       'get_uploads_async'):
+            youtube = build_fake_youtube(fake, channels)
+            first_cycle = run(youtube, method, channels, fake)
+            timings = [run(youtube, method, channels, fake) for _ in range(args.repeats)]
+            best, uploads, round_trips, not_modified = min(timings)
+            print(f'{method:<20} first: {first_cycle[0] * 1000:9.1f} ms  '
+                  f'best: {best * 1000:9.1f} ms  uploads: {uploads:4d}  '
+                  f'round trips: {round_trips:4d}  not modified: {not_modified:4d}  '
+                  f'cache: {youtube.playlist_cache}')
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
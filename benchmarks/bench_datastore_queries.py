@@ -0,0 +1,112 @@
+"""Benchmarks the throughput of `get_comments` and `update_comment` with the prepared statements
+of the datastore against the f-string statements (text protocol) it used to send, and of the
+statements whose SQL changes with the number of values (IN lists of random lengths) prepared
+against sent through the text protocol.
+
+It needs a MySQL server: the datastore config of the specified file is used, but the benchmark
+only touches its own `bench_channels` and `bench_comments` tables, which are dropped at the end.
+
+Example:
+    python -m benchmarks.bench_datastore_queries -c confs/generic.yml --comments 10000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from youbot import Configuration, YoutubeMySqlDatastore
+
+
+class BenchDatastore(YoutubeMySqlDatastore):
+    CHANNEL_TABLE = 'bench_channels'
+    COMMENTS_TABLE = 'bench_comments'
+
+
+def legacy_get_comments(db: BenchDatastore, channel_id: str, n_recent: int):
+    """ The statement `get_comments` used to build, with the values in the SQL text. """
+
+    query = f"SELECT video_link,comment,comment_time FROM {db.COMMENTS_TABLE} " \
+            f"WHERE like_count>=-1 AND reply_count>=-1 AND like_count<=999999 AND " \
+            f"reply_count<=999999 AND channel_id='{channel_id}' " \
+            f"ORDER BY comment_time desc LIMIT {n_recent}"
+    db._cursor.execute(query)
+    return db._cursor.fetchall()
+
+
+def legacy_update_comment(db: BenchDatastore, video_link: str, like_cnt: int, title: str):
+    """ The statement `update_comment` used to build, with the quotes escaped by hand. """
+
+    video_id = video_link.split('v=')[1]
+    title = title.replace("'", "''")
+    db._cursor.execute(f"UPDATE {db.COMMENTS_TABLE} SET video_id='{video_id}', "
+                       f"like_count='{like_cnt}', video_title='{title}' "
+                       f"WHERE video_link='{video_link}'")
+
+
+def in_list_select(db: BenchDatastore, video_links: list, prepared: bool):
+    """ A select of a random number of comments, a new SQL text for every length. """
+
+    chunk_links = random.sample(video_links, random.randint(1, 200))
+    return db.execute(f"SELECT video_link, like_count FROM {db.COMMENTS_TABLE} "
+                      f"WHERE video_link IN ({', '.join(['%s'] * len(chunk_links))})",
+                      chunk_links, prepared=prepared)
+
+
+def throughput(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the datastore statement throughput.')
+    parser.add_argument('-c', '--config-file', type=argparse.FileType('r'), required=True,
+                        help='A yml config with a `datastore` section')
+    parser.add_argument('--channels', type=int, default=100, help='Number of channels')
+    parser.add_argument('--comments', type=int, default=10000, help='Number of comments')
+    parser.add_argument('--calls', type=int, default=2000, help='Number of calls to time')
+    args = parser.parse_args()
+
+    db_conf = Configuration(config_src=args.config_file).get_config('datastore')[0]
+    db = BenchDatastore(config=db_conf['config'], tag='bench')
+    try:
+        now = datetime.utcnow()
+        channel_ids = [f'bench_channel_{ind}' for ind in range(args.channels)]
+        db.add_comments([{'ch_id': random.choice(channel_ids),
+                          'video_link': f'https://youtube.com/watch?v=bench{ind:06d}',
+                          'comment_text': "It's a benchmark",
+                          'comment_time': (now - timedelta(minutes=ind)).isoformat(),
+                          'upload_time': (now - timedelta(minutes=ind + 1)).isoformat(),
+                          'video_title': "A 'quoted' title"}
+                         for ind in range(args.comments)])
+        video_links = [f'https://youtube.com/watch?v=bench{ind:06d}' for ind in range(args.comments)]
+
+        results = {
+            'get_comments (f-string)': throughput(
+                lambda: legacy_get_comments(db, random.choice(channel_ids), 50), args.calls),
+            'get_comments (prepared)': throughput(
+                lambda: list(db.get_comments(comment_cols=['video_link', 'comment', 'comment_time'],
+                                             channel_id=random.choice(channel_ids), n_recent=50)),
+                args.calls),
+            'update_comment (f-string)': throughput(
+                lambda: legacy_update_comment(db, random.choice(video_links), random.randint(0, 99),
+                                              "It's a title"), args.calls),
+            'update_comment (prepared)': throughput(
+                lambda: db.update_comment(video_link=random.choice(video_links),
+                                          like_cnt=random.randint(0, 99),
+                                          video_title="It's a title"), args.calls),
+            'IN-list select (prepared)': throughput(
+                lambda: in_list_select(db, video_links, prepared=True), args.calls),
+            'IN-list select (text)': throughput(
+                lambda: in_list_select(db, video_links, prepared=False), args.calls)}
+        for name, calls_per_second in results.items():
+            print(f'{name:28s} {calls_per_second:10.1f} calls/s')
+    finally:
+        for table in (db.COMMENTS_TABLE, db.CHANNEL_TABLE):
+            db.drop_table(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Runs the same workload against the SQLite (WAL mode) datastore and, if a config with a MySQL
+`datastore` section is specified, the MySQL datastore, and reports the time of every step.
+
+The SQLite database is a temporary file. The MySQL benchmark only touches its own
+`bench_channels` and `bench_comments` tables, which are dropped at the end.
+
+Example:
+    python -m benchmarks.bench_datastores --comments 10000
+    python -m benchmarks.bench_datastores -c confs/generic.yml --comments 10000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from youbot import Configuration, YoutubeMySqlDatastore, YoutubeSqliteDatastore
+
+
+class BenchMySqlDatastore(YoutubeMySqlDatastore):
+    CHANNEL_TABLE = 'bench_channels'
+    COMMENTS_TABLE = 'bench_comments'
+
+
+class BenchSqliteDatastore(YoutubeSqliteDatastore):
+    CHANNEL_TABLE = 'bench_channels'
+    COMMENTS_TABLE = 'bench_comments'
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_workload(db, channels: int, comments: int, calls: int) -> dict:
+    """ Populates the datastore and times the calls the commenter and the accumulator make. """
+
+    random.seed(0)
+    now = datetime.utcnow()
+    channel_ids = [f'bench_channel_{ind}' for ind in range(channels)]
+    video_links = [f'https://youtube.com/watch?v=bench{ind:06d}' for ind in range(comments)]
+
+    def add_channels():
+        for ind, channel_id in enumerate(channel_ids):
+            db.add_channel({'channel_id': channel_id, 'username': f'bench_user_{ind}',
+                            'added_on': now.isoformat(), 'last_commented': now.isoformat()})
+
+    def add_comments():
+        db.add_comments([{'ch_id': random.choice(channel_ids), 'video_link': video_link,
+                          'comment_text': "It's a benchmark",
+                          'comment_time': (now - timedelta(minutes=ind)).isoformat(),
+                          'upload_time': (now - timedelta(minutes=ind + 1)).isoformat(),
+                          'video_title': "A 'quoted' title"}
+                         for ind, video_link in enumerate(video_links)])
+
+    def get_channels():
+        for _ in range(calls // 10 or 1):
+            list(db.get_channels(channel_cols=['channel_id', 'username', 'last_commented']))
+
+    def get_comments():
+        for _ in range(calls):
+            list(db.get_comments(comment_cols=['video_link', 'comment', 'comment_time'],
+                                 channel_id=random.choice(channel_ids), n_recent=50))
+
+    def update_comment():
+        for _ in range(calls):
+            db.update_comment(video_link=random.choice(video_links), like_cnt=random.randint(0, 99),
+                              video_title="It's a title")
+
+    def update_comments():
+        db.update_comments([{'video_link': video_link, 'like_cnt': random.randint(0, 99),
+                             'reply_cnt': random.randint(0, 9)} for video_link in video_links])
+
+    def set_priority():
+        for _ in range(calls // 10 or 1):
+            db.set_priority({'channel_id': random.choice(channel_ids)},
+                            priority=str(random.randint(1, channels)))
+
+    def get_comment_history():
+        list(db.get_comment_history(channel_ids=channel_ids,
+                                    since=(now - timedelta(hours=24)).isoformat(),
+                                    n_recent=500, min_likes=5))
+
+    steps = (add_channels, add_comments, get_channels, get_comments, update_comment,
+             update_comments, set_priority, get_comment_history)
+    return {step.__name__: timed(step) for step in steps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the same workload against the datastores.')
+    parser.add_argument('-c', '--config-file', type=argparse.FileType('r'), required=False,
+                        help='A yml config with a MySQL `datastore` section (optional)')
+    parser.add_argument('--channels', type=int, default=100, help='Number of channels')
+    parser.add_argument('--comments', type=int, default=10000, help='Number of comments')
+    parser.add_argument('--calls', type=int, default=1000, help='Number of calls to time per step')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = BenchSqliteDatastore(config={'db_path': os.path.join(tmp_dir, 'bench.db')}, tag='bench')
+        try:
+            results['sqlite'] = run_workload(db, args.channels, args.comments, args.calls)
+        finally:
+            db.close()
+    if args.config_file is not None:
+        db_conf = Configuration(config_src=args.config_file).get_config('datastore')[0]
+        db = BenchMySqlDatastore(config=db_conf['config'], tag='bench')
+        try:
+            results['mysql'] = run_workload(db, args.channels, args.comments, args.calls)
+        finally:
+            for table in (db.COMMENTS_TABLE, db.CHANNEL_TABLE):
+                db.drop_table(table)
+
+    print(f"{'step':22s}" + ''.join(f'{backend:>12s}' for backend in results))
+    for step in results['sqlite']:
+        print(f'{step:22s}' + ''.join(f'{timings[step]:11.3f}s' for timings in results.values()))
+
+
+if __name__ == '__main__':
+    main()
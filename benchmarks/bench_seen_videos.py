@@ -0,0 +1,60 @@
+"""Benchmarks the membership checks of the seen videos index against the list of video links
+the commenter used to keep.
+
+Example:
+    python -m benchmarks.bench_seen_videos --entries 100000
+"""
+
+import argparse
+import random
+import string
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+from youbot.youtube_utils.seen_video_index import SeenVideoIndex
+
+
+def random_video_id() -> str:
+    return ''.join(random.choices(string.ascii_letters + string.digits + '-_', k=11))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the seen videos lookups.')
+    parser.add_argument('--entries', type=int, default=100000, help='Number of seen videos')
+    parser.add_argument('--lookups', type=int, default=1000, help='Number of lookups to time')
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    video_ids = [random_video_id() for _ in range(args.entries)]
+    # Spread over the last hour so that nothing is evicted while loading
+    seen = [(video_id, (now - timedelta(seconds=ind * 3600 / args.entries)).isoformat())
+            for ind, video_id in enumerate(video_ids)]
+    lookups = random.choices(video_ids, k=args.lookups // 2) + \
+        [random_video_id() for _ in range(args.lookups - args.lookups // 2)]
+
+    video_links = [f'https://youtube.com/watch?v={video_id}' for video_id in video_ids]
+    list_time = timeit.timeit(
+        lambda: [f'https://youtube.com/watch?v={video_id}' in video_links for video_id in lookups],
+        number=1)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SeenVideoIndex(window_hours=2)
+    index.load(seen)
+    load_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    entries = len(index)
+    index_time = timeit.timeit(lambda: [video_id in index for video_id in lookups], number=1)
+    add_time = timeit.timeit(lambda: index.add(random_video_id()), number=args.lookups)
+
+    print(f'entries: {entries}  load: {load_time * 1000:.1f} ms  memory: {memory / 2 ** 20:.1f} MiB')
+    print(f'list  lookup: {list_time / args.lookups * 1e6:10.2f} us')
+    print(f'index lookup: {index_time / args.lookups * 1e6:10.2f} us')
+    print(f'index add:    {add_time / args.lookups * 1e6:10.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmarks the template rotation index against the template selection the commenter used to
+run for every upload, with a long comment history per channel.
+
+Example:
+    python -m benchmarks.bench_template_rotation --history 10000 --templates 50
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from dateutil import parser as date_parser
+
+from youbot.youtube_utils.template_rotation import TemplateRotation
+
+
+def legacy_get_next_template_comment(template_comments: Dict, channel_id: str,
+                                     commented_comments: Dict, self_comments_flags: Dict) -> str:
+    """ The `get_next_template_comment` of the manager before the rotation index. """
+
+    commented_comments = commented_comments[channel_id]
+    self_comments_flags = self_comments_flags[channel_id]
+    available_comments = template_comments['default'].copy()
+    if channel_id in template_comments:
+        if self_comments_flags == 1:
+            available_comments = template_comments[channel_id]
+        else:
+            available_comments = template_comments[channel_id] + available_comments
+    unique_com_coms = set(data['comment'] for data in commented_comments)
+    new_comments = list(set(available_comments) - unique_com_coms)
+    random.shuffle(new_comments)
+    if new_comments:
+        comment = next(iter(new_comments))
+    else:
+        comment_dates = {}
+        for unique_comment in unique_com_coms:
+            comment_dates[unique_comment] = date_parser.parse('1994-04-30T08:00:00.000000')
+            for com_data in commented_comments:
+                if com_data['comment'] == unique_comment:
+                    comment_time = com_data['comment_time']
+                    if isinstance(comment_time, str):
+                        comment_time = date_parser.parse(comment_time)
+                    if comment_time > comment_dates[unique_comment]:
+                        comment_dates[unique_comment] = comment_time
+        comment = [k for k, v in sorted(comment_dates.items(),
+                                        key=lambda p: p[1], reverse=False)][0]
+    return comment
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the template comment selection.')
+    parser.add_argument('--channels', type=int, default=10, help='Number of channels')
+    parser.add_argument('--history', type=int, default=10000,
+                        help='Number of past comments per channel')
+    parser.add_argument('--templates', type=int, default=50, help='Number of default templates')
+    parser.add_argument('--calls', type=int, default=10000, help='Number of index calls to time')
+    parser.add_argument('--legacy-calls', type=int, default=5,
+                        help='Number of calls of the legacy selection to time (it is slow)')
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    templates = {'default': [f'Template comment {ind}' for ind in range(args.templates)]}
+    channel_ids = [f'channel_{ind}' for ind in range(args.channels)]
+    self_comments_flags = {channel_id: 0 for channel_id in channel_ids}
+    # Every template has been used, so the legacy selection takes its slow path
+    commented_comments = {
+        channel_id: [{'channel_id': channel_id, 'comment': templates['default'][ind % args.templates],
+                      'comment_time': (now - timedelta(minutes=ind)).isoformat()}
+                     for ind in range(args.history)]
+        for channel_id in channel_ids}
+
+    start = time.perf_counter()
+    for _ in range(args.legacy_calls):
+        legacy_get_next_template_comment(templates, random.choice(channel_ids),
+                                         commented_comments, self_comments_flags)
+    legacy_time = (time.perf_counter() - start) / args.legacy_calls
+
+    start = time.perf_counter()
+    rotation = TemplateRotation()
+    rotation.set_pools(templates, self_comments_flags)
+    for channel_comments in commented_comments.values():
+        rotation.load(channel_comments)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        channel_id = random.choice(channel_ids)
+        template = rotation.next(channel_id)
+        rotation.mark_used(channel_id, template)
+    index_time = (time.perf_counter() - start) / args.calls
+
+    print(f'channels: {args.channels}  history: {args.history}/channel  '
+          f'templates: {args.templates}  index build: {build_time * 1000:.1f} ms')
+    print(f'legacy selection: {legacy_time * 1e6:12.1f} us/call')
+    print(f'rotation index:   {index_time * 1e6:12.1f} us/call (next + mark_used)')
+    print(f'speed-up:         {legacy_time / index_time:12.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""A local stand-in for the YouTube Data API used by the benchmarks."""
+
+from typing import Dict, List, Tuple
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import httplib2
+from googleapiclient import discovery
+
+from youbot.youtube_utils import YoutubeApiV3
+from youbot.youtube_utils.credential_pool import CredentialPool
+from youbot.youtube_utils.parallel_uploads import ParallelUploads
+from youbot.youtube_utils.playlist_cache import PlaylistCache
+
+
+class FakeYoutubeServer:
+    """ Serves `playlistItems.list` (plain and batched) for fake uploads playlists.
+    Every HTTP round trip is delayed by `latency` seconds to emulate the network. """
+
+    def __init__(self, channels: List[str], latency: float = 0.02, new_every: int = 10) -> None:
+        """
+        Args:
+            channels: The fake channel IDs
+            latency: Seconds to wait before answering each HTTP request
+            new_every: Every how many channels one has a video uploaded just now
+        """
+
+        self.latency = latency
+        self.round_trips = 0
+        self.sub_requests = 0
+        self.not_modified = 0
+        now = datetime.utcnow()
+        self.playlists = {}
+        for ind, ch_id in enumerate(channels):
+            published_at = now if ind % new_every == 0 else now - timedelta(days=3)
+            self.playlists[self.playlist_id(ch_id)] = {
+                'id': f'item_{ind}',
+                'snippet': {'title': f'Video {ind}',
+                            'publishedAt': published_at.replace(microsecond=0).isoformat() + 'Z',
+                            'resourceId': {'videoId': f'vid{ind:08d}'}}}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @staticmethod
+    def playlist_id(ch_id: str) -> str:
+        return 'UU' + ch_id[2:]
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/'
+
+    def start(self) -> 'FakeYoutubeServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def playlist_items(self, path: str, if_none_match: str = None) -> Tuple[int, Dict]:
+        query = parse_qs(urlparse(path).query)
+        with self._lock:
+            self.sub_requests += 1
+        item = self.playlists.get(query['playlistId'][0])
+        if item is None:
+            return 404, {'error': {'code': 404, 'message': 'playlistNotFound'}}
+        etag = f'etag_{item["snippet"]["resourceId"]["videoId"]}'
+        if if_none_match == etag:
+            with self._lock:
+                self.not_modified += 1
+            return 304, None
+        return 200, {'etag': etag, 'items': [item]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                if status != 304:
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                with fake._lock:
+                    fake.round_trips += 1
+                time.sleep(fake.latency)
+                status, response = fake.playlist_items(self.path, self.headers['If-None-Match'])
+                self._reply(status, json.dumps(response).encode(), 'application/json')
+
+            def do_POST(self) -> None:
+                with fake._lock:
+                    fake.round_trips += 1
+                time.sleep(fake.latency)
+                length = int(self.headers['Content-Length'])
+                body = self.rfile.read(length)
+                header = f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode()
+                message = BytesParser(policy=HTTP).parsebytes(header + body)
+                boundary = 'batch_boundary'
+                parts = []
+                for part in message.iter_parts():
+                    content_id = part['Content-ID'][1:-1]
+                    request_line, request_headers = part.get_payload().split('\n', 1)
+                    request_headers = BytesParser(policy=HTTP).parsebytes(request_headers.encode())
+                    status, response = fake.playlist_items(request_line.split(' ')[1],
+                                                           request_headers['If-None-Match'])
+                    body = json.dumps(response) if status != 304 else ''
+                    parts.append(f'--{boundary}\r\n'
+                                 f'Content-Type: application/http\r\n'
+                                 f'Content-ID: <response-{content_id}>\r\n\r\n'
+                                 f'HTTP/1.1 {status} OK\r\n'
+                                 f'Content-Type: application/json\r\n\r\n'
+                                 f'{body}\r\n')
+                payload = (''.join(parts) + f'--{boundary}--\r\n').encode()
+                self._reply(200, payload, f'multipart/mixed; boundary={boundary}')
+
+        return Handler
+
+
+def build_fake_api(root_url: str):
+    """ Builds a YouTube api connection whose every request goes to `root_url`. """
+
+    documents_path = os.path.join(os.path.dirname(discovery.__file__),
+                                  'discovery_cache', 'documents', 'youtube.v3.json')
+    with open(documents_path) as f:
+        service = json.load(f)
+    service['rootUrl'] = root_url
+    service['baseUrl'] = root_url + service['servicePath']
+    return discovery.build_from_document(service, http=httplib2.Http())
+
+
+def build_fake_youtube(fake: FakeYoutubeServer, channels: List[str],
+                       num_apis: int = 1) -> YoutubeApiV3:
+    """ Creates a YoutubeApiV3 bound to the fake server without going through OAuth. """
+
+    youtube = YoutubeApiV3.__new__(YoutubeApiV3)
+    youtube.tag = 'benchmark'
+    youtube._apis = [build_fake_api(fake.url) for _ in range(num_apis)]
+    youtube._credentials = {api: None for api in youtube._apis}
+    youtube.credential_pool = CredentialPool()
+    for api_ind, api in enumerate(youtube._apis):
+        youtube.credential_pool.add(api, name=f'benchmark_{api_ind}')
+    youtube.max_concurrency = 100
+    youtube.connections_per_credential = 20
+    youtube.async_uploads = None
+    youtube.playlist_cache = PlaylistCache()
+    youtube.parallel_uploads = ParallelUploads(
+        connection_factory=lambda api: youtube._authorized_http(youtube._credentials[api]),
+        num_workers=20)
+    youtube.channel_playlists = {
+        ch_id: {'id': ch_id,
+                'snippet': {'title': f'Channel {ch_id}'},
+                'contentDetails': {'relatedPlaylists': {'uploads': fake.playlist_id(ch_id)}}}
+        for ch_id in channels}
+    return youtube
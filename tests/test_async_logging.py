@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""Tests for the `async_logging` module."""
+
+import logging
+import threading
+import unittest
+
+from youbot import AsyncLogging, ColorLogger
+from youbot.async_logging import DroppingLogQueue
+
+
+def make_record(level: int, msg: str) -> logging.LogRecord:
+    return logging.makeLogRecord({'levelno': level, 'levelname': logging.getLevelName(level), 'msg': msg})
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self, gate: threading.Event = None) -> None:
+        super().__init__()
+        self.messages = []
+        self.threads = set()
+        self.gate = gate
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.gate is not None:
+            self.gate.wait()
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+class TestDroppingLogQueue(unittest.TestCase):
+
+    def test_drops_debug_records_first(self):
+        queue = DroppingLogQueue(maxsize=3)
+        for level, msg in ((logging.DEBUG, 'debug 1'), (logging.INFO, 'info 1'),
+                           (logging.DEBUG, 'debug 2')):
+            queue.put_nowait(make_record(level, msg))
+        queue.put_nowait(make_record(logging.INFO, 'info 2'))  # Drops `debug 1`
+        queue.put_nowait(make_record(logging.INFO, 'info 3'))  # Drops `debug 2`
+        queue.put_nowait(make_record(logging.DEBUG, 'debug 3'))  # Dropped itself
+        queue.put_nowait(make_record(logging.INFO, 'info 4'))  # Dropped itself
+        queue.put_nowait(make_record(logging.ERROR, 'error'))  # Drops `info 1`
+        queue.put_nowait(None)  # The sentinel is always queued
+        self.assertEqual(queue.dropped, 5)
+        self.assertEqual([queue.get().msg for _ in range(3)], ['info 2', 'info 3', 'error'])
+        self.assertIsNone(queue.get())
+
+    def test_keeps_dropping_while_full(self):
+        queue = DroppingLogQueue(maxsize=4)
+        queue.put_nowait(make_record(logging.INFO, 'info 1'))
+        for ind in range(20):
+            queue.put_nowait(make_record(logging.DEBUG, f'debug {ind}'))
+        queue.put_nowait(make_record(logging.WARNING, 'warning'))  # Drops `debug 17`
+        queue.put_nowait(make_record(logging.ERROR, 'error'))  # Drops `debug 18`
+        self.assertEqual(queue.dropped, 19)
+        self.assertEqual(len(queue), 4)
+        self.assertLessEqual(len(queue._entries), 2 * queue.maxsize + 1)
+        self.assertEqual([queue.get().msg for _ in range(4)],
+                         ['info 1', 'debug 19', 'warning', 'error'])
+        self.assertEqual((len(queue), len(queue._debug), len(queue._info)), (0, 0, 0))
+
+
+class TestAsyncLogging(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.color_logger = ColorLogger(logger_name='TestAsyncLogging')
+        self.logger = logging.getLogger('TestAsyncLogging')
+        self.sync_handlers = self.logger.handlers
+
+    def test_writes_from_the_listener_thread(self):
+        handler = ListHandler()
+        async_logging = AsyncLogging(handlers=[handler]).start()
+        self.color_logger.info('First')
+        self.color_logger.nl()
+        self.color_logger.error('Second')
+        async_logging.stop()
+        self.assertEqual(len(handler.messages), 3)
+        self.assertIn('First', handler.messages[0])
+        self.assertIn('Second', handler.messages[2])
+        self.assertNotIn(threading.current_thread().name, handler.threads)
+        self.assertEqual(self.logger.handlers, self.sync_handlers)
+
+    def test_reports_the_dropped_records(self):
+        gate = threading.Event()
+        handler = ListHandler(gate=gate)
+        async_logging = AsyncLogging(queue_size=2, handlers=[handler]).start()
+        for ind in range(10):  # Never blocks, although the handler does
+            self.color_logger.info(f'Message {ind}')
+        gate.set()
+        async_logging.stop()
+        self.assertTrue(any('log records, the log queue was full' in msg for msg in handler.messages))
+        self.assertIn('Message 0', ' '.join(handler.messages))  # The oldest records are kept
+        self.assertLess(len(handler.messages), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
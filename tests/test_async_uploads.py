@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""Tests for the `async_uploads` module."""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from youbot.youtube_utils.async_uploads import AsyncUploads
+
+
+class FakeRequest:
+    """ Records which connections it was executed with and how many requests were in flight. """
+
+    def __init__(self, tracker: 'Tracker', result: str, gate: threading.Event = None) -> None:
+        self.tracker = tracker
+        self.result = result
+        self.gate = gate
+
+    def execute(self, http=None) -> dict:
+        with self.tracker.lock:
+            self.tracker.in_flight += 1
+            self.tracker.max_in_flight = max(self.tracker.max_in_flight, self.tracker.in_flight)
+            self.tracker.busy.add(http)
+        if self.gate is not None:
+            self.gate.wait()
+        else:
+            time.sleep(0.02)
+        with self.tracker.lock:
+            self.tracker.in_flight -= 1
+            self.tracker.busy.discard(http)
+        if self.result == 'error':
+            raise ConnectionError('Request failed')
+        return {'result': self.result}
+
+
+class Tracker:
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.busy = set()
+        self.connections = []
+
+    def connection_factory(self, credentials):
+        http = (credentials, len(self.connections))
+        self.connections.append(http)
+        return http
+
+
+class TestAsyncUploads(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tracker = Tracker()
+
+    def tearDown(self) -> None:
+        self.engine.close()
+
+    def collect(self, requests) -> list:
+        async def collect():
+            return [result async for result in self.engine.execute(requests)]
+
+        return self.engine.loop.run_until_complete(collect())
+
+    def test_bounded_concurrency(self):
+        self.engine = AsyncUploads(self.tracker.connection_factory, max_concurrency=3)
+        requests = [(ind, 'creds', FakeRequest(self.tracker, 'error' if ind == 4 else f'r{ind}'))
+                    for ind in range(10)]
+        results = sorted(self.collect(requests), key=lambda result: result[0])
+        self.assertEqual([result[0] for result in results], list(range(10)))
+        self.assertEqual(results[0][1:], ({'result': 'r0'}, None))
+        self.assertIsNone(results[4][1])
+        self.assertIsInstance(results[4][2], ConnectionError)
+        self.assertLessEqual(self.tracker.max_in_flight, 3)
+        self.assertLessEqual(len(self.tracker.connections), 3)
+
+    def test_reuses_the_connections_of_each_credential(self):
+        self.engine = AsyncUploads(self.tracker.connection_factory, max_concurrency=10,
+                                   connections_per_credential=2)
+        credentials = ['creds_0', 'creds_1']  # The pools are per credential object
+        requests = [(ind, credentials[ind % 2], FakeRequest(self.tracker, f'r{ind}')) for ind in range(8)]
+        self.assertEqual(len(self.collect(requests)), 8)
+        connections = list(self.tracker.connections)
+        self.assertEqual(sorted(creds for creds, _ in connections),
+                         ['creds_0', 'creds_0', 'creds_1', 'creds_1'])
+        self.assertEqual(len(self.collect(requests)), 8)
+        self.assertEqual(self.tracker.connections, connections)  # No new connections
+
+    def test_early_close_keeps_the_busy_connection_out_of_the_pool(self):
+        self.engine = AsyncUploads(self.tracker.connection_factory, max_concurrency=10,
+                                   connections_per_credential=2)
+        gate = threading.Event()
+        requests = [('fast', 'creds', FakeRequest(self.tracker, 'fast')),
+                    ('slow', 'creds', FakeRequest(self.tracker, 'slow', gate=gate))]
+
+        async def first_result():
+            results = self.engine.execute(requests)
+            result = await results.__anext__()
+            await results.aclose()  # Cancels the slow request while its thread still runs
+            return result
+
+        self.assertEqual(self.engine.loop.run_until_complete(first_result())[0], 'fast')
+        pool = self.engine._pool('creds')
+        [busy_http] = self.tracker.busy
+        self.assertNotIn(busy_http, pool['idle']._queue)
+        # A new request does not get the connection still in use
+        self.assertEqual(self.collect([('next', 'creds', FakeRequest(self.tracker, 'next'))])[0][1],
+                         {'result': 'next'})
+        self.assertNotIn(busy_http, pool['idle']._queue)
+        gate.set()
+        deadline = time.monotonic() + 5
+        while busy_http not in pool['idle']._queue and time.monotonic() < deadline:
+            self.engine.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertIn(busy_http, pool['idle']._queue)
+        self.assertEqual(pool['open'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""Tests for the `burst_scheduler` module."""
+
+import unittest
+from datetime import datetime, timedelta
+
+from youbot.youtube_utils.burst_scheduler import BurstScheduler
+
+
+class TestBurstScheduler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scheduler = BurstScheduler(size=2, start_before=10, duration=60)
+        day = timedelta(days=1)
+        start = datetime(2021, 6, 7)
+        self.scheduler.fit({
+            'at_17': [start.replace(hour=17) + day * i for i in range(4)],
+            'at_18': [start.replace(hour=18) + day * i for i in range(4)],
+            'at_17_and_18': [start.replace(hour=17), start.replace(hour=18)],
+            'random': [start.replace(hour=17, minute=23) + day * i for i in range(4)]})
+
+    def test_pick_channels(self):
+        channels = ['random', 'at_17_and_18', 'at_18', 'at_17']
+        self.assertListEqual(self.scheduler.pick_channels(channels, hour=17),
+                             ['at_17_and_18', 'at_17'])
+        self.assertListEqual(self.scheduler.pick_channels(channels, hour=18),
+                             ['at_17_and_18', 'at_18'])
+
+    def test_bursts(self):
+        self.assertEqual(self.scheduler.seconds_until_burst(now=datetime(2021, 6, 14, 16, 59, 40)),
+                         10)
+        burst_now = datetime(2021, 6, 14, 16, 59, 55)
+        self.assertEqual(self.scheduler.seconds_until_burst(now=burst_now), 0)
+        channels, burst_end = self.scheduler.start_burst(['at_17', 'at_18'], now=burst_now)
+        self.assertListEqual(channels, ['at_17', 'at_18'])
+        self.assertEqual(burst_end, datetime(2021, 6, 14, 17, 1))
+        # The burst of 17:00 has run, the next one is for 18:00
+        self.assertEqual(self.scheduler.seconds_until_burst(now=datetime(2021, 6, 14, 17, 0, 30)),
+                         3600 - 30 - 10)
+        self.scheduler.record({'published_at': '2021-06-14T17:00:02Z',
+                               'detected_at': datetime(2021, 6, 14, 17, 0, 3, 500000)})
+        self.scheduler.record({'published_at': '2021-06-14T16:20:00Z'})  # Before the burst
+        report = self.scheduler.report()
+        self.assertEqual(report['detected'], 1)
+        self.assertEqual(report['median_latency'], 1.5)
+
+    def test_budget(self):
+        scheduler = BurstScheduler(size=5, interval=1, start_before=5, duration=30, quota_share=0.2)
+        # Enough quota: Every second during the 35 seconds of the burst
+        self.assertEqual(scheduler.budget(num_channels=5, headroom=30000, seconds_until_reset=3600),
+                         (35, 1))
+        # 0.2 * 10000 / 20 hours = 100 units: 20 polls of 5 channels spread across the burst
+        self.assertEqual(scheduler.budget(num_channels=5, headroom=10000,
+                                          seconds_until_reset=20 * 3600), (20, 1.75))
+        self.assertEqual(scheduler.budget(num_channels=5, headroom=20, seconds_until_reset=3600),
+                         (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
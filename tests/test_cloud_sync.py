@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""Tests for the `cloud_sync` module."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from youbot.youtube_utils.cloud_sync import CloudFolderSync, content_hash
+
+
+class FakeCloudStore:
+    """ A cloud store kept in a local folder, with the interface of DropboxCloudManager. """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.downloads = []
+        self.lock = threading.Lock()
+
+    def put(self, name: str, content: str) -> None:
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(content)
+
+    def ls(self, path: str = ''):
+        folder = os.path.join(self.path, path.strip('/'))
+        return {name: SimpleNamespace(name=name, content_hash=content_hash(os.path.join(folder, name)))
+                for name in os.listdir(folder)}
+
+    def download_file(self, frompath: str, tofile: str = None):
+        with self.lock:
+            self.downloads.append(frompath)
+        with open(os.path.join(self.path, frompath.strip('/')), 'rb') as src, open(tofile, 'wb') as dst:
+            dst.write(src.read())
+
+
+class TestCloudFolderSync(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cloud = FakeCloudStore(os.path.join(self.tmp_dir.name, 'cloud'))
+        os.makedirs(self.cloud.path)
+        self.local_path = os.path.join(self.tmp_dir.name, 'local')
+        for ind in range(5):
+            self.cloud.put(f'comments_{ind}.txt', f'Comment {ind}\n')
+        self.cloud.put('notes.md', 'Not synced')
+        self.sync = CloudFolderSync(self.cloud, remote_path='', local_path=self.local_path,
+                                    suffix='.txt', max_workers=3)
+
+    def tearDown(self) -> None:
+        self.sync.stop()
+        self.tmp_dir.cleanup()
+
+    def read(self, name: str) -> str:
+        with open(os.path.join(self.local_path, name)) as f:
+            return f.read()
+
+    def test_downloads_only_the_changed_files(self):
+        self.assertEqual(sorted(self.sync.sync()), [f'comments_{ind}.txt' for ind in range(5)])
+        self.assertEqual(len(self.cloud.downloads), 5)
+        self.assertEqual(self.sync.sync(), [])
+        self.cloud.put('comments_2.txt', 'Edited\n')
+        self.cloud.put('comments_9.txt', 'New\n')
+        self.assertEqual(sorted(self.sync.sync()), ['comments_2.txt', 'comments_9.txt'])
+        self.assertEqual(len(self.cloud.downloads), 7)
+        self.assertEqual(self.read('comments_2.txt'), 'Edited\n')
+        self.assertFalse(os.path.exists(os.path.join(self.local_path, 'notes.md')))
+
+    def test_deletes_the_removed_files(self):
+        self.sync.sync()
+        os.remove(os.path.join(self.cloud.path, 'comments_0.txt'))
+        self.assertEqual(self.sync.sync(), ['comments_0.txt'])
+        self.assertFalse(os.path.exists(os.path.join(self.local_path, 'comments_0.txt')))
+
+    def test_keeps_the_files_if_the_listing_is_empty(self):
+        self.sync.sync()
+        self.cloud.ls = lambda path='': {}
+        self.assertEqual(self.sync.sync(), [])
+        self.assertEqual(self.read('comments_0.txt'), 'Comment 0\n')
+
+    def test_rebuilds_a_lost_manifest_without_downloading(self):
+        self.sync.sync()
+        os.remove(os.path.join(self.local_path, CloudFolderSync.MANIFEST_NAME))
+        self.assertEqual(self.sync.sync(), [])
+        self.assertEqual(len(self.cloud.downloads), 5)
+
+    def test_failed_download_is_retried(self):
+        download_file = self.cloud.download_file
+        self.cloud.download_file = lambda frompath, tofile=None: None  # Logged and swallowed
+        self.assertEqual(self.sync.sync(), [])
+        self.assertEqual(os.listdir(self.local_path), [CloudFolderSync.MANIFEST_NAME])
+        self.cloud.download_file = download_file
+        self.assertEqual(len(self.sync.sync()), 5)
+
+    def test_background_sync(self):
+        self.sync.sync()
+        self.sync.start(interval=0.05)
+        self.cloud.put('comments_1.txt', 'Edited\n')
+        deadline = time.monotonic() + 5
+        while self.read('comments_1.txt') != 'Edited\n' and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.read('comments_1.txt'), 'Edited\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Tests for the `comment_archive` module."""
+
+import tempfile
+import unittest
+from datetime import datetime
+
+from youbot import CommentArchive, CommentArchiveReader
+
+
+class TestCommentArchive(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive = CommentArchive(self.tmp_dir.name)
+        self.archive.write_month('2021-06', [
+            {'channel_id': f'ch_{ind % 2}', 'video_link': f'https://youtube.com/watch?v={ind}',
+             'comment': 'Nice', 'comment_time': datetime(2021, 6, ind + 1, 17),
+             'upload_time': '2021-06-01T16:59:00Z' if ind else 'None', 'like_count': ind,
+             'reply_count': -1}
+            for ind in range(3)])
+        self.archive.write_month('2021-05', [
+            {'channel_id': 'ch_0', 'video_link': 'https://youtube.com/watch?v=may',
+             'comment': 'Old', 'comment_time': '2021-05-31T10:00:00', 'like_count': 7}])
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_read_columns(self):
+        reader = CommentArchiveReader(self.tmp_dir.name)
+        self.assertEqual(reader.months(), ['2021-05', '2021-06'])
+        data = reader.read_columns('2021-06', ['comment_time', 'upload_time', 'reply_count'])
+        self.assertEqual(set(data), {'comment_time', 'upload_time', 'reply_count'})
+        self.assertEqual(data['comment_time'][0], '2021-06-01 17:00:00.000000')
+        self.assertEqual(data['upload_time'], [None, '2021-06-01 16:59:00.000000',
+                                               '2021-06-01 16:59:00.000000'])
+        self.assertEqual(data['reply_count'], [None, None, None])
+
+    def test_write_month_merges(self):
+        total = self.archive.write_month('2021-06', [
+            {'channel_id': 'ch_0', 'video_link': 'https://youtube.com/watch?v=0', 'comment': 'Edited',
+             'comment_time': '2021-06-01T17:00:00'},
+            {'channel_id': 'ch_1', 'video_link': 'https://youtube.com/watch?v=3', 'comment': 'New',
+             'comment_time': '2021-06-04T17:00:00'}])
+        self.assertEqual(total, 4)
+        self.assertEqual(self.archive.read_columns('2021-06', ['comment'])['comment'],
+                         ['Edited', 'Nice', 'Nice', 'New'])
+
+    def test_get_comments(self):
+        reader = CommentArchiveReader(self.tmp_dir.name)
+        links = [row['video_link'][-3:] for row in reader.get_comments(['video_link'])]
+        self.assertEqual(links, ['v=2', 'v=1', 'v=0', 'may'])
+        rows = list(reader.get_comments(['comment', 'like_count'], channel_id='ch_0', min_likes=1))
+        self.assertEqual(rows, [{'comment': 'Nice', 'like_count': 2}, {'comment': 'Old', 'like_count': 7}])
+        rows = list(reader.get_comments(['video_link'], since='2021-06-02T00:00:00Z',
+                                        until='2021-06-03T17:00:00', n_recent=5))
+        self.assertEqual(rows, [{'video_link': 'https://youtube.com/watch?v=1'}])
+        self.assertEqual(len(list(reader.get_comments(['video_link'], n_recent=2))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""Tests for the `comment_poster` module."""
+
+import unittest
+import time
+
+from youbot.youtube_utils.comment_poster import CommentPoster
+
+
+class TestCommentPoster(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.posted = []
+        self.poster = CommentPoster(post=self._post).start()
+
+    def tearDown(self) -> None:
+        self.poster.stop()
+
+    def _post(self, comment):
+        if comment['video'] == 'failing':
+            raise Exception('Failed')
+        self.posted.append(comment['video'])
+
+    def test_posts_in_due_order_exactly_once(self):
+        start = time.monotonic()
+        self.poster.schedule({'video': 'delayed'}, delay=0.3)
+        self.poster.schedule({'video': 'first'})
+        self.poster.schedule({'video': 'failing'})
+        self.poster.schedule({'video': 'second'}, delay=0.1)
+        self.assertLess(time.monotonic() - start, 0.1)  # Scheduling does not block
+        time.sleep(0.5)
+        self.assertEqual(self.poster.pending, 0)
+        self.assertListEqual([comment['video'] for comment in self.poster.posted()],
+                             ['first', 'second', 'delayed'])
+        self.assertListEqual(self.poster.posted(), [])
+        self.assertListEqual(self.posted, ['first', 'second', 'delayed'])
+
+    def test_flush(self):
+        self.poster.schedule({'video': 'later'}, delay=60)
+        self.assertEqual(self.poster.pending, 1)
+        self.assertTrue(self.poster.flush(timeout=5))
+        self.assertListEqual(self.posted, ['later'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for the `credential_pool` module."""
+
+import unittest
+from datetime import datetime
+
+from youbot.youtube_utils.credential_pool import CredentialPool, QuotaExceededError
+
+
+class TestCredentialPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.pool = CredentialPool(daily_quota=100)
+        for name in ('first', 'second'):
+            self.pool.add(name, name=name)
+
+    def test_routes_to_most_headroom(self):
+        self.pool.spend('first', 'commentThreads.insert')
+        self.assertEqual(self.pool.get(), 'second')
+        self.pool.spend('second', 'playlistItems.list', count=60)
+        self.assertEqual(self.pool.get(), 'first')
+        self.assertEqual(self.pool.usage()['second']['calls'], {'playlistItems.list': 60})
+
+    def test_quarantine(self):
+        self.pool.quarantine('second')
+        self.pool.spend('first', 'commentThreads.insert', count=2)
+        self.assertEqual(self.pool.available(), ['first'])
+        self.pool.quarantine('first')
+        with self.assertRaises(QuotaExceededError) as cm:
+            self.pool.get()
+        self.assertTrue(self.pool.is_quota_exceeded(cm.exception))
+
+    def test_daily_reset(self):
+        self.pool.spend('first', 'commentThreads.insert')
+        self.pool.quarantine('second')
+        self.pool._reset_at = datetime.utcnow()
+        self.assertEqual(len(self.pool.available()), 2)
+        self.assertEqual(self.pool.usage()['first']['spent'], 0)
+        self.assertTrue(0 < self.pool.seconds_until_reset() <= 25 * 3600)
+
+    def test_next_reset_is_pacific_midnight(self):
+        # 2021-07-01 06:30 utc is 23:30 PDT, so the reset is at 07:00 utc
+        self.assertEqual(CredentialPool._next_reset(datetime(2021, 7, 1, 6, 30)),
+                         datetime(2021, 7, 1, 7, 0))
+        # 2021-12-01 09:00 utc is 01:00 PST, so the reset is at 08:00 utc of the next day
+        self.assertEqual(CredentialPool._next_reset(datetime(2021, 12, 1, 9, 0)),
+                         datetime(2021, 12, 2, 8, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
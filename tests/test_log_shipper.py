@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""Tests for the `log_shipper` module."""
+
+import gzip
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from youbot.youtube_utils.log_shipper import DropboxUploadSession, LogShipper
+
+
+class FakeUploadSession:
+    """ Keeps the committed files in memory and checks the offsets of the parts. """
+
+    def __init__(self) -> None:
+        self.sessions = {}
+        self.files = {}
+        self.fail = False
+
+    def start(self, data: bytes) -> str:
+        session_id = f'session_{len(self.sessions)}'
+        self.sessions[session_id] = data
+        return session_id
+
+    def append(self, session_id: str, offset: int, data: bytes) -> None:
+        assert offset == len(self.sessions[session_id])
+        self.sessions[session_id] += data
+
+    def finish(self, session_id: str, offset: int, upload_path: str) -> None:
+        if self.fail:
+            raise ConnectionError('Upload failed')
+        assert offset == len(self.sessions[session_id])
+        self.files[upload_path] = self.sessions.pop(session_id)
+
+    def uploaded(self) -> bytes:
+        # The names start with the upload time
+        return b''.join(gzip.decompress(data) for _, data in sorted(self.files.items()))
+
+
+class TestLogShipper(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp_dir.name, 'commenter.log')
+        self.uploader = FakeUploadSession()
+        self.shipper = LogShipper(self.uploader, self.log_path, upload_folder='/logs', chunk_size=10,
+                                  max_bytes=0)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write(self, text: str) -> None:
+        with open(self.log_path, 'a') as f:
+            f.write(text)
+
+    def test_uploads_only_the_new_complete_lines(self):
+        self.write('line 1\nline 2\npartial')
+        self.assertEqual(self.shipper.ship(), 14)
+        [(upload_path, data)] = self.uploader.files.items()
+        self.assertTrue(upload_path.startswith('/logs/commenter_'))
+        self.assertTrue(upload_path.endswith('_0.log.gz'))
+        self.assertEqual(gzip.decompress(data), b'line 1\nline 2\n')
+        self.assertEqual(self.shipper.ship(), 0)
+        self.write(' line 3\nline 4\n')
+        self.shipper.ship()
+        self.assertEqual(self.uploader.uploaded(), b'line 1\nline 2\npartial line 3\nline 4\n')
+
+    def test_keeps_the_offset_across_restarts(self):
+        self.write('line 1\n')
+        self.shipper.ship()
+        self.write('line 2\n')
+        shipper = LogShipper(self.uploader, self.log_path, upload_folder='/logs')
+        self.assertEqual(shipper.offset, 7)
+        self.assertEqual(shipper.ship(), 7)
+        self.assertEqual(self.uploader.uploaded(), b'line 1\nline 2\n')
+
+    def test_failed_upload_is_retried(self):
+        self.write('line 1\n')
+        self.uploader.fail = True
+        with self.assertRaises(ConnectionError):
+            self.shipper.ship()
+        self.assertEqual(self.shipper.offset, 0)
+        self.uploader.fail = False
+        self.shipper.ship()
+        self.assertEqual(self.uploader.uploaded(), b'line 1\n')
+
+    def test_rotates_by_copy_truncate(self):
+        shipper = LogShipper(self.uploader, self.log_path, upload_folder='/logs', max_bytes=20,
+                             backups=2)
+        for ind in range(3):
+            self.write(f'rotation {ind} line 1\nrotation {ind} line 2\n')
+            shipper.ship()
+        self.assertEqual(os.path.getsize(self.log_path), 0)
+        self.assertEqual(shipper.offset, 0)
+        with open(f'{self.log_path}.1') as f:
+            self.assertTrue(f.read().startswith('rotation 2'))
+        with open(f'{self.log_path}.2') as f:
+            self.assertTrue(f.read().startswith('rotation 1'))
+        self.assertFalse(os.path.exists(f'{self.log_path}.3'))
+        self.assertEqual(len(self.uploader.files), 3)
+
+    def test_background_upload_on_request(self):
+        shipper = LogShipper(self.uploader, self.log_path, upload_folder='/logs', interval=60)
+        shipper.start()
+        self.write('line 1\n')
+        shipper.request()
+        deadline = time.monotonic() + 5
+        while not self.uploader.files and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.write('line 2\n')
+        shipper.stop()
+        self.assertEqual(self.uploader.uploaded(), b'line 1\nline 2\n')
+        self.write('line 3\n')
+        shipper.stop()  # Already stopped
+        self.assertEqual(self.uploader.uploaded(), b'line 1\nline 2\n')
+
+    def test_stop_does_nothing_when_not_started(self):
+        self.write('line 1\n')
+        self.shipper.stop()
+        self.assertEqual(self.uploader.files, {})
+
+
+class TestDropboxUploadSession(unittest.TestCase):
+
+    def test_uses_its_own_client(self):
+        with mock.patch('youbot.youtube_utils.log_shipper.Dropbox') as dropbox:
+            uploader = DropboxUploadSession(api_key='key')
+        dropbox.assert_called_once_with('key')
+        client = dropbox.return_value
+        client.files_upload_session_start.return_value.session_id = 'session'
+        self.assertEqual(uploader.start(b'part 1'), 'session')
+        uploader.append('session', 6, b'part 2')
+        uploader.finish('session', 12, '/logs/commenter.log.gz')
+        cursor = client.files_upload_session_finish.call_args[0][1]
+        self.assertEqual((cursor.session_id, cursor.offset), ('session', 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""Tests for the `parallel_uploads` module."""
+
+import threading
+import time
+import unittest
+
+from youbot.youtube_utils.parallel_uploads import ParallelUploads, ReorderBuffer
+
+
+class TestReorderBuffer(unittest.TestCase):
+
+    def test_emits_in_priority_order(self):
+        buffer = ReorderBuffer(size=3, latency_budget=10)
+        buffer.put(2, [{'id': 'c'}], now=0)
+        buffer.put(1, [{'id': 'b'}], now=0)
+        self.assertEqual(buffer.pop_ready(now=1), [])
+        buffer.put(0, [{'id': 'a'}], now=1)
+        self.assertEqual([upload['id'] for upload in buffer.pop_ready(now=1)], ['a', 'b', 'c'])
+        self.assertTrue(buffer.done)
+
+    def test_releases_after_latency_budget(self):
+        buffer = ReorderBuffer(size=3, latency_budget=1)
+        buffer.put(1, [{'id': 'b'}], now=0)
+        buffer.put(2, [], now=0)
+        self.assertEqual(buffer.time_to_release(now=0.5), 0.5)
+        self.assertEqual([upload['id'] for upload in buffer.pop_ready(now=1)], ['b'])
+        self.assertFalse(buffer.done)
+        # The late higher priority result is released as soon as it arrives
+        buffer.put(0, [{'id': 'a'}], now=2)
+        self.assertEqual([upload['id'] for upload in buffer.pop_ready(now=2)], ['a'])
+        self.assertTrue(buffer.done)
+
+
+class TestParallelUploads(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.fetched = []
+        self.gate = threading.Event()
+
+    def tearDown(self) -> None:
+        self.gate.set()
+
+    def fetch(self, api, http, ch_id):
+        self.fetched.append(ch_id)
+        if ch_id == 'blocked':
+            self.gate.wait()
+        elif ch_id == 'slow':
+            time.sleep(0.1)
+        return [{'id': ch_id, 'api': api}]
+
+    def test_yields_in_priority_order(self):
+        pool = ParallelUploads(connection_factory=lambda api: object(), num_workers=3)
+        channels = ['slow', 'a', 'b', 'c']
+        uploads = list(pool.get(channels, apis=['api_1', 'api_2'], fetch=self.fetch))
+        self.assertEqual([upload['id'] for upload in uploads], channels)
+        self.assertEqual([upload['api'] for upload in uploads], ['api_1', 'api_2', 'api_1', 'api_1'])
+        self.assertTrue(pool.join())
+        self.assertEqual(pool._workers, [])
+
+    def test_timeout_cancels_the_pending_channels(self):
+        pool = ParallelUploads(connection_factory=lambda api: object(), num_workers=1,
+                               latency_budget=0.01, timeout=0.2)
+        uploads = list(pool.get(['a', 'blocked', 'b'], apis=['api'], fetch=self.fetch))
+        self.assertEqual([upload['id'] for upload in uploads], ['a'])
+        self.gate.set()
+        self.assertTrue(pool.join())
+        self.assertNotIn('b', self.fetched)
+
+    def test_stopping_early_cancels_the_pending_channels(self):
+        pool = ParallelUploads(connection_factory=lambda api: object(), num_workers=1)
+        uploads = pool.get(['a', 'blocked', 'b'], apis=['api'], fetch=self.fetch)
+        self.assertEqual(next(uploads)['id'], 'a')
+        uploads.close()
+        self.gate.set()
+        self.assertTrue(pool.join())
+        self.assertNotIn('b', self.fetched)
+
+    def test_join_times_out_on_a_stuck_worker(self):
+        pool = ParallelUploads(connection_factory=lambda api: object(), num_workers=2, timeout=0.1)
+        list(pool.get(['a', 'blocked'], apis=['api'], fetch=self.fetch))
+        self.assertFalse(pool.join(timeout=0.1))
+        self.gate.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
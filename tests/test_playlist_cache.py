@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+"""Tests for the `playlist_cache` module."""
+
+import unittest
+from datetime import datetime, timezone
+
+from youbot.youtube_utils.playlist_cache import PlaylistCache
+
+
+class TestPlaylistCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.cache = PlaylistCache()
+        self.published_at = datetime(2021, 6, 1, tzinfo=timezone.utc)
+        self.cache.store('uploads_1', etag='etag_1', video_id='vid_1', published_at=self.published_at,
+                         video={'id': 'vid_1'})
+
+    def test_hits_only_for_the_same_top_video(self):
+        self.assertEqual(self.cache.get('uploads_1', video_id='vid_1')['video'], {'id': 'vid_1'})
+        self.assertIsNotNone(self.cache.get('uploads_1'))
+        self.assertIsNone(self.cache.get('uploads_1', video_id='vid_2'))
+        self.assertIsNone(self.cache.get('uploads_2'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual(str(self.cache), '1 playlists, 2 hits, 2 misses (50.0% hit ratio)')
+
+    def test_update_etag_keeps_the_entry(self):
+        entry = self.cache.get('uploads_1')
+        self.cache.update_etag('uploads_1', 'etag_2')
+        self.cache.update_etag('uploads_2', 'etag_2')  # Not cached
+        self.assertEqual(self.cache.etag('uploads_1'), 'etag_2')
+        self.assertIsNone(self.cache.etag('uploads_2'))
+        self.assertIs(self.cache.get('uploads_1'), entry)
+        self.assertEqual((entry['video_id'], entry['published_at']), ('vid_1', self.published_at))
+        self.assertEqual(len(self.cache), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""Tests for the `polling_scheduler` module."""
+
+import unittest
+from datetime import datetime, timedelta
+
+from youbot.youtube_utils.polling_scheduler import PollingScheduler
+
+
+class TestPollingScheduler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.scheduler = PollingScheduler(fast_interval=10, slow_interval=100, default_interval=30)
+        # Uploads every weekday at 17:00
+        monday = datetime(2021, 6, 7, 17, 0)
+        self.scheduler.fit({'regular': [monday + timedelta(days=day) for day in range(5)],
+                            'new': [monday]})
+
+    def test_upload_windows(self):
+        self.assertTrue(self.scheduler.in_window('regular', datetime(2021, 6, 14, 16, 50)))
+        self.assertFalse(self.scheduler.in_window('regular', datetime(2021, 6, 14, 12, 0)))
+        self.assertIsNone(self.scheduler.in_window('new', datetime(2021, 6, 14, 16, 50)))
+
+    def test_due_channels(self):
+        start = datetime(2021, 6, 14, 16, 30)
+        channels = ['new', 'regular']
+        self.assertListEqual(self.scheduler.due_channels(channels, now=start), channels)
+        self.assertListEqual(self.scheduler.due_channels(channels, now=start + timedelta(seconds=30)),
+                             ['new'])
+        # The window starts at 16:40: The channel does not wait for the rest of its slow interval
+        in_window = datetime(2021, 6, 14, 16, 41)
+        self.assertListEqual(self.scheduler.due_channels(['regular'], now=in_window), ['regular'])
+        self.assertEqual(self.scheduler.seconds_until_due(['regular'], now=in_window), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+"""Tests for the `pooled_mysql` module."""
+
+import unittest
+from functools import partial
+from unittest import mock
+
+from mysql.connector import errors
+
+from youbot.pooled_mysql import PooledHighMySQL, _RetryingCursor, _ThreadConnection
+
+
+class TestRetryingCursor(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.thread_connection = mock.Mock(in_transaction=False)
+        self.thread_connection.run = partial(_ThreadConnection.run, self.thread_connection)
+        self.cursor = _RetryingCursor(self.thread_connection, health_check_interval=30)
+        self.thread_connection.raw_cursor.execute.side_effect = [
+            errors.OperationalError(msg='Lost connection to MySQL server during query', errno=2013),
+            None]
+
+    def test_retries_idempotent_statements(self):
+        self.cursor.execute("SELECT * FROM channels")
+        self.thread_connection.reconnect.assert_called_once()
+        self.assertEqual(self.thread_connection.raw_cursor.execute.call_count, 2)
+
+    def test_does_not_retry_inserts(self):
+        with self.assertRaises(errors.OperationalError):
+            self.cursor.execute("INSERT INTO comments SET video_link='link'")
+        self.thread_connection.reconnect.assert_not_called()
+
+    def test_does_not_retry_in_transactions(self):
+        self.thread_connection.in_transaction = True
+        with self.assertRaises(errors.OperationalError):
+            self.cursor.execute("UPDATE channels SET active='false'")
+        self.thread_connection.reconnect.assert_not_called()
+
+    def test_is_idempotent(self):
+        self.assertTrue(PooledHighMySQL.is_idempotent("  update channels SET active='false'"))
+        self.assertTrue(PooledHighMySQL.is_idempotent("CREATE TABLE IF NOT EXISTS channels (..)"))
+        self.assertFalse(PooledHighMySQL.is_idempotent("CREATE TABLE channels (..)"))
+
+
+class TestStatementCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.pool = mock.Mock()
+        self.pool.get_connection.return_value.cursor.side_effect = \
+            lambda prepared=False: mock.Mock(with_rows=True, fetchall=mock.Mock(return_value=[(1,)]))
+        self.thread_connection = _ThreadConnection(self.pool, config={}, statement_cache_size=2)
+
+    def test_reuses_the_prepared_statement(self):
+        rows = self.thread_connection.execute_prepared("SELECT 1 FROM channels WHERE channel_id=%s",
+                                                       ('ch',))
+        operation, cursor = self.thread_connection.statements["SELECT 1 FROM channels WHERE channel_id=%s"]
+        # An equal but distinct string must be executed with the SQL object the cursor prepared
+        self.thread_connection.execute_prepared(''.join(["SELECT 1 FROM channels ",
+                                                         "WHERE channel_id=%s"]), ('other',))
+        self.assertEqual(rows, [(1,)])
+        self.assertEqual(cursor.execute.call_count, 2)
+        self.assertIs(cursor.execute.call_args.args[0], operation)
+        self.assertEqual(cursor.execute.call_args.args[1], ('other',))
+
+    def test_evicts_the_least_recently_used(self):
+        for query in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+            self.thread_connection.execute_prepared(query, ())
+        self.assertEqual(list(self.thread_connection.statements), ["SELECT 1", "SELECT 3"])
+
+    def test_variable_length_statements_skip_the_cache(self):
+        db = PooledHighMySQL.__new__(PooledHighMySQL)
+        db.health_check_interval = 30
+        db._thread_connection = lambda: self.thread_connection
+        self.thread_connection.execute_prepared("SELECT 1", ())
+        rows = db.execute("DELETE FROM comments WHERE video_link IN (%s, %s)", ['a', 'b'],
+                          prepared=False)
+        self.assertEqual(rows, [(1,)])
+        self.thread_connection.raw_cursor.execute.assert_called_once_with(
+            "DELETE FROM comments WHERE video_link IN (%s, %s)", ('a', 'b'))
+        self.assertEqual(list(self.thread_connection.statements), ["SELECT 1"])
+
+    def test_reconnect_drops_the_statements(self):
+        self.thread_connection.execute_prepared("SELECT 1", ())
+        self.thread_connection.reconnect()
+        self.assertEqual(len(self.thread_connection.statements), 0)
+
+
+class TestStream(unittest.TestCase):
+
+    def test_discards_the_unread_rows(self):
+        db = PooledHighMySQL.__new__(PooledHighMySQL)
+        db.health_check_interval = 30
+        cursor = mock.Mock(with_rows=True)
+        cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+        thread_connection = mock.Mock(in_transaction=False)
+        thread_connection.run = partial(_ThreadConnection.run, thread_connection)
+        thread_connection.execute_prepared.return_value = cursor
+        db._thread_connection = lambda: thread_connection
+        self.assertEqual(list(db.stream("SELECT 1", batch_size=2)), [(1,), (2,), (3,)])
+        cursor.fetchall.assert_not_called()
+        cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)]]
+        rows = db.stream("SELECT 1", batch_size=2)
+        next(rows)
+        rows.close()
+        cursor.fetchall.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+"""Tests for the `seen_video_index` module."""
+
+import unittest
+from datetime import datetime, timedelta
+
+from youbot.youtube_utils.seen_video_index import SeenVideoIndex
+
+
+class TestSeenVideoIndex(unittest.TestCase):
+
+    def test_load_and_evict(self):
+        index = SeenVideoIndex(window_hours=2)
+        now = datetime.utcnow()
+        index.load([('recent', (now - timedelta(minutes=10)).isoformat()),
+                    ('youtube', (now - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')),
+                    ('expired', (now - timedelta(hours=3)).isoformat())])
+        self.assertIn('recent', index)
+        self.assertIn('youtube', index)
+        self.assertNotIn('expired', index)
+        index.add('new')
+        self.assertEqual(index.evict(now + timedelta(hours=1, minutes=30)), 1)
+        self.assertNotIn('youtube', index)
+        self.assertEqual(len(index), 2)
+
+    def test_video_id(self):
+        self.assertEqual(SeenVideoIndex.video_id('https://youtube.com/watch?v=dQw4w9WgXcQ&lc=abc'),
+                         'dQw4w9WgXcQ')
+
+
+if __name__ == '__main__':
+    unittest.main()
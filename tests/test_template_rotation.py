@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""Tests for the `template_rotation` module."""
+
+import unittest
+from datetime import datetime, timedelta
+
+from youbot.youtube_utils.template_rotation import TemplateRotation
+
+
+class TestTemplateRotation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rotation = TemplateRotation()
+        self.rotation.set_pools({'default': ['a', 'b', 'c'], 'ch_own': ['x', 'y'], 'ch_mixed': ['x']},
+                                {'ch_1': 0, 'ch_own': 1, 'ch_mixed': 0})
+        self.now = datetime(2021, 6, 1, 12)
+
+    def test_unused_templates_first(self):
+        self.rotation.load([{'channel_id': 'ch_1', 'comment': 'a', 'comment_time': '2021-06-01T10:00:00'},
+                            {'channel_id': 'ch_1', 'comment': 'c', 'comment_time': '2021-06-01T11:00:00Z'}])
+        self.assertEqual(self.rotation.next('ch_1'), 'b')
+        self.assertEqual(self.rotation.next('ch_1'), 'a')
+        self.assertEqual(self.rotation.next('ch_1'), 'c')
+        self.assertEqual(self.rotation.next('ch_1'), 'b')
+
+    def test_pools(self):
+        self.assertEqual({self.rotation.next('ch_own') for _ in range(2)}, {'x', 'y'})
+        self.assertEqual({self.rotation.next('ch_mixed') for _ in range(4)}, {'a', 'b', 'c', 'x'})
+        with self.assertRaises(KeyError):
+            self.rotation.next('ch_unknown')
+
+    def test_mark_used_reorders(self):
+        for ind, template in enumerate('abc'):
+            self.rotation.mark_used('ch_1', template, self.now + timedelta(minutes=ind))
+        self.assertEqual(self.rotation.next('ch_1'), 'a')
+        self.rotation.mark_used('ch_1', 'b', datetime.utcnow() + timedelta(days=1))
+        # Older times than the known ones are ignored
+        self.rotation.mark_used('ch_1', 'c', self.now - timedelta(days=1))
+        # `b` is only due after `c` and `a` are posted again
+        self.assertEqual([self.rotation.next('ch_1') for _ in range(3)], ['c', 'a', 'c'])
+
+    def test_set_pools_keeps_the_history(self):
+        self.rotation.mark_used('ch_1', 'a', self.now)
+        self.rotation.mark_used('ch_1', 'd', self.now + timedelta(minutes=1))
+        self.rotation.next('ch_1')
+        self.rotation.set_pools({'default': ['a', 'd']}, {'ch_1': 0})
+        self.assertEqual(self.rotation.next('ch_1'), 'a')
+        self.assertEqual(self.rotation.next('ch_1'), 'd')
+
+
+if __name__ == '__main__':
+    unittest.main()
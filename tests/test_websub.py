@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""End to end tests for the `websub` module using a local stand-in hub."""
+
+import hmac
+import hashlib
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+import requests
+
+from youbot.youtube_utils.websub import WebSubServer
+
+ATOM_PAYLOAD = """<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <link rel="hub" href="https://pubsubhubbub.appspot.com"/>
+  <title>YouTube video feed</title>
+  <entry>
+    <id>yt:video:{video_id}</id>
+    <yt:videoId>{video_id}</yt:videoId>
+    <yt:channelId>{channel_id}</yt:channelId>
+    <title>A new video</title>
+    <author>
+     <name>Channel Title</name>
+     <uri>https://www.youtube.com/channel/{channel_id}</uri>
+    </author>
+    <published>2022-06-01T12:00:00+00:00</published>
+    <updated>2022-06-01T12:00:01+00:00</updated>
+  </entry>
+</feed>"""
+
+
+class StandInHub:
+    """ Verifies every subscription request with the subscriber and then publishes
+    an upload of the subscribed channel to it. """
+
+    def __init__(self):
+        self.verified = []
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                form = {key: value[0] for key, value in parse_qs(body).items()}
+                self.send_response(202)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                threading.Thread(target=hub.verify_and_publish, args=(form,)).start()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}/subscribe'
+
+    def verify_and_publish(self, form):
+        response = requests.get(form['hub.callback'],
+                                params={'hub.mode': form['hub.mode'],
+                                        'hub.topic': form['hub.topic'],
+                                        'hub.challenge': 'challenge123',
+                                        'hub.lease_seconds': form['hub.lease_seconds']})
+        if response.status_code != 200 or response.text != 'challenge123':
+            return
+        self.verified.append(form['hub.topic'])
+        channel_id = form['hub.topic'].split('channel_id=')[1]
+        body = ATOM_PAYLOAD.format(video_id='dQw4w9WgXcQ', channel_id=channel_id).encode()
+        signature = hmac.new(form['hub.secret'].encode(), body, hashlib.sha1).hexdigest()
+        requests.post(form['hub.callback'], data=body,
+                      headers={'Content-Type': 'application/atom+xml',
+                               'X-Hub-Signature': f'sha1={signature}'})
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TestWebSubServer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.hub = StandInHub()
+        self.websub = WebSubServer(callback_url='', host='127.0.0.1', port=0,
+                                   hub_url=self.hub.url, secret='secret').start()
+        self.websub.callback_url = f'http://127.0.0.1:{self.websub.port}/'
+
+    def tearDown(self) -> None:
+        self.websub.stop()
+        self.hub.stop()
+
+    def test_subscribe_and_receive_upload(self):
+        self.websub.subscribe(['UC-ImLFXGIe2FC4Wo5hOodnw'])
+        self.assertTrue(self.websub.wait(timeout=5))
+        uploads = self.websub.get_uploads()
+        self.assertEqual(self.hub.verified,
+                         ['https://www.youtube.com/xml/feeds/videos.xml?'
+                          'channel_id=UC-ImLFXGIe2FC4Wo5hOodnw'])
+        self.assertEqual(uploads, [{'id': 'dQw4w9WgXcQ',
+                                    'published_at': '2022-06-01T12:00:00+00:00',
+                                    'title': 'A new video',
+                                    'channel_title': 'Channel Title',
+                                    'channel_id': 'UC-ImLFXGIe2FC4Wo5hOodnw'}])
+
+    def test_subscribe_in_background(self):
+        self.websub.subscribe_in_background(['UC-ImLFXGIe2FC4Wo5hOodnw'])
+        self.assertTrue(self.websub.wait(timeout=5))
+        self.assertEqual([upload['id'] for upload in self.websub.get_uploads()], ['dQw4w9WgXcQ'])
+        # Subscribed already, nothing is sent
+        self.websub.subscribe_in_background(['UC-ImLFXGIe2FC4Wo5hOodnw'])
+        self.assertEqual(len(self.hub.verified), 1)
+
+    def test_requires_a_secret(self):
+        with self.assertRaises(ValueError):
+            WebSubServer(callback_url='', secret=None, host='127.0.0.1', port=0)
+
+    def test_rejects_unknown_topics_and_bad_signatures(self):
+        callback = self.websub.callback_url
+        response = requests.get(callback, params={
+            'hub.mode': 'subscribe', 'hub.challenge': 'x',
+            'hub.topic': 'https://www.youtube.com/xml/feeds/videos.xml?channel_id=UCunknown'})
+        self.assertEqual(response.status_code, 404)
+        body = ATOM_PAYLOAD.format(video_id='dQw4w9WgXcQ', channel_id='UCunknown').encode()
+        requests.post(callback, data=body, headers={'X-Hub-Signature': 'sha1=0000'})
+        requests.post(callback, data=body)  # Unsigned
+        self.assertEqual(self.websub.get_uploads(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+"""Tests for the `youtube_api` module."""
+
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from youbot.youtube_utils.playlist_cache import PlaylistCache
+from youbot.youtube_utils.youtube_api import YoutubeApiV3
+
+
+class TestYoutubeApiV3(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.api = mock.Mock()
+        self.youtube = YoutubeApiV3.__new__(YoutubeApiV3)
+        self.youtube.channel_id = 'self_channel'
+        self.youtube._apis = [self.api]
+        self.youtube.credential_pool = mock.Mock()
+        self.youtube.credential_pool.get.return_value = self.api
+        self.youtube.credential_pool.is_quota_exceeded.return_value = False
+
+    def test_comment_returns_the_thread_id(self):
+        self.api.commentThreads().insert().execute.return_value = {'id': 'thread_1'}
+        self.assertEqual(self.youtube.comment(video_id='vid', comment_text='Hi'), 'thread_1')
+
+    def test_comment_raises_when_not_posted(self):
+        self.api.commentThreads().insert().execute.side_effect = Exception('quotaExceeded')
+        with self.assertRaises(Exception):
+            self.youtube.comment(video_id='vid', comment_text='Hi')
+
+    def test_get_comments_by_id_in_batches_of_50(self):
+        def list_threads(part, id, fields):
+            request = mock.Mock()
+            request.execute.return_value = {'items': [
+                {'id': comment_id,
+                 'snippet': {'videoId': f'v_{comment_id}', 'totalReplyCount': 1,
+                             'topLevelComment': {'snippet': {'likeCount': 2,
+                                                             'publishedAt': '2021-06-01T17:00:00Z'}}}}
+                for comment_id in id.split(',')]}
+            return request
+
+        self.api.commentThreads().list.side_effect = list_threads
+        comment_ids = [f'c{ind}' for ind in range(120)]
+        comments = self.youtube.get_comments_by_id(comment_ids)
+        self.assertEqual([len(call.kwargs['id'].split(','))
+                          for call in self.api.commentThreads().list.call_args_list], [50, 50, 20])
+        self.assertEqual([comment['comment_id'] for comment in comments], comment_ids)
+        self.assertEqual(comments[0], {'url': 'https://youtube.com/watch?v=v_c0', 'video_id': 'v_c0',
+                                       'comment_id': 'c0', 'like_count': 2, 'reply_count': 1,
+                                       'comment_time': '2021-06-01T17:00:00Z'})
+        self.assertEqual(self.youtube.credential_pool.spend.call_count, 3)
+
+    def test_push_uploads_not_handled_are_queued_again(self):
+        self.youtube.websub = mock.Mock()
+        self.youtube.websub_conf = {'poll_every': 60}
+        self.youtube._push_calls = 0
+        now = datetime.now(timezone.utc).isoformat()
+        pushed = [{'id': 'a', 'channel_id': 'ch_1', 'published_at': now},
+                  {'id': 'b', 'channel_id': 'ch_0', 'published_at': now},
+                  {'id': 'c', 'channel_id': 'ch_1', 'published_at': now}]
+        self.youtube.websub.get_uploads.return_value = pushed
+        uploads = self.youtube.get_uploads_push(['ch_0', 'ch_1'])
+        self.assertEqual(next(uploads)['id'], 'b')
+        self.assertEqual(next(uploads)['id'], 'a')
+        uploads.close()  # E.g. the caller raised while handling `a`
+        self.youtube.websub.subscribe_in_background.assert_called_once_with(['ch_0', 'ch_1'])
+        self.assertEqual(list(self.youtube.websub.put_back.call_args.args[0]), [pushed[0], pushed[2]])
+
+
+class TestConditionalPlaylistPolling(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.api = mock.Mock()
+        self.youtube = YoutubeApiV3.__new__(YoutubeApiV3)
+        self.youtube.credential_pool = mock.Mock()
+        self.youtube.credential_pool.is_quota_exceeded.return_value = False
+        self.youtube.channel_playlists = {'ch_1': 'uploads_1'}
+        self.youtube.playlist_cache = PlaylistCache()
+        self.requests = []
+
+    def respond(self, *results) -> None:
+        """ The next playlistItems requests return (or raise) the specified results. """
+
+        def list_items(**kwargs):
+            request = mock.Mock()
+            request.headers = {}
+            result = next(results)
+            if isinstance(result, Exception):
+                request.execute.side_effect = result
+            else:
+                request.execute.return_value = result
+            self.requests.append(request)
+            return request
+
+        results = iter(results)
+        self.api.playlistItems().list.side_effect = list_items
+
+    @staticmethod
+    def response(etag: str, video_id: str, published_at: str) -> dict:
+        return {'etag': etag, 'items': [{'id': f'item_{video_id}', 'snippet': {
+            'title': 'Title', 'publishedAt': published_at, 'resourceId': {'videoId': video_id}}}]}
+
+    def poll(self) -> list:
+        return list(self.youtube._get_uploads_playlist(self.api, 'ch_1', 'uploads_1',
+                                                       max_posted_hours=2))
+
+    def test_not_modified_response(self):
+        not_modified = HttpError(httplib2.Response({'status': 304}), b'')
+        self.assertTrue(self.youtube._is_not_modified(not_modified))
+        self.assertFalse(self.youtube._is_not_modified(
+            HttpError(httplib2.Response({'status': 500}), b'')))
+        self.respond(self.response('etag_1', 'vid_1', '2020-01-01T10:00:00Z'), not_modified)
+        self.assertEqual(self.poll(), [None])  # Too old
+        entry = self.youtube.playlist_cache.get('uploads_1')
+        self.assertEqual(self.poll(), [None])  # No uploads
+        self.assertEqual(self.requests[1].headers['If-None-Match'], 'etag_1')
+        self.assertIs(self.youtube.playlist_cache.get('uploads_1'), entry)
+        self.assertEqual(entry['etag'], 'etag_1')
+        self.assertIn('ch_1', self.youtube.channel_playlists)  # Not skipped
+
+    def test_unchanged_top_item_is_not_parsed_again(self):
+        self.respond(self.response('etag_1', 'vid_1', '2020-01-01T10:00:00Z'),
+                     self.response('etag_2', 'vid_1', '2020-01-01T10:00:00Z'))
+        self.poll()
+        entry = self.youtube.playlist_cache.get('uploads_1')
+        published_at = entry['published_at']
+        misses = self.youtube.playlist_cache.misses
+        with mock.patch('dateutil.parser.parse') as parse:
+            self.assertEqual(self.poll(), [None])  # No uploads
+        parse.assert_not_called()
+        self.assertEqual(self.youtube.playlist_cache.misses, misses)
+        self.assertIs(self.youtube.playlist_cache.get('uploads_1'), entry)
+        self.assertIs(entry['published_at'], published_at)
+        self.assertEqual((entry['video_id'], entry['etag']), ('vid_1', 'etag_2'))
+
+    def test_new_top_item_replaces_the_cache_entry(self):
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.respond(self.response('etag_1', 'vid_1', '2020-01-01T10:00:00Z'),
+                     self.response('etag_2', 'vid_2', now))
+        self.poll()
+        [upload] = self.poll()
+        self.assertEqual(upload, {'id': 'vid_2', 'published_at': now, 'title': 'Title'})
+        entry = self.youtube.playlist_cache.get('uploads_1')
+        self.assertEqual((entry['video_id'], entry['etag']), ('vid_2', 'etag_2'))
+
+
+class FakeBatch:
+    """ Calls the callback of the batch with the result of every sub-request on execute. """
+
+    def __init__(self, callback, results: dict) -> None:
+        self.callback = callback
+        self.results = results
+        self.request_ids = []
+
+    def add(self, request, request_id: str) -> None:
+        self.request_ids.append(request_id)
+
+    def execute(self) -> None:
+        for request_id in self.request_ids:
+            result = self.results[request_id]
+            if isinstance(result, Exception):
+                self.callback(request_id, None, result)
+            else:
+                self.callback(request_id, result, None)
+
+
+class TestBatchPolling(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.api = mock.Mock()
+        self.api.playlistItems().list.side_effect = lambda **kwargs: mock.Mock(headers={})
+        self.youtube = YoutubeApiV3.__new__(YoutubeApiV3)
+        self.youtube.credential_pool = mock.Mock()
+        self.youtube.credential_pool.get.return_value = self.api
+        self.youtube.credential_pool.is_quota_exceeded.side_effect = \
+            lambda e: 'quotaExceeded' in str(e)
+        self.youtube.playlist_cache = PlaylistCache()
+        self.youtube.channel_playlists = {
+            ch_id: {'id': ch_id, 'snippet': {'title': f'Title of {ch_id}'},
+                    'contentDetails': {'relatedPlaylists': {'uploads': f'uploads_{ch_id}'}}}
+            for ch_id in ('ch_new', 'ch_broken', 'ch_quota', 'ch_unchanged')}
+        self.batches = []
+        self.now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        # Polled before, so its request is conditional
+        self.youtube.playlist_cache.store('uploads_ch_unchanged', etag='etag_1', video_id='vid_old',
+                                          published_at=datetime(2020, 1, 1, tzinfo=timezone.utc),
+                                          video={'id': 'vid_old'})
+
+    def respond(self, results: dict) -> None:
+        def new_batch(callback):
+            self.batches.append(FakeBatch(callback, results))
+            return self.batches[-1]
+
+        self.api.new_batch_http_request.side_effect = new_batch
+
+    def test_sub_request_errors(self):
+        self.respond({
+            'ch_new': TestConditionalPlaylistPolling.response('etag_2', 'vid_new', self.now),
+            'ch_broken': HttpError(httplib2.Response({'status': 404}), b'playlistNotFound'),
+            'ch_quota': Exception('quotaExceeded'),
+            'ch_unchanged': HttpError(httplib2.Response({'status': 304}), b'')})
+        channels = ['ch_quota', 'ch_unchanged', 'ch_broken', 'ch_new', 'ch_unknown']
+        uploads = list(self.youtube.get_uploads_batch(channels))
+        self.assertEqual([(upload['id'], upload['channel_id']) for upload in uploads],
+                         [('vid_new', 'ch_new')])
+        [batch] = self.batches
+        self.assertEqual(batch.request_ids, channels[:-1])  # Unknown channels are not polled
+        # The broken playlist is not polled again, the other channels are kept
+        self.assertEqual(sorted(self.youtube.channel_playlists),
+                         ['ch_new', 'ch_quota', 'ch_unchanged'])
+        self.youtube.credential_pool.quarantine.assert_called_once_with(self.api)
+        self.youtube.credential_pool.spend.assert_called_once_with(self.api, 'playlistItems.list',
+                                                                   count=4)
+        # Not modified: The cache entry is kept
+        self.assertEqual(self.youtube.playlist_cache.get('uploads_ch_unchanged')['video_id'],
+                         'vid_old')
+
+    def test_batches_of_50(self):
+        self.youtube.channel_playlists = {
+            f'ch_{ind}': {'id': f'ch_{ind}', 'snippet': {'title': 'Title'},
+                          'contentDetails': {'relatedPlaylists': {'uploads': f'uploads_{ind}'}}}
+            for ind in range(70)}
+        self.respond({f'ch_{ind}': {'etag': f'etag_{ind}', 'items': []} for ind in range(70)})
+        self.assertEqual(list(self.youtube.get_uploads_batch([f'ch_{ind}' for ind in range(70)])), [])
+        self.assertEqual([len(batch.request_ids) for batch in self.batches], [50, 20])
+        self.assertEqual([call.kwargs['count'] for call in
+                          self.youtube.credential_pool.spend.call_args_list], [50, 20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""Tests for the `youtube_manager` module."""
+
+import time
+import unittest
+from unittest import mock
+
+from youbot.youtube_utils.comment_poster import CommentPoster
+from youbot.youtube_utils.youtube_manager import YoutubeManager, YoutubeManagerError
+
+
+class TestCommenterShutdown(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.youtube = YoutubeManager.__new__(YoutubeManager)
+        self.youtube.db = mock.Mock()
+        self.youtube.db.add_comments.return_value = []
+        self.youtube.template_rotation = mock.Mock()
+        self.youtube.crashed_file = None
+        self.youtube.log_shipper = None
+        self.youtube.comment_poster = CommentPoster(post=self._post).start()
+
+    @staticmethod
+    def _post(pending):
+        pending['comment_id'] = f"id_{pending['video']['id']}"
+        pending['comment_time'] = '2021-06-01T17:00:00'
+
+    @staticmethod
+    def pending(video_id: str) -> dict:
+        return {'video': {'id': video_id, 'channel_id': 'ch_1', 'published_at': '2021-06-01T16:59:00',
+                          'title': 'Title'},
+                'video_url': f'https://youtube.com/watch?v={video_id}', 'comment_text': 'Hi'}
+
+    def test_stores_the_posted_comments_when_stopped(self):
+        self.youtube.comment_poster.schedule(self.pending('posted'))
+        self.youtube.comment_poster.schedule(self.pending('delayed'), delay=60)
+        deadline = time.monotonic() + 5
+        while self.youtube.comment_poster.pending > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.youtube._stop_comment_poster()
+        [comments] = self.youtube.db.add_comments.call_args.args
+        self.assertEqual([(comment['video_link'], comment['comment_id']) for comment in comments],
+                         [('https://youtube.com/watch?v=posted', 'id_posted')])
+        self.youtube.template_rotation.mark_used.assert_called_once_with(
+            'ch_1', 'Hi', '2021-06-01T17:00:00')
+
+    def test_raises_when_the_posted_comments_are_not_stored(self):
+        self.youtube.db.add_comments.side_effect = lambda comments: comments
+        self.youtube.comment_poster.schedule(self.pending('posted'))
+        self.youtube.comment_poster.flush(timeout=5)
+        with mock.patch.object(YoutubeManager, 'touch') as touch:
+            with self.assertRaises(YoutubeManagerError):
+                self.youtube._stop_comment_poster()
+        touch.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
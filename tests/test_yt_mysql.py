@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""Tests for the `yt_mysql` module."""
+
+import unittest
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+from youbot import YoutubeMySqlDatastore
+
+
+class TestYoutubeMySqlDatastore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Skip the connection pool, only the generated statements are checked
+        self.db = YoutubeMySqlDatastore.__new__(YoutubeMySqlDatastore)
+        self.cursor = mock.Mock()
+        self.db._local = SimpleNamespace(connection=mock.Mock(), cursor=self.cursor)
+        self.db.execute = mock.Mock(return_value=[])
+        self.db.schema_version = 1
+        self.db.get_schema_version = mock.Mock(side_effect=lambda table=None: self.db.schema_version)
+
+        @contextmanager
+        def transaction():
+            yield self.cursor
+
+        self.db.transaction = transaction
+        self.comments = [{'ch_id': f'ch_{ind % 2}', 'video_link': f'https://youtube.com/watch?v={ind}',
+                          'comment_text': "It's great", 'comment_time': f'2021-06-0{ind + 1}T17:00:00',
+                          'upload_time': '2021-06-01T16:59:00Z', 'video_title': 'Title'}
+                         for ind in range(3)]
+
+    def statements(self):
+        return [(call.args[0], list(call.args[1]) if len(call.args) > 1 else [])
+                for call in self.db.execute.call_args_list]
+
+    def test_add_comments(self):
+        self.comments[1]['comment_id'] = 'abc'
+        self.db.add_comments(self.comments)
+        (insert, insert_params), (update, update_params) = self.statements()
+        self.assertEqual(insert.count("(%s, %s, %s, %s, %s, %s, %s, %s, %s)"), 3)
+        self.assertEqual(len(insert_params), 27)
+        self.assertEqual(insert_params[:9], ['ch_0', 'https://youtube.com/watch?v=0', '0', "It's great",
+                                             '2021-06-01T17:00:00', '2021-06-01T16:59:00Z', 'Title',
+                                             'None', 'None'])
+        self.assertEqual(insert_params[16:18], ['abc', 'https://youtube.com/watch?v=1&lc=abc'])
+        self.assertIn("CASE channel_id WHEN %s THEN %s WHEN %s THEN %s END", update)
+        self.assertEqual(update_params, ['ch_0', '2021-06-03T17:00:00', 'ch_1', '2021-06-02T17:00:00',
+                                         'ch_0', 'ch_1'])
+
+    def test_add_comments_falls_back_to_add_comment(self):
+        self.db.execute.side_effect = Exception('Duplicate entry')
+        with mock.patch.object(self.db, 'add_comment') as add_comment:
+            self.db.add_comments(self.comments)
+        self.assertEqual(add_comment.call_count, 3)
+
+    def test_update_comments(self):
+        self.db.update_comments([{'video_link': 'https://youtube.com/watch?v=first', 'like_cnt': 5,
+                                  'comment_id': 'abc', 'video_title': "It's a title"},
+                                 {'video_link': 'https://youtube.com/watch?v=second', 'reply_cnt': 1}],
+                                chunk_size=2)
+        [(query, params)] = self.statements()
+        self.assertIn("SELECT %s AS video_link, %s AS video_id, %s AS comment_id, %s AS comment_link, "
+                      "%s AS like_count, NULL AS reply_count, %s AS video_title", query)
+        self.assertIn("UNION ALL SELECT %s, %s, NULL, NULL, NULL, %s, NULL", query)
+        self.assertIn("c.like_count=COALESCE(u.like_count, c.like_count)", query)
+        self.assertEqual(params, ['https://youtube.com/watch?v=first', 'first', 'abc',
+                                  'https://youtube.com/watch?v=first&lc=abc', 5, "It's a title",
+                                  'https://youtube.com/watch?v=second', 'second', 1])
+
+    def test_update_comment_binds_the_values(self):
+        self.db.update_comment(video_link="https://youtube.com/watch?v=x", video_title="It's")
+        [(query, params)] = self.statements()
+        self.assertEqual(query, "UPDATE comments SET video_id=%s, video_title=%s WHERE video_link=%s")
+        self.assertEqual(params, ['x', "It's", 'https://youtube.com/watch?v=x'])
+
+    def test_add_comments_v2_times(self):
+        self.db.schema_version = 2
+        self.db.add_comments(self.comments[:1])
+        (_, insert_params), (_, update_params) = self.statements()
+        self.assertEqual(insert_params[4:6], [datetime(2021, 6, 1, 17), datetime(2021, 6, 1, 16, 59)])
+        self.assertEqual(update_params[1], datetime(2021, 6, 1, 17))
+
+    def test_get_comments_null_filters(self):
+        for schema_version, null_check in ((1, "(upload_time='None' OR upload_time='-1')"),
+                                           (2, "upload_time IS NULL")):
+            self.db.schema_version = schema_version
+            list(self.db.get_comments(comment_cols=['video_link'], only_null_upload=True,
+                                      channel_id='ch_0'))
+            query, params = self.statements()[-1]
+            self.assertIn(null_check, query)
+            self.assertEqual(params, [-1, 999999, -1, 999999, 'ch_0', 50])
+        self.assertIn("COALESCE(like_count, -1) BETWEEN %s AND %s", query)
+
+    def test_get_comment_history(self):
+        self.db.stream = mock.Mock(return_value=iter([('ch_0', 'link', 'Nice', '2021-06-01T17:00:00', 1, 0)]))
+        comments = list(self.db.get_comment_history(channel_ids=['ch_0', 'ch_1'],
+                                                    since='2021-06-01T15:00:00',
+                                                    n_recent=500, min_likes=5))
+        query, params = self.db.stream.call_args.args
+        self.assertIn("ROW_NUMBER() OVER (PARTITION BY channel_id, COALESCE(like_count, -1)>=%s "
+                      "ORDER BY comment_time DESC) AS rn", query)
+        self.assertIn("WHERE channel_id IN (%s, %s)", query)
+        self.assertEqual(params, [500, '2021-06-01T15:00:00', 5, 5, 'ch_0', 'ch_1', 500,
+                                  '2021-06-01T15:00:00'])
+        self.assertEqual(comments, [{'channel_id': 'ch_0', 'video_link': 'link', 'comment': 'Nice',
+                                     'comment_time': '2021-06-01T17:00:00', 'top': 1, 'recent': 0}])
+
+    def test_get_comments_pages_with_a_keyset(self):
+        self.db.execute.side_effect = [[('c1', 't3', 'link3'), ('c2', 't2', 'link2')],
+                                       [('c3', 't1', 'link1')]]
+        comments = list(self.db.get_comments(comment_cols=['comment'], n_recent=5, page_size=2))
+        self.assertEqual(comments, [{'comment': 'c1'}, {'comment': 'c2'}, {'comment': 'c3'}])
+        (first, first_params), (second, second_params) = self.statements()
+        self.assertIn("SELECT comment,comment_time,video_link FROM comments", first)
+        self.assertIn("ORDER BY comment_time desc, video_link desc LIMIT %s", first)
+        self.assertEqual(first_params[-1], 2)
+        self.assertIn("AND (comment_time, video_link)<(%s, %s)", second)
+        self.assertEqual(second_params[-3:], ['t2', 'link2', 2])
+
+    def test_get_channels_pages_with_a_keyset(self):
+        self.db.execute.side_effect = [[('a', 1024), ('b', 2048)], []]
+        channels = list(self.db.get_channels(channel_cols=['channel_id'], page_size=2))
+        self.assertEqual(channels, [{'channel_id': 'a'}, {'channel_id': 'b'}])
+        (first, first_params), (second, second_params) = self.statements()
+        self.assertIn("WHERE (active IS TRUE) ORDER BY priority asc LIMIT %s", first)
+        self.assertIn("WHERE (active IS TRUE) AND priority>%s", second)
+        self.assertEqual(second_params, [2048, 2])
+
+    def test_set_priority_updates_one_row(self):
+        self.db.execute.side_effect = [[('a', 1024), ('b', 2048), ('c', 3072)], []]
+        self.db.set_priority({'channel_id': 'c'}, priority='2')
+        [_, (query, params)] = self.statements()
+        self.assertEqual(query, "UPDATE channels SET priority=%s WHERE channel_id=%s")
+        self.assertEqual(params, [1536, 'c'])
+
+    def test_set_priority_renumbers_without_a_gap(self):
+        self.db.execute.side_effect = [[('a', 1), ('b', 2), ('c', 3)], [(1, 3)], [], []]
+        self.db.set_priority({'channel_id': 'c'}, priority='1')
+        [_, _, (shift, shift_params), (renumber, params)] = self.statements()
+        self.assertEqual(shift, "UPDATE channels SET priority=priority-%s")
+        self.assertEqual(shift_params, [5])
+        self.assertIn("CASE channel_id WHEN %s THEN %s WHEN %s THEN %s WHEN %s THEN %s END", renumber)
+        self.assertEqual(params, ['c', 1024, 'a', 2048, 'b', 3072, 'c', 'a', 'b'])
+
+    def test_set_priorities(self):
+        self.db.execute.side_effect = [[('a', 1024), ('b', 2048), ('c', 3072), ('d', 4096)],
+                                       [(1024, 4096)], [], []]
+        self.db.set_priorities({'d': 1, 'a': 3})
+        params = self.statements()[-1][1]
+        self.assertEqual(params[:8], ['d', 1024, 'b', 2048, 'a', 3072, 'c', 4096])
+
+    def test_migrate_schema(self):
+        self.db.execute.side_effect = [[(None,)], [('ch_b', 2)], [], [], [(None, 0)],  # Channels
+                                       [(None,)], [('https://youtube.com/watch?v=x', 2)],
+                                       [('https://youtube.com/watch?v=bad', 'yesterday')], [],
+                                       [(None, 0)],  # Comments
+                                       [('ch_b', 2)], [], [], [(None, 0)],  # Channels again
+                                       [], [], [], []]  # Catch up
+        with mock.patch('youbot.yt_mysql.logger') as logger:
+            self.db.migrate_schema(pause=0)
+        statements = self.statements()
+        checks = [(query, params) for query, params in statements if 'NOT (' in query
+                  and query.startswith('SELECT')]
+        copies = [(query, params) for query, params in statements
+                  if query.startswith(('INSERT', 'REPLACE'))]
+        self.assertEqual(len(checks), 5)
+        self.assertEqual(len(copies), 5)
+        self.assertIn("SELECT channel_id, added_on, last_commented FROM channels", checks[0][0])
+        self.assertTrue(copies[0][0].startswith("INSERT INTO channels_v2"))
+        self.assertTrue(copies[0][0].endswith(
+            "ON DUPLICATE KEY UPDATE channel_id=channels_v2.channel_id"))
+        self.assertIn("WHERE (channel_id>%s AND channel_id<=%s) AND NOT (NOT (added_on REGEXP", copies[0][0])
+        self.assertEqual(copies[0][1], ['', 'ch_b'])
+        self.assertIn("NULLIF(like_count, -1)", copies[1][0])
+        self.assertIn("THEN CAST(REPLACE(REPLACE(comment_time, 'T', ' '), 'Z', '') AS DATETIME(6)) END",
+                      copies[1][0])
+        # The comment with the invalid time is reported and left out
+        self.assertIn("Left 1 rows of `comments` with invalid times", logger.error.call_args.args[0])
+        self.assertTrue(copies[2][0].startswith("REPLACE INTO channels_v2"))
+        self.cursor.execute.assert_called_with(
+            "RENAME TABLE channels TO channels_v1, channels_v2 TO channels, "
+            "comments TO comments_v1, comments_v2 TO comments")
+        self.assertIn("FROM comments_v1 WHERE (comment_time>=%s)", copies[4][0])
+        self.assertEqual(self.db.schema_version, 2)
+
+    def test_writes_detect_a_migrated_schema(self):
+        # Migrated by another process while this one runs with the legacy schema
+        self.db.get_schema_version = mock.Mock(return_value=2)
+        self.db.add_comments(self.comments[:1])
+        self.assertEqual(self.db.schema_version, 2)
+        (_, insert_params), _ = self.statements()
+        self.assertEqual(insert_params[4:9], [datetime(2021, 6, 1, 17), datetime(2021, 6, 1, 16, 59),
+                                              'Title', None, None])
+        # Once migrated, the version isn't checked again
+        self.db.add_comments(self.comments[1:2])
+        self.assertEqual(self.db.get_schema_version.call_count, 1)
+
+    def test_add_comment_retries_after_a_migration(self):
+        self.db.get_schema_version = mock.Mock(side_effect=[1, 2])
+        self.db.execute.side_effect = [Exception('Incorrect datetime value'), [], []]
+        self.db.add_comment('ch_0', 'https://youtube.com/watch?v=0', "It's great",
+                            upload_time='2021-06-01T16:59:00Z', video_title='Title')
+        (first, first_params), (retry, retry_params), _ = self.statements()
+        self.assertEqual(first_params[5], '2021-06-01T16:59:00Z')
+        self.assertEqual(retry_params[5], datetime(2021, 6, 1, 16, 59))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Tests for the `yt_sqlite` module."""
+
+import os
+import tempfile
+import unittest
+
+from youbot import YoutubeSqliteDatastore, CommentArchive
+
+
+class TestYoutubeSqliteDatastore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = YoutubeSqliteDatastore(config={'db_path': os.path.join(self.tmp_dir.name, 'bot.db')},
+                                         tag='test')
+        for ind, channel_id in enumerate(('ch_a', 'ch_b', 'ch_c')):
+            self.db.add_channel({'channel_id': channel_id, 'username': f'user_{ind}',
+                                 'added_on': '2021-06-01T00:00:00Z',
+                                 'last_commented': '2021-06-01T00:00:00Z'}, active=True)
+        self.db.add_comments([{'ch_id': f'ch_{"ab"[ind % 2]}',
+                               'video_link': f'https://youtube.com/watch?v={ind}',
+                               'comment_text': "It's great",
+                               'comment_time': f'2021-06-0{ind + 1}T17:00:00',
+                               'upload_time': '2021-06-01T16:59:00Z', 'video_title': 'Title'}
+                              for ind in range(5)])
+
+    def tearDown(self) -> None:
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_wal_mode(self):
+        self.assertEqual(self.db.execute("PRAGMA journal_mode"), [('wal',)])
+
+    def test_add_comments(self):
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM comments"), [(5,)])
+        self.assertEqual(self.db.get_channel_by_id('ch_a')[3], '2021-06-05 17:00:00.000000')
+        self.assertEqual(self.db.execute("SELECT upload_time, video_id FROM comments "
+                                         "WHERE video_link=%s", ('https://youtube.com/watch?v=1',)),
+                         [('2021-06-01 16:59:00.000000', '1')])
+
+    def test_add_comments_with_comment_id(self):
+        self.db.add_comments([{'ch_id': 'ch_c', 'video_link': 'https://youtube.com/watch?v=new',
+                               'comment_text': 'Hi', 'upload_time': None, 'video_title': None,
+                               'comment_id': 'xyz'}])
+        self.assertEqual(self.db.execute("SELECT comment_id, comment_link FROM comments "
+                                         "WHERE channel_id=%s", ('ch_c',)),
+                         [('xyz', 'https://youtube.com/watch?v=new&lc=xyz')])
+        only_null = list(self.db.get_comments(comment_cols=['video_link'], only_null_comment_id=True))
+        self.assertEqual(len(only_null), 5)
+
+    def test_add_comments_returns_the_ones_not_added(self):
+        duplicate = {'ch_id': 'ch_a', 'video_link': 'https://youtube.com/watch?v=0',
+                     'comment_text': 'Again', 'upload_time': None, 'video_title': None}
+        new = dict(duplicate, video_link='https://youtube.com/watch?v=new')
+        new['comment_time'] = '2020-01-01T10:00:00'
+        self.assertEqual(self.db.add_comments([new, duplicate]), [duplicate])
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM comments"), [(6,)])
+        # Added one by one, with the time it was posted
+        self.assertEqual(self.db.execute("SELECT comment_time FROM comments WHERE video_link=%s",
+                                         (new['video_link'],)), [('2020-01-01 10:00:00.000000',)])
+        self.assertEqual(self.db.add_comments([]), [])
+
+    def test_get_comments_pages(self):
+        comments = list(self.db.get_comments(comment_cols=['video_link'], channel_cols=['username'],
+                                             n_recent=4, page_size=3))
+        self.assertEqual([comment['video_link'][-1] for comment in comments], ['4', '3', '2', '1'])
+        self.assertEqual(comments[0]['username'], 'user_0')
+        comments = list(self.db.get_comments(comment_cols=['video_link'], channel_id='ch_b',
+                                             page_size=1))
+        self.assertEqual([comment['video_link'][-1] for comment in comments], ['3', '1'])
+
+    def test_update_comments(self):
+        self.db.update_comments([{'video_link': 'https://youtube.com/watch?v=0', 'like_cnt': 5,
+                                  'comment_id': 'abc'},
+                                 {'video_link': 'https://youtube.com/watch?v=1', 'reply_cnt': 2}])
+        self.db.update_comment(video_link='https://youtube.com/watch?v=2', video_title="It's")
+        rows = self.db.execute("SELECT like_count, reply_count, comment_link, video_title "
+                               "FROM comments ORDER BY video_link LIMIT 3")
+        self.assertEqual(rows, [(5, None, 'https://youtube.com/watch?v=0&lc=abc', 'Title'),
+                                (None, 2, None, 'Title'), (None, None, None, "It's")])
+        only_null = list(self.db.get_comments(comment_cols=['video_link'], only_null_comment_id=True,
+                                              min_likes=-1, max_likes=0))
+        self.assertEqual(len(only_null), 4)
+
+    def test_set_priority(self):
+        self.db.set_priority({'channel_id': 'ch_c'}, priority='1')
+        self.assertEqual([channel['channel_id'] for channel in self.db.get_channels(['channel_id'])],
+                         ['ch_c', 'ch_a', 'ch_b'])
+        # Exhaust the gap between the first two channels to force a renumbering
+        for _ in range(12):
+            self.db.set_priority({'channel_id': 'ch_b'}, priority='2')
+            self.db.set_priority({'channel_id': 'ch_a'}, priority='2')
+        self.db.set_priorities({'ch_b': 1})
+        self.assertEqual(self.db._priority_order(), [('ch_b', 1024), ('ch_c', 2048), ('ch_a', 3072)])
+
+    def test_get_comment_history(self):
+        self.db.update_comments([{'video_link': f'https://youtube.com/watch?v={ind}', 'like_cnt': 10}
+                                 for ind in (0, 2)])
+        history = list(self.db.get_comment_history(channel_ids=['ch_a', 'ch_b'],
+                                                   since='2021-06-04T00:00:00', n_recent=1,
+                                                   min_likes=5))
+        flags = {comment['video_link'][-1]: (comment['top'], comment['recent']) for comment in history}
+        self.assertEqual(flags, {'2': (1, 0), '3': (0, 1), '4': (0, 1)})
+
+    def test_archive_comments(self):
+        self.db.add_comments([{'ch_id': 'ch_a', 'video_link': 'https://youtube.com/watch?v=may',
+                               'comment_text': 'Old', 'comment_time': '2021-05-31T10:00:00',
+                               'upload_time': None, 'video_title': None}])
+        archive = CommentArchive(os.path.join(self.tmp_dir.name, 'archive'))
+        archived = self.db.archive_comments(archive, before='2021-06-03T00:00:00', chunk_size=1)
+        self.assertEqual(archived, 3)
+        self.assertEqual(archive.months(), ['2021-05', '2021-06'])
+        self.assertEqual([row['video_link'][-1] for row in archive.get_comments(['video_link'])],
+                         ['1', '0', 'y'])
+        self.assertEqual(self.db.execute("SELECT video_link FROM comments ORDER BY video_link"),
+                         [(f'https://youtube.com/watch?v={ind}',) for ind in (2, 3, 4)])
+        self.assertEqual(self.db.archive_comments(archive, before='2021-06-03T00:00:00'), 0)
+
+    def test_transaction_rolls_back(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db.remove_channel_by_id('ch_a')
+                raise ValueError
+        self.assertEqual(len(list(self.db.get_channels(['channel_id']))), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,15 @@
 
 from termcolor_logger import ColorLogger
 from yaml_config_wrapper import Configuration, validate_json_schema
+from .async_logging import AsyncLogging
 from cloud_filemanager import DropboxCloudManager
 from high_sql import HighMySQL
+from .pooled_mysql import PooledHighMySQL
 from pyemail_sender import GmailPyEmailSender
+from .comment_archive import CommentArchiveReader, CommentArchive
+from .datastore import YoutubeDatastore
 from .yt_mysql import YoutubeMySqlDatastore
+from .yt_sqlite import YoutubeSqliteDatastore
 from youbot.youtube_utils import YoutubeManager, YoutubeApiV3
 
 __author__ = "drkostas"
@@ -0,0 +1,178 @@
+from typing import List, Optional
+import logging
+import logging.handlers
+from collections import deque
+from threading import Condition
+from youbot import ColorLogger
+
+
+class DroppingLogQueue:
+    """ A bounded FIFO queue of log records that never blocks the threads that log.
+
+    When it is full, room is made by dropping the oldest queued DEBUG record. If there is none,
+    the new record is dropped instead, unless it is a WARNING or worse, in which case the oldest
+    queued record below WARNING is dropped (or, as a last resort, the queue grows past its size).
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = maxsize
+        self.dropped = 0
+        # Entries are [record, queued] lists, a dropped entry is only marked as not queued and
+        # skipped by get(), so that dropping never deletes from the middle of the deque
+        self._entries = deque()
+        self._debug = deque()  # The queued entries of the DEBUG (or lower) records, oldest first
+        self._info = deque()  # The queued entries of the records above DEBUG up to INFO
+        self._size = 0
+        self._skipped = 0  # Dropped entries still in `_entries`
+        self._condition = Condition()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _levels(self, record: Optional[logging.LogRecord]) -> Optional[deque]:
+        if record is None or record.levelno > logging.INFO:
+            return None
+        return self._debug if record.levelno <= logging.DEBUG else self._info
+
+    def _drop_oldest(self, levels: deque) -> bool:
+        if not levels:
+            return False
+        entry = levels.popleft()
+        entry[0], entry[1] = None, False
+        self._size -= 1
+        self._skipped += 1
+        if self._skipped > self.maxsize:
+            self._entries = deque(entry for entry in self._entries if entry[1])
+            self._skipped = 0
+        return True
+
+    def put_nowait(self, record: Optional[logging.LogRecord]) -> None:
+        with self._condition:
+            # The sentinel of the listener (None) is never dropped
+            if record is not None and self._size >= self.maxsize:
+                if self._drop_oldest(self._debug) or \
+                        (record.levelno >= logging.WARNING and self._drop_oldest(self._info)):
+                    self.dropped += 1
+                elif record.levelno < logging.WARNING:
+                    self.dropped += 1
+                    return
+            entry = [record, True]
+            self._entries.append(entry)
+            levels = self._levels(record)
+            if levels is not None:
+                levels.append(entry)
+            self._size += 1
+            self._condition.notify()
+
+    def get(self, block: bool = True) -> Optional[logging.LogRecord]:
+        with self._condition:
+            while True:
+                while block and not self._entries:
+                    self._condition.wait()
+                record, queued = self._entries.popleft()
+                if queued:
+                    break
+                self._skipped -= 1
+            levels = self._levels(record)
+            if levels is not None:
+                levels.popleft()  # The oldest queued entry is also the oldest of its level
+            self._size -= 1
+            return record
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ A QueueHandler that leaves the formatting of the records to the listener thread. """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _DropReportingListener(logging.handlers.QueueListener):
+    """ A QueueListener that logs how many records were dropped since the last report. """
+
+    def __init__(self, queue: DroppingLogQueue, *handlers: logging.Handler) -> None:
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self._reported = 0
+
+    def handle(self, record: logging.LogRecord) -> None:
+        dropped = self.queue.dropped
+        if dropped > self._reported:
+            super().handle(logging.makeLogRecord({
+                'name': 'AsyncLogging', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Dropped {dropped - self._reported} log records, the log queue was full."}))
+            self._reported = dropped
+        super().handle(record)
+
+
+class AsyncLogging:
+    """ Moves the writing of the log records of the ColorLoggers to a dedicated thread.
+
+    The loggers only put their records in a bounded in-memory queue (see DroppingLogQueue) and
+    a listener thread formats them and writes them to the log file and the console, so a slow
+    disk never stalls the thread that logs. Only the loggers that exist when it is started are
+    switched over, the ones created later keep writing synchronously. The loggers get their
+    handlers back when it is stopped.
+    """
+
+    HANDLER_ATTRS = ('main_file_handler', 'blank_file_handler',
+                     'main_streaming_handler', 'blank_streaming_handler')
+
+    def __init__(self, queue_size: int = 10000, handlers: List[logging.Handler] = None) -> None:
+        """
+        Args:
+            queue_size: Max number of records waiting to be written
+            handlers: Where the listener writes the records, defaults to the log file and the
+                      console of the ColorLoggers
+        """
+
+        self.queue = DroppingLogQueue(maxsize=queue_size)
+        self.handlers = handlers if handlers is not None else self._default_handlers()
+        self._queue_handler = _DeferredQueueHandler(self.queue)
+        self._listener = _DropReportingListener(self.queue, *self.handlers)
+        self._attached = {}  # logger -> its handler attributes before it was attached
+
+    @staticmethod
+    def _default_handlers() -> List[logging.Handler]:
+        handlers = [logging.StreamHandler()]
+        if ColorLogger.log_path:
+            ColorLogger.create_logs_folder(ColorLogger.log_path)
+            handlers.append(logging.FileHandler(ColorLogger.log_path))
+        for handler in handlers:
+            handler.setLevel(ColorLogger.log_level)
+            handler.setFormatter(logging.Formatter(fmt=ColorLogger.log_fmt,
+                                                   datefmt=ColorLogger.log_date_fmt))
+        return handlers
+
+    def attach(self, logger: logging.Logger) -> None:
+        """ Routes the records of a logger through the queue. """
+
+        self._attached[logger] = {attr: getattr(logger, attr) for attr in self.HANDLER_ATTRS
+                                  if hasattr(logger, attr)}
+        self._attached[logger]['handlers'] = logger.handlers
+        logger.handlers = [self._queue_handler]
+        # Keep ColorLogger from adding its file handlers back (also when it logs new lines)
+        for attr in self.HANDLER_ATTRS:
+            setattr(logger, attr, self._queue_handler)
+
+    def start(self) -> 'AsyncLogging':
+        for logger in list(logging.Logger.manager.loggerDict.values()):
+            if isinstance(logger, logging.Logger) and hasattr(logger, 'main_streaming_handler'):
+                self.attach(logger)
+        self._listener.start()
+        return self
+
+    def stop(self) -> None:
+        """ Writes the queued records, stops the listener thread and gives the loggers their
+        handlers back. """
+
+        for logger, attrs in self._attached.items():
+            for attr in self.HANDLER_ATTRS:
+                if attr in attrs:
+                    setattr(logger, attr, attrs[attr])
+                else:
+                    delattr(logger, attr)
+            logger.handlers = attrs['handlers']
+        self._attached = {}
+        self._listener.stop()
+        for handler in self.handlers:
+            handler.flush()
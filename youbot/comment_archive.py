@@ -0,0 +1,162 @@
+from typing import *
+from datetime import datetime
+import gzip
+import json
+import os
+import re
+import dateutil.parser
+from dateutil import tz
+
+
+class CommentArchiveReader:
+    """ Read-only access to the comments archived out of the comments table.
+
+    The archive is a folder with one partition file per month (`comments_YYYY-MM.cols.gz`)
+    holding the comments posted in that month. A partition is stored column by column: its
+    gzip-compressed content is a JSON header line with the column names and the number of
+    rows, followed by one JSON array per column, so a query only decodes the columns it
+    uses. The times are stored as `YYYY-MM-DD HH:MM:SS.ffffff` utc strings.
+    """
+
+    COLUMNS = ('channel_id', 'video_link', 'comment', 'comment_time', 'upload_time',
+               'like_count', 'reply_count', 'comment_id', 'video_id', 'comment_link', 'video_title')
+    TIME_COLUMNS = ('comment_time', 'upload_time')
+    FILE_RE = re.compile(r'^comments_(\d{4}-\d{2})\.cols\.gz$')
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: The folder of the archive
+        """
+
+        self.path = path
+
+    def partition_path(self, month: str) -> str:
+        return os.path.join(self.path, f'comments_{month}.cols.gz')
+
+    def months(self) -> List[str]:
+        """ The archived months (`YYYY-MM`), oldest first. """
+
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(match.group(1) for match in map(self.FILE_RE.match, os.listdir(self.path))
+                      if match is not None)
+
+    def read_columns(self, month: str, columns: Iterable[str] = None) -> Dict[str, List]:
+        """ Reads the specified columns (all of them by default) of a monthly partition.
+
+        Returns:
+            A column name: list of values dictionary, with the rows in the same order in every list
+        """
+
+        columns = set(columns or self.COLUMNS)
+        data = {}
+        with gzip.open(self.partition_path(month), 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            for col in header['columns']:
+                line = f.readline()
+                if col in columns:
+                    data[col] = json.loads(line)
+        for col in columns - set(data):  # Columns added after the partition was written
+            data[col] = [None] * header['rows']
+        return data
+
+    def get_comments(self, comment_cols: List[str], n_recent: int = None, since: str = None,
+                     until: str = None, channel_id: str = None, min_likes: int = -1,
+                     max_likes: int = 999999) -> Iterator[Dict]:
+        """
+        Stream the archived comments, latest first, like `YoutubeDatastore.get_comments`.
+        Args:
+            comment_cols: The columns to return
+            n_recent: Max number of comments (all of them by default)
+            since: Only the comments posted at or after that utc time (iso format)
+            until: Only the comments posted before that utc time (iso format)
+            channel_id: Only the comments of that channel
+            min_likes: The unknown like counts are treated as -1
+            max_likes:
+        """
+
+        since = self.to_archive_time(since)
+        until = self.to_archive_time(until)
+        remaining = n_recent if n_recent is not None else float('inf')
+        columns = set(comment_cols) | {'comment_time', 'like_count', 'channel_id'}
+        for month in reversed(self.months()):
+            if remaining <= 0 or (since is not None and month < since[:7]):
+                return
+            if until is not None and month > until[:7]:
+                continue
+            data = self.read_columns(month, columns)
+            rows = sorted(range(len(data['comment_time'])), key=data['comment_time'].__getitem__,
+                          reverse=True)
+            for ind in rows:
+                comment_time = data['comment_time'][ind]
+                like_count = data['like_count'][ind]
+                if (since is not None and comment_time < since) \
+                        or (until is not None and comment_time >= until) \
+                        or (channel_id is not None and data['channel_id'][ind] != channel_id) \
+                        or not min_likes <= (-1 if like_count is None else like_count) <= max_likes:
+                    continue
+                yield {col: data[col][ind] for col in comment_cols}
+                remaining -= 1
+                if remaining <= 0:
+                    return
+
+    @staticmethod
+    def to_archive_time(value: Union[str, datetime, None]) -> Optional[str]:
+        """ Converts a datetime or an iso format time (or a legacy '-1'/'None' one) to the
+        utc time string of the archive. """
+
+        if value is None or value in ('-1', 'None', ''):
+            return None
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                value = dateutil.parser.parse(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(tz.UTC).replace(tzinfo=None)
+        return value.isoformat(sep=' ', timespec='microseconds')
+
+
+class CommentArchive(CommentArchiveReader):
+    """ A CommentArchiveReader that can also add comments to the archive. """
+
+    def _to_archive_value(self, col: str, value: Any) -> Any:
+        """ Stores the '-1'/'None' sentinels of the legacy schema as nulls. """
+
+        if col in self.TIME_COLUMNS:
+            return self.to_archive_time(value)
+        if value in (-1, '-1', 'None'):
+            return None
+        return value
+
+    def write_month(self, month: str, rows: List[Dict]) -> int:
+        """ Adds the comments of a month to its partition, replacing the archived comments with
+        the same `video_link`, so archiving the same rows twice is harmless. The partition is
+        rewritten to a temporary file first and then swapped in atomically.
+
+        Args:
+            month: `YYYY-MM`
+            rows: Dicts with the COLUMNS of each comment
+
+        Returns:
+            The number of comments in the partition
+        """
+
+        os.makedirs(self.path, exist_ok=True)
+        merged = {}
+        if os.path.exists(self.partition_path(month)):
+            data = self.read_columns(month)
+            for ind, video_link in enumerate(data['video_link']):
+                merged[video_link] = [data[col][ind] for col in self.COLUMNS]
+        for row in rows:
+            merged[row['video_link']] = [self._to_archive_value(col, row.get(col))
+                                         for col in self.COLUMNS]
+        values = list(merged.values())
+        tmp_path = self.partition_path(month) + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'columns': self.COLUMNS, 'rows': len(values)}) + '\n')
+            for ind in range(len(self.COLUMNS)):
+                f.write(json.dumps([row[ind] for row in values]) + '\n')
+        os.replace(tmp_path, self.partition_path(month))
+        return len(values)
@@ -0,0 +1,818 @@
+from youbot import ColorLogger, CommentArchive
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from typing import *
+from datetime import datetime, timedelta
+import dateutil.parser
+from dateutil import tz
+
+logger = ColorLogger(logger_name='YoutubeDatastore', color='red')
+
+
+class YoutubeDatastore(ABC):
+    """ The channels and comments datastore of the bot, independent of the database.
+
+    The queries are written once, in the SQL that every backend understands, with `%s`
+    placeholders for their values. A backend implements the few primitives they run on
+    (`execute`, `stream`, `transaction` and the creation of the tables) plus the statements
+    its dialect writes differently.
+    """
+
+    CHANNEL_TABLE = 'channels'
+    COMMENTS_TABLE = 'comments'
+    # v1: varchar times and '-1'/'None' sentinels, v2: DATETIME times, NULLs and indexes
+    SCHEMA_VERSION = 2
+    # The priority keys are spaced out so that a channel can be moved by updating its key only
+    PRIORITY_GAP = 1024
+
+    def __init__(self, tag: str) -> None:
+        global logger
+        logger = ColorLogger(logger_name=f'[{tag}] {type(self).__name__}', color='red')
+        self.schema_version = self.SCHEMA_VERSION
+
+    @abstractmethod
+    def create_tables_if_not_exist(self) -> None:
+        pass
+
+    @abstractmethod
+    def execute(self, operation: str, params: Sequence = (), prepared: bool = True) -> List[Tuple]:
+        """ Executes a statement with `%s` placeholders for `params` and returns its rows.
+
+        `prepared` is False for the statements whose SQL changes with the number of values
+        (e.g. IN lists and multi-row VALUES), which a backend should not prepare and cache. """
+        pass
+
+    @abstractmethod
+    def stream(self, operation: str, params: Sequence = (), batch_size: int = 1000,
+               prepared: bool = True) -> Iterator[Tuple]:
+        """ Like `execute` but yields the rows as they are read. """
+        pass
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager:
+        """ Runs the statements executed in the context in a single transaction. """
+        pass
+
+    @abstractmethod
+    def _update_from_query(self, derived_table: str, cols: List[str]) -> str:
+        """ The UPDATE statement that sets the specified (non NULL) columns of the comments
+        from the rows of the derived table with the same `video_link`. """
+        pass
+
+    def migrate_schema(self, chunk_size: int = 1000, pause: float = 0.05) -> None:
+        """ Converts the tables of a legacy schema to the current one. """
+
+        logger.info(f"The tables already use the schema v{self.SCHEMA_VERSION}.")
+
+    def get_schema_version(self, table: str = None) -> int:
+        """ Detects the schema version of the tables. """
+
+        return self.SCHEMA_VERSION
+
+    def _check_schema_version(self) -> bool:
+        """ Detects again the schema version of legacy tables, which `migrate_schema` may have
+        converted while the bot runs, so that the values are written (and filtered) the way the
+        current tables expect.
+
+        Returns:
+            True if the version changed
+        """
+
+        if self.schema_version >= self.SCHEMA_VERSION:
+            return False
+        schema_version = self.get_schema_version()
+        if schema_version == self.schema_version:
+            return False
+        logger.info(f"The tables were migrated to the schema v{schema_version}.")
+        self.schema_version = schema_version
+        return True
+
+    def insert_into_table(self, table: str, data: dict) -> None:
+        """ Inserts a row based on a column_name: value dictionary. """
+
+        placeholders = ', '.join(['%s'] * len(data))
+        self.execute(f"INSERT INTO {table} ({', '.join(data)}) VALUES ({placeholders})",
+                     list(data.values()))
+
+    def update_table(self, table: str, set_data: dict, where: str, params: Sequence = ()) -> None:
+        """ Updates the rows matching `where` (with `%s` placeholders for `params`)
+        using a column_name: value dictionary. """
+
+        set_data_str = ', '.join(f'{col}=%s' for col in set_data)
+        self.execute(f"UPDATE {table} SET {set_data_str} WHERE {where}",
+                     list(set_data.values()) + list(params))
+
+    def select_from_table(self, table: str, columns: str = '*', where: str = 'TRUE',
+                          order_by: str = 'NULL', asc_or_desc: str = 'ASC', limit: int = 1000,
+                          params: Sequence = ()) -> List:
+        """ Selects the rows matching `where` (with `%s` placeholders for `params`). """
+
+        return self.execute(f"SELECT {columns} FROM {table} WHERE {where} "
+                            f"ORDER BY {order_by} {asc_or_desc} LIMIT %s",
+                            list(params) + [int(limit)])
+
+    def _to_db_time(self, value: str) -> Union[str, datetime]:
+        """ Converts an iso format time (e.g. the `Z`-suffixed times of the YouTube API) to a naive
+        utc datetime. The legacy schema stores the times as they are. """
+
+        if self.schema_version < 2 or value is None:
+            return value
+        try:  # Fast path for the times stored with `datetime.isoformat()`
+            parsed = datetime.fromisoformat(value) if isinstance(value, str) else value
+        except ValueError:
+            parsed = dateutil.parser.parse(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(tz.UTC).replace(tzinfo=None)
+        return parsed
+
+    @staticmethod
+    def _comment_link(video_id: str, comment_id: str) -> str:
+        return f'https://youtube.com/watch?v={video_id}&lc={comment_id}'
+
+    def _is_null(self, col: str) -> str:
+        if self.schema_version < 2:
+            return f"({col}='None' OR {col}='-1')"
+        return f"{col} IS NULL"
+
+    def get_channels(self, channel_cols: List, comment_cols: List = None,
+                     where: str = 'active IS TRUE',
+                     join_type: str = 'INNER',
+                     params: Tuple = (),
+                     page_size: int = 500) -> Iterator[Dict]:
+        """
+        Stream the channels (joined with their comments if `comment_cols` is set) in priority
+        order. The rows are read in pages of `page_size` with keyset pagination on the unique
+        `priority` key (and the `video_link` of the joined comments), so every page is a short
+        indexed range query and the memory used does not grow with the number of rows.
+        Args:
+            channel_cols:
+            comment_cols:
+            where: May have `%s` placeholders for `params`
+            join_type:
+            params:
+            page_size:
+        """
+
+        key_cols = ['priority'] if comment_cols is None else ['priority', 'video_link']
+        select_cols = channel_cols + [col for col in ['priority'] if col not in channel_cols]
+        select_comment_cols = None
+        if comment_cols is not None:
+            select_comment_cols = comment_cols + [col for col in ['video_link']
+                                                  if col not in comment_cols]
+        col_names = select_cols + (select_comment_cols or [])
+        last_key = None
+        while True:
+            page_where = f"({where})"
+            page_params = list(params)
+            if last_key is not None and comment_cols is None:
+                page_where += " AND priority>%s"
+                page_params.append(last_key[0])
+            elif last_key is not None:
+                # `r.video_link>NULL` never matches, so a channel without comments is read once
+                page_where += " AND (l.priority>%s OR (l.priority=%s AND r.video_link>%s))"
+                page_params += [last_key[0], last_key[0], last_key[1]]
+            if comment_cols is None:
+                result = self.select_from_table(table=self.CHANNEL_TABLE,
+                                                columns=','.join(select_cols),
+                                                order_by='priority',
+                                                asc_or_desc='asc',
+                                                where=page_where, params=page_params,
+                                                limit=page_size)
+            else:
+                result = self.select_join(left_table=self.CHANNEL_TABLE,
+                                          right_table=self.COMMENTS_TABLE,
+                                          left_columns=','.join(select_cols),
+                                          right_columns=','.join(select_comment_cols),
+                                          join_key_left='channel_id',
+                                          join_key_right='channel_id',
+                                          order_by='l.priority asc, r.video_link',
+                                          asc_or_desc='asc',
+                                          join_type=join_type,
+                                          where=page_where, params=page_params,
+                                          limit=page_size)
+            for row in result:
+                row_dict = self._row_to_dict(row, col_names)
+                last_key = [row_dict[col] for col in key_cols]
+                yield {col: row_dict[col] for col in channel_cols + (comment_cols or [])}
+            if len(result) < page_size:
+                return
+
+    def add_channel(self, channel_data: Dict, active: bool = True) -> None:
+        """ Insert the provided channel into the database"""
+
+        try:
+            self._check_schema_version()
+            # TODO: Implement if_not_exists=True in HighMySQL
+            if not active:
+                channel_data['active'] = False
+            for col in ('added_on', 'last_commented'):
+                if col in channel_data:
+                    channel_data[col] = self._to_db_time(channel_data[col])
+            if 'priority' not in channel_data:  # Append it, leaving a gap
+                max_key = self.execute(f"SELECT COALESCE(MAX(priority), 0) "
+                                       f"FROM {self.CHANNEL_TABLE}")[0][0]
+                channel_data['priority'] = max_key + self.PRIORITY_GAP
+            self.insert_into_table(table=self.CHANNEL_TABLE, data=channel_data)
+        except Exception as e:
+            logger.error(f"Datastore error: {e}")
+
+    def set_priority(self, channel_data: Dict, priority: str) -> None:
+        """
+        Move the provided channel to the specified (1-based) position of the priority order.
+        The priority keys are spaced by PRIORITY_GAP, so the channel usually gets a key between
+        the keys of its new neighbours and is the only row updated. All the keys are only
+        renumbered when there is no gap left between the neighbours.
+        Args:
+            channel_data: The channel, with its `channel_id`
+            priority: The new position of the channel
+        """
+
+        channel_id = channel_data['channel_id']
+        try:
+            keys = [(row_channel_id, key) for row_channel_id, key in self._priority_order()
+                    if row_channel_id != channel_id]
+            position = min(max(int(priority), 1), len(keys) + 1)
+            prev_key = keys[position - 2][1] if position > 1 else 0
+            next_key = keys[position - 1][1] if position <= len(keys) \
+                else prev_key + 2 * self.PRIORITY_GAP
+            if next_key - prev_key > 1:
+                self.update_table(table=self.CHANNEL_TABLE,
+                                  set_data={'priority': (prev_key + next_key) // 2},
+                                  where="channel_id=%s", params=(channel_id,))
+            else:
+                order = [key_channel_id for key_channel_id, _ in keys]
+                order.insert(position - 1, channel_id)
+                self._renumber_priorities(order)
+        except Exception as e:
+            logger.error(f"Datastore error: {e}")
+
+    def set_priorities(self, priorities: Dict[str, int]) -> None:
+        """
+        Move many channels at once to the specified (1-based) positions of the priority order,
+        renumbering all the keys with two UPDATE statements in a single transaction.
+        Args:
+            priorities: The new position of each channel ID. The other channels keep
+                        their relative order
+        """
+
+        try:
+            order = [channel_id for channel_id, _ in self._priority_order()
+                     if channel_id not in priorities]
+            for channel_id, position in sorted(priorities.items(), key=lambda item: int(item[1])):
+                order.insert(max(int(position), 1) - 1, channel_id)
+            self._renumber_priorities(order)
+        except Exception as e:
+            logger.error(f"Datastore error: {e}")
+
+    def _priority_order(self) -> List[Tuple[str, int]]:
+        """ The (channel ID, priority key) of all the channels, in priority order. """
+
+        return self.execute(f"SELECT channel_id, priority FROM {self.CHANNEL_TABLE} ORDER BY priority")
+
+    def _renumber_priorities(self, order: List[str]) -> None:
+        """ Give the channels the keys PRIORITY_GAP, 2 * PRIORITY_GAP, .. in the specified order.
+
+        The unique `priority` constraint is checked row by row, so all the keys are first moved
+        below both their current and their new values and only then set to the new ones. """
+
+        min_key, max_key = self.execute(f"SELECT COALESCE(MIN(priority), 0), "
+                                        f"COALESCE(MAX(priority), 0) FROM {self.CHANNEL_TABLE}")[0]
+        cases = ' '.join(['WHEN %s THEN %s'] * len(order))
+        params = [val for ind, channel_id in enumerate(order, start=1)
+                  for val in (channel_id, ind * self.PRIORITY_GAP)]
+        with self.transaction():
+            self.execute(f"UPDATE {self.CHANNEL_TABLE} SET priority=priority-%s",
+                         (max_key + abs(min_key) + 1,))
+            self.execute(f"UPDATE {self.CHANNEL_TABLE} SET priority=CASE channel_id {cases} END "
+                         f"WHERE channel_id IN ({', '.join(['%s'] * len(order))})", params + order,
+                         prepared=False)
+        logger.info(f"Renumbered the priorities of {len(order)} channels.")
+
+    def get_channel_by_id(self, ch_id: str) -> Tuple:
+        """Retrieve a channel from the database by its ID
+        Args:
+            ch_id (str): The channel ID
+        """
+
+        result = self.select_from_table(table=self.CHANNEL_TABLE, where="channel_id=%s",
+                                        params=(ch_id,))
+        if len(result) > 1:
+            logger.warning("Duplicate channel retrieved from SELECT statement:{result}")
+        elif len(result) == 0:
+            result.append(())
+
+        return result[0]
+
+    def get_channel_by_username(self, ch_username: str) -> Tuple:
+        """Retrieve a channel from the database by its Username
+        Args:
+            ch_username (str): The channel ID
+        """
+
+        result = self.select_from_table(table=self.CHANNEL_TABLE, where="username=%s",
+                                        params=(ch_username,))
+        if len(result) > 1:
+            logger.warning("Duplicate channel retrieved from SELECT statement:{result}")
+        elif len(result) == 0:
+            result.append(())
+
+        return result[0]
+
+    def remove_channel_by_id(self, ch_id: str) -> None:
+        """Retrieve a channel from the database by its ID
+        Args:
+            ch_id (str): The channel ID
+        """
+
+        self.update_table(table=self.CHANNEL_TABLE,
+                          set_data={'active': False},
+                          where="channel_id=%s", params=(ch_id,))
+
+    def remove_channel_by_username(self, ch_username: str) -> None:
+        """Delete a channel from the database by its Username
+        Args:
+            ch_username (str): The channel ID
+        """
+
+        self.update_table(table=self.CHANNEL_TABLE,
+                          set_data={'active': False},
+                          where="username=%s", params=(ch_username,))
+
+    def update_channel_photo(self, channel_id: str, photo_url: str) -> None:
+        """
+        Update the profile picture link of a channel.
+        Args:
+            channel_id:
+            photo_url:
+        """
+
+        set_data = {'channel_photo': photo_url}
+        self.update_table(table=self.CHANNEL_TABLE,
+                          set_data=set_data,
+                          where="channel_id=%s", params=(channel_id,))
+
+    def add_comment(self, ch_id: str, video_link: str, comment_text: str,
+                    upload_time: str, video_title: str, comment_id: str = None,
+                    comment_time: str = None) -> bool:
+        """
+        Add comment data and update the `last_commented` channel column.
+        Args:
+            ch_id:
+            video_link:
+            comment_text:
+            upload_time:
+            video_title:
+            comment_id: The ID of the comment thread, if it was returned when it was posted
+            comment_time: When it was posted, defaults to now
+
+        Returns:
+            Whether the comment was added
+        """
+
+        self._check_schema_version()
+        for attempt in range(2):
+            db_comment_time = self._to_db_time(comment_time or datetime.utcnow().isoformat())
+            comments_data = {'channel_id': ch_id,
+                             'video_link': video_link,
+                             'video_id': video_link.split('v=')[1].split('&')[0],
+                             'comment': comment_text,
+                             'comment_time': db_comment_time,
+                             'upload_time': self._to_db_time(upload_time),
+                             'video_title': video_title}
+            if comment_id is not None:
+                comments_data['comment_id'] = comment_id
+                comments_data['comment_link'] = self._comment_link(comments_data['video_id'],
+                                                                   comment_id)
+            update_data = {'last_commented': db_comment_time}
+
+            try:
+                self.insert_into_table(self.COMMENTS_TABLE, data=comments_data)
+                # Update Channel's last_commented timestamp
+                # TODO: Do that with foreign keys
+                self.update_table(table=self.CHANNEL_TABLE, set_data=update_data,
+                                  where="channel_id=%s", params=(ch_id,))
+                return True
+            except Exception as e:
+                # Retry with the values of the new schema if the tables were migrated meanwhile
+                if attempt == 0 and self._check_schema_version():
+                    continue
+                logger.error(f"Datastore error: {e}")
+                return False
+
+    def add_comments(self, comments: List[Dict], chunk_size: int = 500) -> List[Dict]:
+        """
+        Add the data of many comments and update the `last_commented` column of their channels
+        in a single transaction, with one multi-row INSERT and one UPDATE per chunk.
+        If the transaction fails (e.g. a duplicate video link) it is rolled back and the
+        comments are added one by one with `add_comment`.
+        Args:
+            comments: Dicts with the `ch_id`, `video_link`, `comment_text`, `upload_time`,
+                      `video_title` and, optionally, `comment_time` (defaults to now) and
+                      `comment_id` of each comment
+            chunk_size: Max number of comments per statement
+
+        Returns:
+            The comments that could not be added
+        """
+
+        if not comments:
+            return []
+        self._check_schema_version()
+        datetime_now = datetime.utcnow().isoformat()
+        columns = ('channel_id', 'video_link', 'video_id', 'comment', 'comment_time', 'upload_time',
+                   'video_title', 'comment_id', 'comment_link')
+        rows = []
+        last_commented = {}
+        for comment in comments:
+            comment_time = self._to_db_time(comment.get('comment_time') or datetime_now)
+            video_id = comment['video_link'].split('v=')[1].split('&')[0]
+            comment_id = comment.get('comment_id')
+            if comment_id is not None:
+                comment_link = self._comment_link(video_id, comment_id)
+            else:  # Not known yet, the accumulator looks it up
+                comment_id = comment_link = None if self.schema_version >= 2 else 'None'
+            rows.append((comment['ch_id'], comment['video_link'], video_id,
+                         comment['comment_text'], comment_time,
+                         self._to_db_time(comment['upload_time']), comment['video_title'],
+                         comment_id, comment_link))
+            last_commented[comment['ch_id']] = max(comment_time,
+                                                   last_commented.get(comment['ch_id'], comment_time))
+        try:
+            row_placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            with self.transaction():
+                for chunk in range(0, len(rows), chunk_size):
+                    chunk_rows = rows[chunk:chunk + chunk_size]
+                    values = ', '.join([row_placeholders] * len(chunk_rows))
+                    self.execute(f"INSERT INTO {self.COMMENTS_TABLE} ({', '.join(columns)}) "
+                                 f"VALUES {values}", [val for row in chunk_rows for val in row],
+                                 prepared=False)
+                channel_ids = list(last_commented)
+                for chunk in range(0, len(channel_ids), chunk_size):
+                    chunk_ids = channel_ids[chunk:chunk + chunk_size]
+                    cases = ' '.join(['WHEN %s THEN %s'] * len(chunk_ids))
+                    in_ids = ', '.join(['%s'] * len(chunk_ids))
+                    self.execute(f"UPDATE {self.CHANNEL_TABLE} "
+                                 f"SET last_commented = CASE channel_id {cases} END "
+                                 f"WHERE channel_id IN ({in_ids})",
+                                 [val for ch_id in chunk_ids for val in (ch_id, last_commented[ch_id])]
+                                 + chunk_ids, prepared=False)
+        except Exception as e:
+            logger.warn(f"Bulk insert of {len(comments)} comments failed ({e}), "
+                        f"adding them one by one..")
+            return [comment for comment in comments
+                    if not self.add_comment(comment['ch_id'], video_link=comment['video_link'],
+                                            comment_text=comment['comment_text'],
+                                            upload_time=comment['upload_time'],
+                                            video_title=comment['video_title'],
+                                            comment_id=comment.get('comment_id'),
+                                            comment_time=comment.get('comment_time'))]
+        return []
+
+    def get_comments(self, comment_cols: List[str], channel_cols: List[str] = None,
+                     n_recent: int = 50,
+                     min_likes: int = -1,
+                     max_likes: int = 999999,
+                     min_replies: int = -1,
+                     max_replies: int = 999999,
+                     channel_id: str = None,
+                     only_null_upload: bool = False,
+                     only_null_comment_id: bool = False,
+                     only_null_video_title: bool = False,
+                     order_by: str = 'comment_time',
+                     join_type: str = 'INNER',
+                     page_size: int = 1000) -> Iterator[Dict]:
+        """
+        Stream the latest n_recent comments from the comments table. The rows are read in pages
+        of `page_size` with keyset pagination on (`order_by`, `video_link`), which the
+        (comment_time) and (channel_id, comment_time) indexes serve for the default order, so
+        the memory used does not grow with n_recent.
+        Args:
+            comment_cols:
+            channel_cols:
+            n_recent:
+            min_likes:
+            max_likes:
+            min_replies:
+            max_replies:
+            channel_id:
+            only_null_upload:
+            only_null_comment_id:
+            only_null_video_title:
+            order_by: A NOT NULL column of the comments
+            join_type:
+            page_size:
+        """
+
+        self._check_schema_version()
+        # The comment columns are qualified in the joins, `channel_id` is in both tables
+        c = 'l.' if channel_cols is not None else ''
+        if self.schema_version < 2:
+            where = f"{c}like_count>=%s AND {c}like_count<=%s AND " \
+                    f"{c}reply_count>=%s AND {c}reply_count<=%s "
+        else:  # The unknown (NULL) counts are matched like the -1 of the legacy schema
+            where = f"COALESCE({c}like_count, -1) BETWEEN %s AND %s AND " \
+                    f"COALESCE({c}reply_count, -1) BETWEEN %s AND %s "
+        params = [int(min_likes), int(max_likes), int(min_replies), int(max_replies)]
+        if channel_id is not None:
+            where += f"AND {c}channel_id=%s "
+            params.append(channel_id)
+        if only_null_upload is True:
+            where += f"AND {self._is_null(c + 'upload_time')} "
+        if only_null_comment_id is True:
+            where += f"AND {self._is_null(c + 'comment_id')} "
+        if only_null_video_title is True:
+            where += f"AND {self._is_null(c + 'video_title')} "
+
+        key_cols = [order_by, 'video_link']
+        select_cols = comment_cols + [col for col in key_cols if col not in comment_cols]
+        col_names = select_cols + (channel_cols or [])
+        remaining = int(n_recent)
+        last_key = None
+        while remaining > 0:
+            page_where = where
+            page_params = list(params)
+            if last_key is not None:
+                page_where += f"AND ({c}{order_by}, {c}video_link)<(%s, %s) "
+                page_params += last_key
+            limit = min(page_size, remaining)
+            if channel_cols is not None:
+                result = self.select_join(left_table=self.COMMENTS_TABLE,
+                                          right_table=self.CHANNEL_TABLE,
+                                          left_columns=','.join(select_cols),
+                                          right_columns=','.join(channel_cols),
+                                          join_key_left='channel_id',
+                                          join_key_right='channel_id',
+                                          where=page_where,
+                                          params=page_params,
+                                          order_by=f'l.{order_by} desc, l.video_link',
+                                          asc_or_desc='desc',
+                                          limit=limit,
+                                          join_type=join_type)
+            else:
+                result = self.select_from_table(table=self.COMMENTS_TABLE,
+                                                columns=','.join(select_cols),
+                                                where=page_where,
+                                                params=page_params,
+                                                order_by=f'{order_by} desc, video_link',
+                                                asc_or_desc='desc',
+                                                limit=limit)
+            for row in result:
+                row_dict = self._row_to_dict(row, col_names)
+                last_key = [row_dict[col] for col in key_cols]
+                yield {col: row_dict[col] for col in comment_cols + (channel_cols or [])}
+            remaining -= len(result)
+            if len(result) < limit:
+                return
+
+    def get_commented_videos(self, since: str,
+                             limit: int = 1000000) -> Iterator[Tuple[str, Union[str, datetime]]]:
+        """
+        Get the links and the times of the comments posted since the specified time, oldest first.
+        Args:
+            since: The utc time in iso format
+            limit:
+        """
+
+        result = self.select_from_table(table=self.COMMENTS_TABLE,
+                                        columns='video_link,comment_time',
+                                        where="comment_time>=%s",
+                                        params=(self._to_db_time(since),),
+                                        order_by='comment_time',
+                                        asc_or_desc='asc',
+                                        limit=limit)
+        for video_link, comment_time in result:
+            yield video_link, comment_time
+
+    def get_comment_history(self, channel_ids: List[str], since: str, n_recent: int = 500,
+                            min_likes: int = -1) -> Iterator[Dict]:
+        """
+        Stream, with a single windowed query, both the `n_recent` latest comments with at least
+        `min_likes` likes of each channel and the comments posted since the specified time.
+        The comments are ranked per channel (and per whether they reach `min_likes`) with
+        ROW_NUMBER(), so every comment is read once no matter how many channels there are.
+        Args:
+            channel_ids: The channels to load the comments of
+            since: The utc time in iso format
+            n_recent: Max number of comments with at least `min_likes` per channel
+            min_likes: The unknown like counts are treated as -1
+
+        Yields:
+            Dicts with the `channel_id`, `video_link`, `comment` and `comment_time` of each
+            comment, and whether it is one of the `n_recent` latest liked comments of its
+            channel (`top`) and was posted since `since` (`recent`)
+        """
+
+        if not channel_ids:
+            return
+        since = self._to_db_time(since)
+        liked = 'COALESCE(like_count, -1)>=%s'
+        in_ids = ', '.join(['%s'] * len(channel_ids))
+        query = f"SELECT channel_id, video_link, comment, comment_time, " \
+                f"liked AND rn<=%s AS top, comment_time>=%s AS recent " \
+                f"FROM (SELECT channel_id, video_link, comment, comment_time, {liked} AS liked, " \
+                f"ROW_NUMBER() OVER (PARTITION BY channel_id, {liked} " \
+                f"ORDER BY comment_time DESC) AS rn " \
+                f"FROM {self.COMMENTS_TABLE} WHERE channel_id IN ({in_ids})) ranked " \
+                f"WHERE (liked AND rn<=%s) OR comment_time>=%s"
+        params = [n_recent, since, min_likes, min_likes, *channel_ids, n_recent, since]
+        col_names = ['channel_id', 'video_link', 'comment', 'comment_time', 'top', 'recent']
+        for row in self.stream(query, params, prepared=False):
+            yield self._row_to_dict(row, col_names)
+
+    def update_comment(self, video_link: str, comment_id: str = None,
+                       like_cnt: int = None, reply_cnt: int = None,
+                       upload_time: str = None, video_title: str = None,
+                       comment_time: str = None) -> None:
+        """
+        Populate a comment entry with additional information.
+        Args:
+            video_link:
+            comment_id:
+            like_cnt:
+            reply_cnt:
+            upload_time:
+            video_title:
+            comment_time:
+        """
+
+        self._check_schema_version()
+        # Get video id
+        video_id = video_link.split('v=')[1].split('&')[0]
+        # Construct the update key-values
+        set_data = {}
+        if video_id is not None:
+            set_data['video_id'] = video_id
+        if comment_id is not None:
+            set_data['comment_id'] = comment_id
+            set_data['comment_link'] = self._comment_link(video_id, comment_id)
+        if like_cnt is not None:
+            set_data['like_count'] = like_cnt
+        if reply_cnt is not None:
+            set_data['reply_count'] = reply_cnt
+        if comment_time is not None:
+            set_data['comment_time'] = self._to_db_time(comment_time)
+        if upload_time is not None:
+            set_data['upload_time'] = self._to_db_time(upload_time)
+        if video_title is not None:
+            set_data['video_title'] = video_title
+        # Execute the update command
+        self.update_table(table=self.COMMENTS_TABLE,
+                          set_data=set_data,
+                          where="video_link=%s", params=(video_link,))
+
+    def update_comments(self, comments: List[Dict], chunk_size: int = 500) -> None:
+        """
+        Populate many comment entries with additional information using one
+        UPDATE statement joined with the new values per chunk of comments.
+        Args:
+            comments: Dicts with the `video_link` and any of the `comment_id`, `like_cnt`,
+                      `reply_cnt`, `upload_time`, `video_title`, `comment_time` keys of
+                      `update_comment`. The columns of the missing keys are not changed
+            chunk_size: Max number of comments per statement
+        """
+
+        param_cols = {'comment_id': 'comment_id', 'like_cnt': 'like_count',
+                      'reply_cnt': 'reply_count', 'upload_time': 'upload_time',
+                      'video_title': 'video_title', 'comment_time': 'comment_time'}
+        self._check_schema_version()
+        for chunk in range(0, len(comments), chunk_size):
+            rows = []
+            for comment in comments[chunk:chunk + chunk_size]:
+                video_link = comment['video_link']
+                video_id = video_link.split('v=')[1].split('&')[0]
+                row = {'video_link': video_link, 'video_id': video_id}
+                for param, col in param_cols.items():
+                    if comment.get(param) is not None:
+                        row[col] = comment[param]
+                if comment.get('comment_id') is not None:
+                    row['comment_link'] = self._comment_link(video_id, comment['comment_id'])
+                for col in ('upload_time', 'comment_time'):
+                    if col in row:
+                        row[col] = self._to_db_time(row[col])
+                rows.append(row)
+            cols = ['video_link', 'video_id', 'comment_id', 'comment_link', 'like_count',
+                    'reply_count', 'upload_time', 'video_title', 'comment_time']
+            cols = [col for col in cols if any(col in row for row in rows)]
+            # The first row names the columns of the derived table
+            selects = ' UNION ALL '.join(
+                'SELECT ' + ', '.join(('%s' if col in row else 'NULL')
+                                      + (f' AS {col}' if row_ind == 0 else '')
+                                      for col in cols)
+                for row_ind, row in enumerate(rows))
+            params = [row[col] for row in rows for col in cols if col in row]
+            self.execute(self._update_from_query(selects, [col for col in cols
+                                                           if col != 'video_link']), params,
+                         prepared=False)
+
+    def archive_comments(self, archive: CommentArchive, before: str, chunk_size: int = 1000) -> int:
+        """
+        Move the comments posted before the specified time out of the comments table and into
+        the monthly partitions of the archive, so that the table (and its indexes) only keeps
+        the recent rows the bot reads. One month is archived at a time: its rows are written to
+        the archive first and only then deleted, in chunks of short DELETE statements, so an
+        interrupted run loses no comments and can simply be run again.
+        Args:
+            archive: The archive to move the comments to
+            before: The utc time in iso format
+            chunk_size: Max number of comments deleted per statement
+
+        Returns:
+            The number of comments archived
+        """
+
+        before = self._to_db_time(before)
+        columns = archive.COLUMNS
+        archived = 0
+        while True:
+            oldest = self.execute(f"SELECT MIN(comment_time) FROM {self.COMMENTS_TABLE} "
+                                  f"WHERE comment_time<%s", (before,))[0][0]
+            if oldest is None:
+                return archived
+            # The times of every schema start with `YYYY-MM`
+            month = str(oldest)[:7]
+            month_start = datetime.strptime(month, '%Y-%m')
+            month_end = (month_start + timedelta(days=31)).replace(day=1)
+            month_end = min(self._to_db_time(month_end.isoformat()), before)
+            rows = [self._row_to_dict(row, list(columns)) for row in
+                    self.stream(f"SELECT {', '.join(columns)} FROM {self.COMMENTS_TABLE} "
+                                f"WHERE comment_time>=%s AND comment_time<%s",
+                                (self._to_db_time(month_start.isoformat()), month_end))]
+            if not rows:  # A time the month range cannot match, e.g. a malformed legacy one
+                logger.warn(f"Stopped archiving at the comment time {oldest} of an unknown format.")
+                return archived
+            total = archive.write_month(month, rows)
+            video_links = [row['video_link'] for row in rows]
+            for chunk in range(0, len(video_links), chunk_size):
+                chunk_links = video_links[chunk:chunk + chunk_size]
+                self.execute(f"DELETE FROM {self.COMMENTS_TABLE} "
+                             f"WHERE video_link IN ({', '.join(['%s'] * len(chunk_links))})",
+                             chunk_links, prepared=False)
+            archived += len(rows)
+            logger.info(f"Archived {len(rows)} comments of {month} ({total} in its partition).")
+
+    def select_join(self, left_table: str, right_table: str,
+                    join_key_left: str, join_key_right: str,
+                    left_columns: str = '', right_columns: str = '', custom_columns: str = '',
+                    join_type: str = 'INNER',
+                    where: str = 'TRUE', order_by: str = 'NULL', asc_or_desc: str = 'ASC',
+                    limit: int = 1000, group_by: str = '', having: str = '',
+                    params: Sequence = ()) -> List[Tuple]:
+        """
+        Join two tables and select.
+
+        Args:
+            left_table:
+            right_table:
+            left_columns:
+            right_columns:
+            custom_columns: Custom columns for which no `l.` or `r.` will be added automatically
+            join_key_left: The column of join of the left table
+            join_key_right: The column of join of the right table
+            join_type: OneOf(INNER, LEFT, RIGHT)
+            where: Add a `l.` or `.r` before the specified columns
+            order_by: Add a `l.` or `.r` before the specified columns
+            asc_or_desc:
+            limit:
+            group_by: Add a `l.` or `.r` before the specified columns
+            having: Add a `l.` or `.r` before the specified columns
+            params: The values of the `%s` placeholders of `where` and `having`
+        """
+
+        # Construct Group By
+        if group_by:
+            if having:
+                having = f'HAVING {having}'
+            group_by = f'GROUP BY {group_by} {having} '
+
+        # Construct Columns
+        if left_columns:
+            left_columns = 'l.' + ', l.'.join(map(str.strip, left_columns.split(',')))
+            if right_columns or custom_columns:
+                left_columns += ', '
+        if right_columns:
+            right_columns = 'r.' + ', r.'.join(map(str.strip, right_columns.split(',')))
+            if custom_columns:
+                right_columns += ', '
+        columns = f'{left_columns} {right_columns} {custom_columns}'
+
+        # Build the Query
+        query = f"SELECT {columns} " \
+                f"FROM {left_table} l " \
+                f"{join_type} JOIN {right_table} r " \
+                f"ON l.{join_key_left}=r.{join_key_right} " \
+                f"WHERE {where} " \
+                f"{group_by}" \
+                f"ORDER BY {order_by} {asc_or_desc} " \
+                f"LIMIT %s"
+
+        return self.execute(query, list(params) + [int(limit)])
+
+    @staticmethod
+    def _row_to_dict(row: Tuple, col_names: List) -> Dict:
+        """Transform a table row into a dictionary
+        Args:
+            row (tuple): The database row
+            col_names (list): The names of the columns retrieved
+        """
+
+        return dict(zip(col_names, row))
@@ -0,0 +1,290 @@
+from typing import Callable, Dict, List, Tuple, Iterator, Sequence, TypeVar
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from mysql import connector as mysql_connector
+from mysql.connector import pooling, errors
+from youbot import ColorLogger, HighMySQL
+
+logger = ColorLogger(logger_name='PooledHighMySQL', color='red')
+T = TypeVar('T')
+
+
+class _ThreadConnection:
+    """ The connection of a single thread, checked out of the shared pool. """
+
+    def __init__(self, pool: pooling.MySQLConnectionPool, config: Dict,
+                 statement_cache_size: int = 64) -> None:
+        self._pool = pool
+        self._config = config
+        self.statement_cache_size = statement_cache_size
+        # SQL -> (the SQL object the statement was prepared with, its prepared cursor), LRU order
+        self.statements = OrderedDict()
+        self.connection = None
+        self.raw_cursor = None
+        self.last_used = 0.0
+        self.in_transaction = False
+        self.connect()
+
+    def connect(self) -> None:
+        try:
+            self.connection = self._pool.get_connection()
+        except errors.PoolError:
+            logger.warn(f"The connection pool is exhausted ({self._pool.pool_size} connections), "
+                        f"opening an extra connection for {threading.current_thread().name}.")
+            self.connection = mysql_connector.connect(**self._config)
+        self.raw_cursor = self.connection.cursor()
+        self.last_used = time.monotonic()
+
+    def reconnect(self) -> None:
+        logger.warn(f"Reconnecting to MySQL ({threading.current_thread().name})..")
+        try:
+            self.raw_cursor.close()
+        except Exception:
+            pass
+        # The prepared statements are gone with the server session
+        self.statements.clear()
+        self.connection.reconnect(attempts=3, delay=1)
+        self.raw_cursor = self.connection.cursor()
+        self.last_used = time.monotonic()
+
+    def check_health(self, interval: float) -> None:
+        """ Pings the server (and reconnects if needed) if the connection has been idle for more
+        than `interval` seconds, e.g. because it may have hit the `wait_timeout` of the server. """
+
+        if not self.in_transaction and time.monotonic() - self.last_used > interval:
+            try:
+                self.connection.ping(reconnect=False)
+            except errors.Error:
+                self.reconnect()
+        self.last_used = time.monotonic()
+
+    def run(self, operation: str, execute: Callable[[], T], health_check_interval: float) -> T:
+        """ Checks the health of the connection and calls `execute`, which runs `operation`,
+        reconnecting and calling it once more if the connection was lost while an idempotent
+        statement was running outside of a transaction. """
+
+        self.check_health(health_check_interval)
+        try:
+            return execute()
+        except (errors.OperationalError, errors.InterfaceError) as e:
+            if self.in_transaction or not PooledHighMySQL.is_connection_lost(e) \
+                    or not PooledHighMySQL.is_idempotent(operation):
+                raise
+            logger.warn(f"Lost the MySQL connection, retrying: {e}")
+            self.reconnect()
+            return execute()
+
+    def execute_prepared(self, operation: str, params: Sequence, fetch: bool = True):
+        """ Executes the statement with the cached prepared cursor of its SQL (preparing it on a
+        miss and closing the least recently used statement if the cache is full) and returns its
+        rows, or the cursor itself to read them from if `fetch` is False. """
+
+        cached = self.statements.get(operation)
+        if cached is None:
+            cached = (operation, self.connection.cursor(prepared=True))
+            self.statements[operation] = cached
+            if len(self.statements) > self.statement_cache_size:
+                _, (_, evicted_cursor) = self.statements.popitem(last=False)
+                evicted_cursor.close()
+        else:
+            self.statements.move_to_end(operation)
+        # The cursor only skips the PREPARE if it gets the very same SQL object again
+        prepared_operation, cursor = cached
+        cursor.execute(prepared_operation, tuple(params))
+        self.last_used = time.monotonic()
+        if not fetch:
+            return cursor
+        return cursor.fetchall() if cursor.with_rows else []
+
+    def execute_text(self, operation: str, params: Sequence, fetch: bool = True):
+        """ Executes the statement through the text protocol, with the values escaped and bound
+        by the client, in a single round trip and without touching the prepared statements. """
+
+        self.raw_cursor.execute(operation, tuple(params))
+        self.last_used = time.monotonic()
+        if not fetch:
+            return self.raw_cursor
+        return self.raw_cursor.fetchall() if self.raw_cursor.with_rows else []
+
+    def close_statements(self) -> None:
+        for _, cursor in self.statements.values():
+            cursor.close()
+        self.statements.clear()
+
+
+class _RetryingCursor:
+    """ A cursor that checks the health of its connection before executing a statement and
+    transparently reconnects and retries the idempotent statements whose connection was lost. """
+
+    def __init__(self, thread_connection: _ThreadConnection, health_check_interval: float) -> None:
+        self._thread_connection = thread_connection
+        self._health_check_interval = health_check_interval
+
+    def execute(self, operation: str, params: Tuple = None, multi: bool = False):
+        thread_connection = self._thread_connection
+        return thread_connection.run(
+            operation, lambda: thread_connection.raw_cursor.execute(operation, params, multi),
+            self._health_check_interval)
+
+    def __getattr__(self, item):
+        return getattr(self._thread_connection.raw_cursor, item)
+
+
+class PooledHighMySQL(HighMySQL):
+    """ A HighMySQL whose `_connection` and `_cursor` belong to the calling thread.
+
+    Every thread checks a connection out of a shared pool on its first statement and keeps it,
+    so concurrent workers never share a cursor. Idle connections are health-checked before they
+    are used and the idempotent statements (SELECT, SHOW, UPDATE, DELETE and CREATE/DROP TABLE
+    IF (NOT) EXISTS) are retried once after a reconnect if the connection is lost while they
+    run. UPDATE statements are only idempotent if they set absolute values, as they do in this
+    package.
+
+    The `execute` method binds its values as parameters of server-side prepared statements
+    (the table methods that use it are the ones of YoutubeDatastore). Every connection keeps an LRU cache of its prepared
+    statements, so a statement is parsed by the server once per connection and then only
+    executed with new parameters. The statements whose SQL changes with the number of values
+    (`prepared=False`) would only be executed once, so they are sent through the text protocol
+    instead, in one round trip and without evicting the cached ones.
+    """
+
+    LOST_CONNECTION_ERRNOS = (2006, 2013, 2055)  # Server gone away / lost / lost (extended)
+    IDEMPOTENT_RE = re.compile(r'^\s*(SELECT|SHOW|UPDATE|DELETE|(CREATE|DROP)\s+TABLE\s+IF)\b',
+                               re.IGNORECASE)
+
+    def __init__(self, config: Dict) -> None:
+        """
+        The basic constructor. Creates the connection pool using the specified credentials
+
+        Args:
+            config: The datastore config. Optionally `pool_size` (default 5),
+                    `health_check_interval` in seconds (default 30) and
+                    `statement_cache_size` (prepared statements per connection, default 64)
+        """
+
+        self._connection_config = {'host': config['hostname'],
+                                   'user': config['username'],
+                                   'password': config['password'],
+                                   'database': config['db_name'],
+                                   'port': int(config['port']),
+                                   'use_pure': True,
+                                   # Every statement is its own transaction, so a statement whose
+                                   # connection was lost was either fully applied or not at all
+                                   'autocommit': True}
+        self._pool = pooling.MySQLConnectionPool(
+            pool_size=int(config['pool_size']) if 'pool_size' in config else 5,
+            **self._connection_config)
+        self.health_check_interval = float(config['health_check_interval']) \
+            if 'health_check_interval' in config else 30
+        self.statement_cache_size = int(config['statement_cache_size']) \
+            if 'statement_cache_size' in config else 64
+        self._local = threading.local()
+
+    def _thread_connection(self) -> _ThreadConnection:
+        thread_connection = getattr(self._local, 'connection', None)
+        if thread_connection is None:
+            thread_connection = _ThreadConnection(self._pool, self._connection_config,
+                                                  self.statement_cache_size)
+            self._local.connection = thread_connection
+            self._local.cursor = _RetryingCursor(thread_connection, self.health_check_interval)
+        return thread_connection
+
+    @property
+    def _connection(self) -> pooling.PooledMySQLConnection:
+        return self._thread_connection().connection
+
+    @property
+    def _cursor(self) -> _RetryingCursor:
+        self._thread_connection()
+        return self._local.cursor
+
+    @contextmanager
+    def transaction(self) -> Iterator[_RetryingCursor]:
+        """ Runs the statements executed with the cursor of the context in a single transaction,
+        which is committed on exit or rolled back on an exception. They are never retried and
+        HighMySQL methods that commit by themselves should not be used inside the context. """
+
+        thread_connection = self._thread_connection()
+        thread_connection.check_health(self.health_check_interval)
+        thread_connection.connection.start_transaction()
+        thread_connection.in_transaction = True
+        try:
+            yield self._local.cursor
+            thread_connection.connection.commit()
+        except Exception:
+            try:
+                thread_connection.connection.rollback()
+            except errors.Error as e:
+                logger.error(f"Failed to roll back the transaction: {e}")
+            raise
+        finally:
+            thread_connection.in_transaction = False
+
+    def execute(self, operation: str, params: Sequence = (), prepared: bool = True) -> List[Tuple]:
+        """
+        Executes a statement as a (cached) prepared statement of the connection of the
+        calling thread, retried like the statements of the cursor.
+        Args:
+            operation: The SQL with a `%s` placeholder for every parameter
+            params: The values bound to the placeholders
+            prepared: False to send it through the text protocol instead (for the statements
+                      whose SQL changes with the number of values)
+
+        Returns:
+            The rows of the result set (empty if the statement returns no rows)
+        """
+
+        logger.debug("Executing: %s %s" % (operation, tuple(params)))
+        thread_connection = self._thread_connection()
+        execute = thread_connection.execute_prepared if prepared else thread_connection.execute_text
+        return thread_connection.run(operation, lambda: execute(operation, params),
+                                     self.health_check_interval)
+
+    def stream(self, operation: str, params: Sequence = (), batch_size: int = 1000,
+               prepared: bool = True) -> Iterator[Tuple]:
+        """
+        Like `execute` but yields the rows as they are read from the server, `batch_size` at a
+        time, instead of loading the whole result set. The thread must not execute another
+        statement until the generator is exhausted or closed (the unread rows are discarded).
+        """
+
+        logger.debug("Streaming: %s %s" % (operation, tuple(params)))
+        thread_connection = self._thread_connection()
+        execute = thread_connection.execute_prepared if prepared else thread_connection.execute_text
+        cursor = thread_connection.run(operation, lambda: execute(operation, params, fetch=False),
+                                       self.health_check_interval)
+        exhausted = False
+        try:
+            while cursor.with_rows:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+            exhausted = True
+        finally:
+            if not exhausted:
+                cursor.fetchall()
+
+    @classmethod
+    def is_idempotent(cls, operation: str) -> bool:
+        """ Whether the statement can safely be executed again. """
+
+        return cls.IDEMPOTENT_RE.match(operation) is not None
+
+    @classmethod
+    def is_connection_lost(cls, e: Exception) -> bool:
+        return getattr(e, 'errno', None) in cls.LOST_CONNECTION_ERRNOS \
+            or isinstance(e, errors.InterfaceError)
+
+    def close(self) -> None:
+        """ Returns the connection of the calling thread to the pool. """
+
+        thread_connection = getattr(self._local, 'connection', None)
+        if thread_connection is not None:
+            self._local.connection = None
+            thread_connection.close_statements()
+            thread_connection.raw_cursor.close()
+            thread_connection.connection.close()
@@ -1,7 +1,7 @@
 import traceback
 import argparse
 
-from youbot import Configuration, ColorLogger, YoutubeManager
+from youbot import Configuration, ColorLogger, YoutubeManager, AsyncLogging
 
 logger = ColorLogger(logger_name='Main', color='yellow')
 
@@ -31,7 +31,7 @@ def get_args() -> argparse.Namespace:
                 'add_channel', 'remove_channel', 'list_channels', 'list_comments',
                 'refresh_photos', 'set_priority',
                 'fill_upload_times', 'fill_video_titles', 'fix_comment_links',
-                'retrieve_old_channels']
+                'retrieve_old_channels', 'migrate_schema', 'archive_comments']
     optional_args.add_argument('-m', '--run-mode', choices=commands,
                                default=commands[0],
                                help='Description of the run modes')
@@ -50,6 +50,13 @@ def get_args() -> argparse.Namespace:
                                help="Number of maximum likes for `list_comments`")
     optional_args.add_argument('--max_latency', default=99999,
                                help="Number of maximum liked for `list_comments`")
+    optional_args.add_argument('--chunk-size', default=1000, type=int,
+                               help="Number of rows copied (or deleted) per statement for "
+                                    "`migrate_schema` and `archive_comments`")
+    optional_args.add_argument('--archive-path', default='archive',
+                               help="The folder of the comments archive for `archive_comments`")
+    optional_args.add_argument('--older-than-days', default=180, type=int,
+                               help="Archive the comments older than that for `archive_comments`")
     optional_args.add_argument('--priority',
                                help="Priority number for specified channel for `set_priority`")
     optional_args.add_argument('-d', '--debug', action='store_true',
@@ -122,6 +129,15 @@ def retrieve_old_channels(youtube: YoutubeManager, args: argparse.Namespace) ->
     youtube.retrieve_old_channels(args.n_recent, args.min_likes, args.min_replies)
 
 
+def migrate_schema(youtube: YoutubeManager, args: argparse.Namespace) -> None:
+    youtube.migrate_schema(chunk_size=args.chunk_size)
+
+
+def archive_comments(youtube: YoutubeManager, args: argparse.Namespace) -> None:
+    youtube.archive_comments(archive_path=args.archive_path, older_than_days=args.older_than_days,
+                             chunk_size=args.chunk_size)
+
+
 def main():
     """ This is the main function of run.py
 
@@ -163,9 +179,20 @@ def main():
                              fast_sleep_time=fast_sleep_time, slow_sleep_time=slow_sleep_time,
                              max_posted_hours=max_posted_hours,
                              api_type=you_conf['type'], tag=conf_obj.tag, log_path=args.log)
+    # Write the logs from a separate thread so that a slow disk never stalls the main loop
+    async_logging = None
+    if 'async_logging' in you_conf['config'] and you_conf['config']['async_logging'] is True:
+        log_queue_size = int(you_conf['config']['log_queue_size']) \
+            if 'log_queue_size' in you_conf['config'] else 10000
+        async_logging = AsyncLogging(queue_size=log_queue_size).start()
     # Run in the specified run mode
     func = globals()[args.run_mode]
-    func(youtube, args)
+    try:
+        func(youtube, args)
+    finally:
+        if async_logging is not None:
+            async_logging.stop()
+        youtube.stop_log_shipper()  # After the queued log records are written
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterable, Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.http import HttpRequest
+import httplib2
+
+
+class AsyncUploads:
+    """ Executes YouTube api requests concurrently on an asyncio event loop.
+
+    Every request runs on a worker thread using an http connection borrowed from the pool of
+    its credential, so the connections (and their TLS sessions) are reused across cycles.
+    At most `max_concurrency` requests are in flight at any time.
+    """
+
+    def __init__(self, connection_factory: Callable[[Any], httplib2.Http],
+                 max_concurrency: int = 100, connections_per_credential: int = 20) -> None:
+        """
+        Args:
+            connection_factory: Creates a new authorized http connection for a credential
+            max_concurrency: The maximum number of requests in flight
+            connections_per_credential: The maximum number of open connections per credential
+        """
+
+        self.max_concurrency = max_concurrency
+        self.connections_per_credential = connections_per_credential
+        self._connection_factory = connection_factory
+        self.loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix='AsyncUploads')
+        self._semaphore = None
+        self._pools = {}
+
+    async def execute(self, requests: Iterable[Tuple[Hashable, Any,
+                                                     HttpRequest]]) \
+            -> AsyncIterator[Tuple[Hashable, Dict, Exception]]:
+        """ Executes the requests concurrently and yields their results as they arrive.
+
+        Args:
+            requests: (request_id, credentials, request) tuples
+
+        Yields:
+            (request_id, response, exception): exactly one of response and exception is None
+        """
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [asyncio.ensure_future(self._execute_one(request_id, credentials, request))
+                 for request_id, credentials, request in requests]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _execute_one(self, request_id: Hashable, credentials: Any,
+                           request: HttpRequest) \
+            -> Tuple[Hashable, Dict, Exception]:
+        async with self._semaphore:
+            pool = self._pool(credentials)
+            if pool['idle'].empty() and pool['open'] < self.connections_per_credential:
+                pool['open'] += 1
+                http = self._connection_factory(credentials)
+            else:
+                http = await pool['idle'].get()
+            future = self._executor.submit(request.execute, http=http)
+            try:
+                response = await asyncio.wrap_future(future, loop=self.loop)
+            except asyncio.CancelledError:
+                # The worker thread may still be using the connection (it is not thread-safe)
+                future.add_done_callback(lambda _: self._release_threadsafe(pool, http))
+                raise
+            except Exception as e:
+                pool['idle'].put_nowait(http)
+                return request_id, None, e
+            pool['idle'].put_nowait(http)
+            return request_id, response, None
+
+    def _release_threadsafe(self, pool: Dict, http: httplib2.Http) -> None:
+        """ Returns a connection to its pool from any thread. """
+
+        try:
+            self.loop.call_soon_threadsafe(pool['idle'].put_nowait, http)
+        except RuntimeError:  # The loop is closed
+            pool['open'] -= 1
+
+    def _pool(self, credentials: Any) -> Dict:
+        """ Returns the connection pool of the specified credential. """
+
+        key = id(credentials)
+        if key not in self._pools:
+            self._pools[key] = {'idle': asyncio.Queue(), 'open': 0}
+        return self._pools[key]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.loop.close()
@@ -0,0 +1,153 @@
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta
+import math
+import statistics
+import dateutil.parser
+from dateutil import tz
+
+
+class BurstScheduler:
+    """ Schedules the bursts of the hot minute: Shortly before every hour, the channels that
+    usually publish on the hour are picked from their upload history and polled every
+    `interval` seconds until `duration` seconds after the hour. The detection latency
+    (detection time - publish time) of the uploads found during each burst is reported.
+
+    Every poll costs one quota unit per channel, so a full burst costs `size` *
+    (`start_before` + `duration`) / `interval` units (175 with the defaults, 4.2k per day).
+    A burst spends at most `quota_share` of the quota the credentials have left per hour until
+    the daily reset, polling less often when it would need more. """
+
+    def __init__(self, size: int = 5, interval: float = 1, start_before: float = 5,
+                 duration: float = 30, min_share: float = 0.2, quota_share: float = 0.2) -> None:
+        """
+        Args:
+            size: Max number of channels polled in a burst
+            interval: Min seconds between the polls of a burst
+            start_before: Seconds before the hour that the burst starts
+            duration: Seconds after the hour that the burst ends
+            min_share: The minimum share of uploads on the hour for a channel to be picked
+            quota_share: Max share of the hourly quota left that a burst can spend
+        """
+
+        self.size = size
+        self.interval = interval
+        self.start_before = start_before
+        self.duration = duration
+        self.min_share = min_share
+        self.quota_share = quota_share
+        self._on_the_hour = {}
+        self._last_burst_hour = None
+        self._burst_start = None
+        self._latencies = []
+
+    def fit(self, upload_times: Dict[str, List[datetime]]) -> None:
+        """ Counts the uploads of every channel published on the hour (per hour of the day).
+
+        Args:
+            upload_times: The (utc) upload times of the past videos of each channel
+        """
+
+        self._on_the_hour = {}
+        for ch_id, ch_upload_times in upload_times.items():
+            hours = [upload_time.hour for upload_time in ch_upload_times if upload_time.minute == 0]
+            if hours and len(hours) / len(ch_upload_times) >= self.min_share:
+                self._on_the_hour[ch_id] = {'total': len(hours),
+                                            'hours': {hour: hours.count(hour) for hour in set(hours)}}
+
+    def pick_channels(self, channels: List[str], hour: int) -> List[str]:
+        """ Returns (in priority order) up to `size` of the channels that are the most likely
+        to publish on the specified hour.
+
+        Args:
+            channels: Channel IDs sorted by priority
+            hour: The (utc) hour of the day
+        """
+
+        candidates = [ch_id for ch_id in channels if ch_id in self._on_the_hour]
+        ranked = sorted(candidates, key=lambda ch_id: (self._on_the_hour[ch_id]['hours'].get(hour, 0),
+                                                       self._on_the_hour[ch_id]['total']),
+                        reverse=True)
+        picked = set(ranked[:self.size])
+        return [ch_id for ch_id in candidates if ch_id in picked]
+
+    def _next_hour(self, now: datetime) -> datetime:
+        """ The hour the current or the next burst is for. """
+
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        if now - hour >= timedelta(seconds=self.duration) or hour == self._last_burst_hour:
+            hour += timedelta(hours=1)
+        return hour
+
+    def seconds_until_burst(self, now: datetime = None) -> float:
+        """ The seconds until the next burst should start (0 if it should start now). """
+
+        now = now or datetime.utcnow()
+        burst_start = self._next_hour(now) - timedelta(seconds=self.start_before)
+        return max(0.0, (burst_start - now).total_seconds())
+
+    def start_burst(self, channels: List[str], now: datetime = None) -> Tuple[List[str], datetime]:
+        """ Starts the burst of the upcoming hour.
+
+        Args:
+            channels: Channel IDs sorted by priority
+            now: The current utc time
+
+        Returns:
+            The channels to poll and the (utc) time the burst ends
+        """
+
+        now = now or datetime.utcnow()
+        hour = self._next_hour(now)
+        self._last_burst_hour = hour
+        self._burst_start = hour - timedelta(seconds=self.start_before)
+        self._latencies = []
+        return self.pick_channels(channels, hour.hour), hour + timedelta(seconds=self.duration)
+
+    def budget(self, num_channels: int, headroom: int, seconds_until_reset: float) -> Tuple[int, float]:
+        """ Caps the polls of a burst to `quota_share` of the quota left per hour until the reset,
+        spreading them across the burst.
+
+        Args:
+            num_channels: The number of channels polled in the burst
+            headroom: The quota units the available credentials have left today
+            seconds_until_reset: The seconds until the daily quota reset
+
+        Returns:
+            The max number of polls of the burst and the seconds between them
+        """
+
+        window = self.start_before + self.duration
+        hourly_quota = headroom / max(1.0, seconds_until_reset / 3600)
+        max_polls = min(math.ceil(window / self.interval),
+                        int(self.quota_share * hourly_quota) // max(1, num_channels))
+        interval = max(self.interval, window / max_polls) if max_polls > 0 else self.interval
+        return max_polls, interval
+
+    def record(self, upload: Dict) -> None:
+        """ Records the detection latency of an upload found during the current burst (using its
+        `detected_at` time if set). The uploads published before the burst started are ignored. """
+
+        detected_at = upload.get('detected_at') or datetime.utcnow()
+        published_at = dateutil.parser.parse(upload['published_at'])
+        if published_at.tzinfo is not None:
+            published_at = published_at.astimezone(tz.UTC).replace(tzinfo=None)
+        if published_at >= self._burst_start:
+            self._latencies.append((detected_at - published_at).total_seconds())
+
+    def report(self) -> Dict:
+        """ The detection latencies (in seconds) of the uploads found during the last burst. """
+
+        latencies = self._latencies
+        return {'hour': self._last_burst_hour,
+                'detected': len(latencies),
+                'min_latency': min(latencies) if latencies else None,
+                'median_latency': statistics.median(latencies) if latencies else None,
+                'max_latency': max(latencies) if latencies else None}
+
+    def __str__(self) -> str:
+        report = self.report()
+        if not report['detected']:
+            return f"Burst of {report['hour']}: No new uploads detected"
+        return f"Burst of {report['hour']}: {report['detected']} new uploads detected, " \
+               f"latency min: {report['min_latency']:.1f}s, " \
+               f"median: {report['median_latency']:.1f}s, max: {report['max_latency']:.1f}s"
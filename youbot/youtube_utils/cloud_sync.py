@@ -0,0 +1,163 @@
+from typing import Dict, List
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from youbot import ColorLogger
+
+logger = ColorLogger(logger_name='CloudFolderSync', color='green')
+
+
+def content_hash(file_path: str) -> str:
+    """ The Dropbox content hash of a local file: the sha256 of the concatenated sha256 digests
+    of its 4 MiB blocks. """
+
+    block_hashes = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(4 * 1024 * 1024)
+            if not block:
+                break
+            block_hashes.update(hashlib.sha256(block).digest())
+    return block_hashes.hexdigest()
+
+
+class CloudFolderSync:
+    """ Keeps a local folder in sync with a folder of a cloud store (a DropboxCloudManager),
+    downloading only the files whose content changed.
+
+    The content hash of every synced file is kept in a manifest in the local folder. A listing
+    of the cloud folder is compared against it and only the new or changed files are
+    downloaded, in parallel, to temporary files that are then moved over the local ones, so a
+    reader never sees a partially written file. A local file that already has the content of
+    the cloud file (e.g. the manifest was lost) is not downloaded again. The sync can also run
+    periodically on a background thread.
+    """
+
+    MANIFEST_NAME = '.sync_manifest.json'
+
+    def __init__(self, cloud, remote_path: str, local_path: str, suffix: str = '',
+                 max_workers: int = 4) -> None:
+        """
+        Args:
+            cloud: The cloud store, with the `ls` and `download_file` methods of DropboxCloudManager
+            remote_path: The cloud folder
+            local_path: The local folder
+            suffix: Only sync the files whose name ends with it (e.g. `.txt`)
+            max_workers: Max number of parallel downloads
+        """
+
+        self.cloud = cloud
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.suffix = suffix
+        self.max_workers = max_workers
+        self._manifest_path = os.path.join(local_path, self.MANIFEST_NAME)
+        self._lock = Lock()  # One sync at a time
+        self._stopped = Event()
+        self._thread = None
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, str]) -> None:
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _download(self, name: str, expected_hash: str) -> str:
+        """ Downloads a file and returns its content hash. """
+
+        local_file = os.path.join(self.local_path, name)
+        tmp_file = local_file + '.part'
+        try:
+            self.cloud.download_file(f'{self.remote_path}/{name}', tmp_file)
+            if not os.path.exists(tmp_file):  # The cloud store logs the errors and returns
+                raise IOError(f"Failed to download `{self.remote_path}/{name}`")
+            downloaded_hash = content_hash(tmp_file)
+            if downloaded_hash != expected_hash:  # Changed during the sync, the next one fixes it
+                logger.warn(f"`{name}` changed while it was downloaded.")
+            os.replace(tmp_file, local_file)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        return downloaded_hash
+
+    def sync(self) -> List[str]:
+        """ Downloads the new and changed files of the cloud folder and deletes the local
+        copies of the synced files that were removed from it.
+
+        Returns:
+            The names of the files that were downloaded or deleted
+        """
+
+        with self._lock:
+            os.makedirs(self.local_path, exist_ok=True)
+            remote_hashes = {name: entry.content_hash
+                             for name, entry in self.cloud.ls(self.remote_path).items()
+                             if name.endswith(self.suffix)
+                             and getattr(entry, 'content_hash', None) is not None}  # Not folders
+            manifest = self._load_manifest()
+            to_download = []
+            for name, remote_hash in remote_hashes.items():
+                local_file = os.path.join(self.local_path, name)
+                if manifest.get(name) == remote_hash and os.path.exists(local_file):
+                    continue
+                if os.path.exists(local_file) and content_hash(local_file) == remote_hash:
+                    manifest[name] = remote_hash
+                    continue
+                to_download.append(name)
+            changed = []
+            if to_download:
+                with ThreadPoolExecutor(max_workers=self.max_workers,
+                                        thread_name_prefix='CloudFolderSync') as executor:
+                    futures = {name: executor.submit(self._download, name, remote_hashes[name])
+                               for name in to_download}
+                for name, future in futures.items():
+                    try:
+                        manifest[name] = future.result()
+                        changed.append(name)
+                    except Exception as e:
+                        logger.error(f"Failed to sync `{name}`: {e}")
+            removed = [name for name in manifest if name not in remote_hashes]
+            if removed and not remote_hashes:  # The listing failed (it is logged as empty)
+                logger.warn(f"`{self.remote_path}` is listed as empty, keeping the local files.")
+                removed = []
+            for name in removed:
+                del manifest[name]
+                try:
+                    os.remove(os.path.join(self.local_path, name))
+                except FileNotFoundError:
+                    pass
+                changed.append(name)
+            self._save_manifest(manifest)
+        if changed:
+            logger.info(f"Synced {len(changed)} files of `{self.remote_path}`: {', '.join(changed)}")
+        return changed
+
+    def start(self, interval: float) -> 'CloudFolderSync':
+        """ Syncs the folder every `interval` seconds on a background thread. """
+
+        self._thread = Thread(target=self._run, args=(interval,), daemon=True,
+                              name='CloudFolderSync')
+        self._thread.start()
+        return self
+
+    def _run(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Failed to sync `{self.remote_path}`: {e}")
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
@@ -0,0 +1,122 @@
+from typing import Callable, Dict, List
+import heapq
+import itertools
+import queue
+import time
+from threading import Thread, Condition
+from youbot import ColorLogger
+
+logger = ColorLogger(logger_name='CommentPoster', color='cyan')
+
+
+class CommentPoster:
+    """ Posts the comments on a separate thread so that the detection of new uploads is never
+    stalled by the `delay_comment` of a channel.
+
+    The pending comments are kept in a timer heap ordered by the time they are due (ties are
+    posted in the order they were scheduled). The posted comments are handed back through a
+    FIFO queue, in the order they were posted, and every one of them is returned exactly once
+    by `posted()`, so that the caller can persist them in order. A comment whose `post` raises
+    was not posted: it is logged and dropped.
+    """
+
+    def __init__(self, post: Callable[[Dict], None]) -> None:
+        """
+        Args:
+            post: Posts the specified comment (called only from the worker thread)
+        """
+
+        self._post = post
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = Condition()
+        self._posted = queue.Queue()
+        self._in_flight = 0
+        self._thread = None
+        self._stopped = False
+
+    def start(self) -> 'CommentPoster':
+        self._thread = Thread(target=self._run, daemon=True, name='CommentPoster')
+        self._thread.start()
+        return self
+
+    def schedule(self, comment: Dict, delay: float = 0) -> None:
+        """ Schedules a comment to be posted after `delay` seconds.
+
+        Args:
+            comment: The comment, passed as is to `post`
+            delay: Seconds to wait before posting it
+        """
+
+        due = time.monotonic() + max(0.0, delay)
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), comment))
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    wait = self._heap[0][0] - time.monotonic() if self._heap else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._condition.wait(timeout=wait)
+                if self._stopped:
+                    return
+                _, _, comment = heapq.heappop(self._heap)
+                self._in_flight += 1
+            try:
+                self._post(comment)
+            except Exception as e:
+                logger.error(f"Failed to post the comment for video {comment.get('video')}: {e}")
+            else:
+                self._posted.put(comment)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def posted(self) -> List[Dict]:
+        """ Returns the comments posted since the last call, in the order they were posted. """
+
+        comments = []
+        while True:
+            try:
+                comments.append(self._posted.get_nowait())
+            except queue.Empty:
+                return comments
+
+    @property
+    def pending(self) -> int:
+        """ The number of comments that have not been posted yet. """
+
+        with self._condition:
+            return len(self._heap) + self._in_flight
+
+    def flush(self, timeout: float = None) -> bool:
+        """ Posts all the pending comments now and waits for them for at most `timeout` seconds.
+
+        Returns:
+            Whether all the pending comments were posted
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._heap = [(0, sequence, comment) for _, sequence, comment in self._heap]
+            heapq.heapify(self._heap)
+            self._condition.notify_all()
+            while self._heap or self._in_flight:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return False
+                self._condition.wait(timeout=wait)
+        return True
+
+    def stop(self, timeout: float = 5) -> None:
+        """ Stops the worker thread. The comments not posted yet are dropped. """
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
@@ -0,0 +1,141 @@
+from typing import Dict, List
+from datetime import datetime, timedelta
+from threading import Lock
+from dateutil import tz
+
+
+class QuotaExceededError(Exception):
+    """ Raised when every credential of the pool has exhausted its daily quota.
+    The message contains `quotaExceeded` like the error returned by the YouTube API. """
+
+
+class CredentialPool:
+    """ Tracks the quota units each credential spent today and routes every request to the
+    credential with the most headroom. A credential that got a `quotaExceeded` error is
+    quarantined until the daily quota reset (midnight Pacific Time). """
+
+    # Quota units per call: https://developers.google.com/youtube/v3/determine_quota_cost
+    QUOTA_COSTS = {'playlistItems.list': 1, 'channels.list': 1, 'videos.list': 1,
+                   'commentThreads.list': 1, 'commentThreads.insert': 50}
+    RESET_TIMEZONE = tz.gettz('America/Los_Angeles')
+
+    def __init__(self, daily_quota: int = 10000) -> None:
+        """
+        Args:
+            daily_quota: The quota units each credential gets per day
+        """
+
+        self.daily_quota = daily_quota
+        self._names = {}
+        self._spent = {}
+        self._calls = {}
+        self._quarantined_until = {}
+        self._reset_at = self._next_reset()
+        self._lock = Lock()
+
+    def add(self, api, name: str) -> None:
+        """ Adds a credential (api) to the pool. """
+
+        with self._lock:
+            self._names[api] = name
+            self._spent[api] = 0
+            self._calls[api] = {}
+
+    @classmethod
+    def _next_reset(cls, now: datetime = None) -> datetime:
+        """ The next midnight Pacific Time as a naive utc datetime. """
+
+        now = now or datetime.utcnow()
+        local_now = now.replace(tzinfo=tz.UTC).astimezone(cls.RESET_TIMEZONE)
+        local_midnight = datetime.combine(local_now.date() + timedelta(days=1), datetime.min.time(),
+                                          tzinfo=cls.RESET_TIMEZONE)
+        return local_midnight.astimezone(tz.UTC).replace(tzinfo=None)
+
+    def _reset_if_needed(self) -> None:
+        now = datetime.utcnow()
+        if now < self._reset_at:
+            return
+        self._reset_at = self._next_reset(now)
+        self._quarantined_until = {}
+        for api in self._spent:
+            self._spent[api] = 0
+            self._calls[api] = {}
+
+    def headroom(self, api) -> int:
+        """ The estimated quota units the credential has left today. """
+
+        return self.daily_quota - self._spent[api]
+
+    def seconds_until_reset(self) -> float:
+        """ The seconds until the daily quota reset. """
+
+        with self._lock:
+            self._reset_if_needed()
+            return (self._reset_at - datetime.utcnow()).total_seconds()
+
+    def available(self) -> List:
+        """ Returns the credentials that are not quarantined, sorted by headroom (most first).
+
+        Raises:
+            QuotaExceededError: If every credential is quarantined
+        """
+
+        with self._lock:
+            self._reset_if_needed()
+            available = [api for api in self._spent if api not in self._quarantined_until]
+            reset_at = self._reset_at
+        if not available:
+            raise QuotaExceededError(f"quotaExceeded: All the credentials are quarantined "
+                                     f"until {reset_at.isoformat()} (utc).")
+        return sorted(available, key=self.headroom, reverse=True)
+
+    def get(self):
+        """ Returns the credential with the most headroom.
+
+        Raises:
+            QuotaExceededError: If every credential is quarantined
+        """
+
+        return self.available()[0]
+
+    def spend(self, api, operation: str, count: int = 1) -> None:
+        """ Records `count` calls of the operation made with the specified credential. """
+
+        with self._lock:
+            self._reset_if_needed()
+            self._spent[api] += self.QUOTA_COSTS[operation] * count
+            calls = self._calls[api]
+            calls[operation] = calls.get(operation, 0) + count
+
+    def quarantine(self, api) -> None:
+        """ Stops routing requests to the credential until the daily quota reset. """
+
+        with self._lock:
+            self._reset_if_needed()
+            self._quarantined_until[api] = self._reset_at
+
+    @staticmethod
+    def is_quota_exceeded(e: Exception) -> bool:
+        """ Whether the exception is a `quotaExceeded` error. """
+
+        return 'quotaExceeded' in str(e)
+
+    def usage(self) -> Dict[str, Dict]:
+        """ The quota usage of every credential: units spent, headroom, calls per operation
+        and until when it is quarantined (None if it is not). """
+
+        with self._lock:
+            self._reset_if_needed()
+            return {self._names[api]: {'spent': self._spent[api],
+                                       'headroom': self.headroom(api),
+                                       'calls': dict(self._calls[api]),
+                                       'quarantined_until': self._quarantined_until.get(api)}
+                    for api in self._spent}
+
+    def __len__(self) -> int:
+        return len(self._spent)
+
+    def __str__(self) -> str:
+        return ', '.join(f"{name}: {usage['spent']}/{self.daily_quota} units"
+                         + (" (quarantined)" if usage['quarantined_until'] else "")
+                         for name, usage in self.usage().items())
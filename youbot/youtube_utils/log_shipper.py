@@ -0,0 +1,217 @@
+from typing import Dict
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime
+from threading import Event, Lock, Thread
+from dropbox import Dropbox, files
+from youbot import ColorLogger
+
+logger = ColorLogger(logger_name='LogShipper', color='green')
+
+
+class DropboxUploadSession:
+    """ Uploads a file in parts through a Dropbox upload session, with a Dropbox client of its own
+    (DropboxCloudManager only uploads whole files). """
+
+    def __init__(self, api_key: str) -> None:
+        """
+        Args:
+            api_key: The Dropbox api key of the cloudstore config
+        """
+
+        self._handler = Dropbox(api_key)
+
+    def start(self, data: bytes) -> str:
+        """ Starts a session with the first part of the file and returns its ID. """
+
+        return self._handler.files_upload_session_start(data).session_id
+
+    def append(self, session_id: str, offset: int, data: bytes) -> None:
+        self._handler.files_upload_session_append_v2(
+            data, files.UploadSessionCursor(session_id=session_id, offset=offset))
+
+    def finish(self, session_id: str, offset: int, upload_path: str) -> None:
+        self._handler.files_upload_session_finish(
+            b'', files.UploadSessionCursor(session_id=session_id, offset=offset),
+            files.CommitInfo(path=upload_path, mode=files.WriteMode('add')))
+
+
+class LogShipper:
+    """ Ships the log file to the cloud in the background, uploading only the new lines.
+
+    The byte offset up to which the log has been uploaded is kept in a state file next to the
+    log. Every `interval` seconds (or as soon as it is requested) the lines written since are
+    read `chunk_size` bytes at a time, every chunk is gzip-compressed on its own and the chunks
+    are appended to an upload session that is committed as a single `.log.gz` file (the
+    concatenated gzip members form a valid gzip file). The offset only moves after the commit,
+    so a failed upload is retried by the next cycle.
+
+    Once the log exceeds `max_bytes` it is rotated by copy-truncate: it is copied to `<log>.1`
+    (the older copies are shifted up to `<log>.<backups>`) and truncated in place, because the
+    file handlers of the loggers keep it open in append mode.
+    """
+
+    def __init__(self, uploader: DropboxUploadSession, log_path: str, upload_folder: str,
+                 interval: float = 600, chunk_size: int = 4 * 1024 * 1024,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 3) -> None:
+        """
+        Args:
+            uploader: Uploads the files through upload sessions
+            log_path: The local log file
+            upload_folder: The cloud folder the logs are uploaded to
+            interval: Seconds between the uploads
+            chunk_size: Max number of log bytes compressed into one part of an upload
+            max_bytes: Rotate the log when it gets larger than that (0 to never rotate it)
+            backups: Number of rotated copies of the log to keep locally
+        """
+
+        self.uploader = uploader
+        self.log_path = log_path
+        self.upload_folder = upload_folder
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._state_path = f'{log_path}.ship.json'
+        self.offset = self._load_state().get('offset', 0)
+        self._lock = Lock()  # One upload at a time
+        self._wake = Event()
+        self._stopped = False
+        self._thread = None
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self._state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'offset': self.offset}, f)
+        os.replace(tmp_path, self._state_path)
+
+    def start(self) -> 'LogShipper':
+        self._thread = Thread(target=self._run, daemon=True, name='LogShipper')
+        self._thread.start()
+        return self
+
+    def request(self) -> None:
+        """ Asks for an upload now, without waiting for it. """
+
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                self.ship()
+            except Exception as e:
+                logger.error(f"Failed to upload the logs: {e}")
+
+    def stop(self, timeout: float = 30) -> None:
+        """ Stops the background thread and uploads the last lines. Does nothing if it is not
+        running. """
+
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self.ship()
+
+    def ship(self) -> int:
+        """ Uploads the complete lines written to the log since the last upload and rotates
+        the log if it got too large.
+
+        Returns:
+            The number of log bytes uploaded
+        """
+
+        with self._lock:
+            if not os.path.exists(self.log_path):
+                return 0
+            size = os.path.getsize(self.log_path)
+            if size < self.offset:  # Truncated by someone else
+                logger.warn(f"{self.log_path} shrank to {size} bytes, uploading it from the start.")
+                self.offset = 0
+            shipped = self._upload(self.log_path, self.offset, size, whole_lines=True)
+            self.offset += shipped
+            self._save_state()
+            if self.max_bytes and self.offset >= self.max_bytes:
+                shipped += self._rotate()
+            return shipped
+
+    def _rotate(self) -> int:
+        """ Copy-truncates the log and uploads the lines written to it after the last upload,
+        returning their size. """
+
+        for ind in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.log_path}.{ind}'):
+                os.replace(f'{self.log_path}.{ind}', f'{self.log_path}.{ind + 1}')
+        copy_path = f'{self.log_path}.1' if self.backups > 0 else f'{self.log_path}.rotating'
+        shutil.copyfile(self.log_path, copy_path)
+        # The lines written between the copy and the truncation are lost, as with logrotate
+        os.truncate(self.log_path, 0)
+        try:
+            shipped = self._upload(copy_path, self.offset, os.path.getsize(copy_path),
+                                   whole_lines=False)
+        finally:
+            self.offset = 0
+            self._save_state()
+            if self.backups == 0:
+                os.remove(copy_path)
+        logger.info(f"Rotated {self.log_path}.")
+        return shipped
+
+    def _last_line_end(self, f, start: int, end: int) -> int:
+        """ The offset right after the last newline of the bytes [start, end) of the file
+        (`start` if there is none). """
+
+        block_end = end
+        while block_end > start:
+            block_start = max(start, block_end - self.chunk_size)
+            f.seek(block_start)
+            newline = f.read(block_end - block_start).rfind(b'\n')
+            if newline != -1:
+                return block_start + newline + 1
+            block_end = block_start
+        return start
+
+    def _upload(self, path: str, start: int, end: int, whole_lines: bool) -> int:
+        """ Uploads the bytes [start, end) of the file, or only up to its last complete line,
+        as one file of gzip-compressed chunks and returns the number of bytes uploaded. """
+
+        session_id = None
+        uploaded = 0  # Compressed bytes sent
+        offset = start
+        with open(path, 'rb') as f:
+            if whole_lines:  # Leave the line still being written for the next upload
+                end = self._last_line_end(f, start, end)
+            f.seek(start)
+            while offset < end:
+                chunk = f.read(min(self.chunk_size, end - offset))
+                if not chunk:
+                    break
+                data = gzip.compress(chunk)
+                if session_id is None:
+                    session_id = self.uploader.start(data)
+                else:
+                    self.uploader.append(session_id, uploaded, data)
+                uploaded += len(data)
+                offset += len(chunk)
+        if session_id is None:
+            return 0
+        log_name = os.path.splitext(os.path.basename(self.log_path))[0]
+        upload_path = f'{self.upload_folder}/{log_name}_' \
+                      f'{datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")}_{start}.log.gz'
+        self.uploader.finish(session_id, uploaded, upload_path)
+        logger.debug(f"Uploaded {offset - start} bytes of {path} to {upload_path}.")
+        return offset - start
@@ -0,0 +1,193 @@
+from typing import Callable, Dict, List, Union
+import time
+import queue
+from threading import Thread, Lock
+from youbot import ColorLogger
+
+logger = ColorLogger(logger_name='ParallelUploads', color='green')
+
+
+class ReorderBuffer:
+    """ Buffers the results of channels polled out of order and releases them in channel-priority
+    order. A result is never held for longer than `latency_budget` seconds waiting for the
+    results of higher priority channels. """
+
+    def __init__(self, size: int, latency_budget: float) -> None:
+        """
+        Args:
+            size: The number of channels polled in the cycle
+            latency_budget: Max seconds a result waits for the higher priority results
+        """
+
+        self.size = size
+        self.latency_budget = latency_budget
+        self.received = 0
+        self._next_index = 0
+        self._results = {}
+
+    def put(self, index: int, uploads: List[Dict], now: float) -> None:
+        """ Stores the uploads found for the channel with the specified priority index. """
+
+        self.received += 1
+        self._results[index] = (now, uploads)
+
+    def pop_ready(self, now: float) -> List[Dict]:
+        """ Returns the uploads that can be emitted, in channel-priority order. """
+
+        ready = []
+        # Late results of channels that were skipped over are released immediately
+        for index in [index for index in self._results if index < self._next_index]:
+            ready.extend(self._results.pop(index)[1])
+        while self._results:
+            if self._next_index in self._results:
+                ready.extend(self._results.pop(self._next_index)[1])
+                self._next_index += 1
+            elif self.time_to_release(now) <= 0:
+                # Stop waiting for the missing higher priority results
+                self._next_index = min(self._results)
+            else:
+                break
+        return ready
+
+    def time_to_release(self, now: float) -> Union[float, None]:
+        """ Seconds until the oldest buffered result exceeds the latency budget. """
+
+        if not self._results:
+            return None
+        oldest_arrival = min(arrival for arrival, _ in self._results.values())
+        return oldest_arrival + self.latency_budget - now
+
+    @property
+    def done(self) -> bool:
+        return self.received >= self.size and not self._results
+
+
+class ParallelUploads:
+    """ A pool of worker threads that poll channels for new uploads.
+
+    The channels are striped across the workers round-robin by priority, each worker is fed from
+    its own blocking queue and owns its http connections (they are not thread-safe), and the
+    results go through a ReorderBuffer so that the uploads are emitted in channel-priority order.
+    """
+
+    def __init__(self, connection_factory: Callable[[object], object], num_workers: int,
+                 latency_budget: float = 1.0, timeout: float = 30) -> None:
+        """
+        Args:
+            connection_factory: Creates a new http connection for the specified api
+            num_workers: The number of worker threads
+            latency_budget: Max seconds an upload waits for the higher priority channels
+            timeout: Max seconds to wait for all the channels of a cycle
+        """
+
+        self.num_workers = num_workers
+        self.latency_budget = latency_budget
+        self.timeout = timeout
+        self._connection_factory = connection_factory
+        self._job_queues = [queue.Queue() for _ in range(num_workers)]
+        self._results = queue.Queue()
+        self._workers = []
+        self._cycle = 0
+        self._lock = Lock()
+
+    def _start_workers(self) -> None:
+        for worker_ind, job_queue in enumerate(self._job_queues):
+            worker = Thread(target=self._work, args=(job_queue,), daemon=True,
+                            name=f'ParallelUploads_{worker_ind}')
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self, job_queue: queue.Queue) -> None:
+        connections = {}
+        while True:
+            job = job_queue.get()
+            if job is None:  # Shutdown sentinel
+                return
+            cycle, index, ch_id, api, fetch = job
+            try:
+                if api not in connections:
+                    connections[api] = self._connection_factory(api)
+                uploads = fetch(api, connections[api], ch_id)
+            except Exception as e:
+                logger.error(f"Error getting the uploads of channel {ch_id}: {e}")
+                uploads = []
+            self._results.put((cycle, index, uploads))
+
+    def get(self, channels: List[str], apis: List,
+            fetch: Callable[[object, object, str], List[Dict]]) -> Dict:
+        """ Polls the channels and yields their uploads in channel-priority order.
+
+        Args:
+            channels: Channel IDs sorted by priority
+            apis: The apis to use, assigned round-robin to the workers
+            fetch: Returns the list of new uploads of a channel using the specified api and http
+        """
+
+        with self._lock:
+            if not self._workers:
+                self._start_workers()
+            self._cycle += 1
+            cycle = self._cycle
+        for index, ch_id in enumerate(channels):
+            worker_ind = index % self.num_workers
+            api = apis[worker_ind % len(apis)]
+            self._job_queues[worker_ind].put((cycle, index, ch_id, api, fetch))
+        buffer = ReorderBuffer(size=len(channels), latency_budget=self.latency_budget)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while not buffer.done:
+                now = time.monotonic()
+                if now >= deadline:
+                    logger.warn(f"Timed out after {self.timeout}s: "
+                                f"{len(channels) - buffer.received} channels were not checked.")
+                    break
+                wait = deadline - now
+                time_to_release = buffer.time_to_release(now)
+                if time_to_release is not None:
+                    wait = max(0, min(wait, time_to_release))
+                try:
+                    result_cycle, index, uploads = self._results.get(timeout=wait)
+                    if result_cycle == cycle:
+                        buffer.put(index, uploads, time.monotonic())
+                except queue.Empty:
+                    pass
+                for upload in buffer.pop_ready(time.monotonic()):
+                    yield upload
+            for upload in buffer.pop_ready(float('inf')):
+                yield upload
+        finally:
+            # Also when the caller stops consuming the uploads early or raises
+            self._cancel(cycle)
+
+    def _cancel(self, cycle: int) -> None:
+        """ Drops the jobs of the specified cycle that have not been started yet. """
+
+        for job_queue in self._job_queues:
+            pending = []
+            while True:
+                try:
+                    job = job_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None or job[0] != cycle:
+                    pending.append(job)
+            for job in pending:
+                job_queue.put(job)
+
+    def join(self, timeout: float = 5) -> bool:
+        """ Stops the workers and waits for them for at most `timeout` seconds in total.
+
+        Returns:
+            Whether all the workers stopped in time
+        """
+
+        with self._lock:
+            workers, self._workers = self._workers, []
+            job_queues = self._job_queues
+            self._job_queues = [queue.Queue() for _ in range(self.num_workers)]
+        for job_queue in job_queues:
+            job_queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(timeout=max(0, deadline - time.monotonic()))
+        return not any(worker.is_alive() for worker in workers)
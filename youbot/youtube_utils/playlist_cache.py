@@ -0,0 +1,67 @@
+from typing import Dict, Union
+from datetime import datetime
+from threading import Lock
+
+
+class PlaylistCache:
+    """ Caches the newest item of every uploads playlist along with the ETag of its response, so
+    that unchanged playlists can be polled with conditional requests and are not parsed again. """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = Lock()
+
+    def etag(self, playlist_id: str) -> Union[str, None]:
+        """ Returns the ETag of the last response for the specified playlist. """
+
+        entry = self._entries.get(playlist_id)
+        return entry['etag'] if entry is not None else None
+
+    def get(self, playlist_id: str, video_id: str = None) -> Union[Dict, None]:
+        """ Returns the cached newest item of the playlist and counts a hit, or counts a miss
+        if there is no cached item (or if its video ID is not `video_id` when specified).
+
+        Args:
+            playlist_id: The ID of the uploads playlist
+            video_id: The ID of the newest video in the latest response
+        """
+
+        entry = self._entries.get(playlist_id)
+        hit = entry is not None and (video_id is None or entry['video_id'] == video_id)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry if hit else None
+
+    def store(self, playlist_id: str, etag: Union[str, None], video_id: Union[str, None] = None,
+              published_at: datetime = None, video: Dict = None) -> None:
+        """ Stores the newest item of a playlist.
+
+        Args:
+            playlist_id: The ID of the uploads playlist
+            etag: The ETag of the response
+            video_id: The ID of the newest video
+            published_at: The parsed publish time of the newest video
+            video: The video dict yielded for the newest video
+        """
+
+        self._entries[playlist_id] = {'etag': etag, 'video_id': video_id,
+                                      'published_at': published_at, 'video': video}
+
+    def update_etag(self, playlist_id: str, etag: Union[str, None]) -> None:
+        entry = self._entries.get(playlist_id)
+        if entry is not None:
+            entry['etag'] = etag
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        hit_ratio = self.hits / total if total else 0
+        return f"{len(self)} playlists, {self.hits} hits, {self.misses} misses " \
+               f"({hit_ratio:.1%} hit ratio)"
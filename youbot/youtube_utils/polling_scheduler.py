@@ -0,0 +1,120 @@
+from typing import Dict, List, Union
+from datetime import datetime
+
+
+class PollingScheduler:
+    """ Decides how often every channel is polled based on the times it uploaded in the past.
+
+    The upload history of each channel is reduced to (day of week, minute of day) pairs. A channel
+    is inside a likely upload window when enough of its past uploads happened within
+    `window_minutes` of the current time of day (uploads of the same day of week count fully,
+    those of other days count `other_days_weight`). Channels are polled every `fast_interval`
+    seconds inside their windows and every `slow_interval` seconds outside of them. Channels
+    with fewer than `min_uploads` known uploads are polled every `default_interval` seconds.
+    """
+
+    SLOT_MINUTES = 5  # The windows are evaluated for 5-minute slots of the day
+
+    def __init__(self, fast_interval: float, slow_interval: float, default_interval: float,
+                 window_minutes: int = 20, min_uploads: int = 5, min_share: float = 0.05,
+                 other_days_weight: float = 0.25) -> None:
+        """
+        Args:
+            fast_interval: Seconds between polls inside the upload windows
+            slow_interval: Seconds between polls outside the upload windows
+            default_interval: Seconds between polls of the channels without enough history
+            window_minutes: How close to a past upload time of day counts as inside a window
+            min_uploads: The uploads needed before the history of a channel is trusted
+            min_share: The minimum (weighted) share of uploads inside a window
+            other_days_weight: The weight of the uploads of the other days of the week
+        """
+
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.default_interval = default_interval
+        self.window_minutes = window_minutes
+        self.min_uploads = min_uploads
+        self.min_share = min_share
+        self.other_days_weight = other_days_weight
+        self._history = {}
+        self._windows = {}
+        self._last_poll = {}
+
+    def fit(self, upload_times: Dict[str, List[datetime]]) -> None:
+        """ Replaces the upload history of the channels.
+
+        Args:
+            upload_times: The (utc) upload times of the past videos of each channel
+        """
+
+        self._history = {ch_id: [(upload_time.weekday(), upload_time.hour * 60 + upload_time.minute)
+                                 for upload_time in ch_upload_times]
+                         for ch_id, ch_upload_times in upload_times.items()
+                         if len(ch_upload_times) >= self.min_uploads}
+        self._windows = {}
+
+    def in_window(self, ch_id: str, now: datetime) -> Union[bool, None]:
+        """ Whether the channel is inside a likely upload window (None if its history
+        is not known). """
+
+        history = self._history.get(ch_id)
+        if history is None:
+            return None
+        minute_of_day = now.hour * 60 + now.minute
+        slot = (now.weekday(), minute_of_day // self.SLOT_MINUTES)
+        windows = self._windows.setdefault(ch_id, {})
+        if slot not in windows:
+            slot_minute = slot[1] * self.SLOT_MINUTES + self.SLOT_MINUTES // 2
+            near = total = 0
+            for weekday, upload_minute in history:
+                weight = 1 if weekday == slot[0] else self.other_days_weight
+                total += weight
+                distance = abs(upload_minute - slot_minute)
+                if min(distance, 24 * 60 - distance) <= self.window_minutes:
+                    near += weight
+            windows[slot] = near / total >= self.min_share
+        return windows[slot]
+
+    def interval(self, ch_id: str, now: datetime) -> float:
+        """ The seconds until the channel should be polled again. """
+
+        in_window = self.in_window(ch_id, now)
+        if in_window is None:
+            return self.default_interval
+        return self.fast_interval if in_window else self.slow_interval
+
+    def due_channels(self, channels: List[str], now: datetime = None) -> List[str]:
+        """ Returns the channels that should be polled now (keeping their priority order)
+        and marks them as polled. The interval is evaluated at the current time so that a
+        channel entering an upload window does not wait for its slow interval to pass.
+
+        Args:
+            channels: Channel IDs sorted by priority
+            now: The current utc time
+        """
+
+        now = now or datetime.utcnow()
+        due = []
+        for ch_id in channels:
+            if self._seconds_until_due(ch_id, now) <= 0:
+                due.append(ch_id)
+                self._last_poll[ch_id] = now
+        return due
+
+    def seconds_until_due(self, channels: List[str], now: datetime = None) -> float:
+        """ The seconds until the next of the specified channels should be polled. """
+
+        now = now or datetime.utcnow()
+        return min((self._seconds_until_due(ch_id, now) for ch_id in channels),
+                   default=self.default_interval)
+
+    def _seconds_until_due(self, ch_id: str, now: datetime) -> float:
+        last_poll = self._last_poll.get(ch_id)
+        if last_poll is None:
+            return 0.0
+        return max(0.0, self.interval(ch_id, now) - (now - last_poll).total_seconds())
+
+    def __str__(self) -> str:
+        now = datetime.utcnow()
+        in_window = sum(1 for ch_id in self._history if self.in_window(ch_id, now))
+        return f"{len(self._history)} channels with known upload times, {in_window} in an upload window"
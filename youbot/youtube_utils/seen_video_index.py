@@ -0,0 +1,106 @@
+from typing import Iterable, Tuple, Union
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+import dateutil.parser
+from dateutil import tz
+
+
+class SeenVideoIndex:
+    """ The IDs of the videos already commented, with O(1) membership checks.
+
+    The entries are kept in the order they were seen. An upload is only detected while it is
+    at most `max_posted_hours` old, and it is always seen after it was published, so the
+    entries seen more than `window_hours` (>= max_posted_hours) ago can never match again
+    and are evicted from the front, which bounds the memory to the uploads of one window.
+    """
+
+    def __init__(self, window_hours: float) -> None:
+        """
+        Args:
+            window_hours: How long to remember a video for (should be >= max_posted_hours)
+        """
+
+        self.window = timedelta(hours=window_hours)
+        self._seen = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def video_id(video_link: str) -> str:
+        """ Extracts the video ID from a `https://youtube.com/watch?v=<id>` link. """
+
+        return video_link.split('v=')[1].split('&')[0]
+
+    def add(self, video_id: str, seen_at: datetime = None) -> None:
+        """ Marks a video as seen and evicts the expired entries.
+
+        Args:
+            video_id: The 11-character video ID
+            seen_at: When the video was seen (utc), defaults to now
+        """
+
+        seen_at = seen_at or datetime.utcnow()
+        with self._lock:
+            self._seen[video_id] = seen_at
+            self._seen.move_to_end(video_id)
+            self._evict(seen_at)
+
+    def load(self, videos: Iterable[Tuple[str, Union[datetime, str]]]) -> None:
+        """ Bulk loads the videos seen in the past, e.g. from the comments table.
+
+        Args:
+            videos: (video ID, utc time it was seen as a datetime or in iso format) pairs
+        """
+
+        min_seen_at = datetime.utcnow() - self.window
+        seen = {}
+        for video_id, seen_at in videos:
+            if isinstance(seen_at, str):
+                seen_at = self._parse_time(seen_at)
+            if seen_at >= min_seen_at and seen_at > seen.get(video_id, datetime.min):
+                seen[video_id] = seen_at
+        with self._lock:
+            for video_id, seen_at in self._seen.items():
+                if seen_at > seen.get(video_id, datetime.min):
+                    seen[video_id] = seen_at
+            self._seen = OrderedDict(sorted(seen.items(), key=lambda item: item[1]))
+            self._evict(datetime.utcnow())
+
+    @staticmethod
+    def _parse_time(time_str: str) -> datetime:
+        """ Parses an iso format utc time into a naive datetime. """
+
+        try:  # Fast path for the times stored with `datetime.isoformat()`
+            parsed = datetime.fromisoformat(time_str)
+        except ValueError:  # e.g. the `Z`-suffixed times of the YouTube API
+            parsed = dateutil.parser.parse(time_str)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(tz.UTC).replace(tzinfo=None)
+        return parsed
+
+    def evict(self, now: datetime = None) -> int:
+        """ Removes the entries seen more than `window_hours` ago.
+
+        Returns:
+            The number of entries removed
+        """
+
+        with self._lock:
+            return self._evict(now or datetime.utcnow())
+
+    def _evict(self, now: datetime) -> int:
+        min_seen_at = now - self.window
+        evicted = 0
+        while self._seen:
+            video_id, seen_at = next(iter(self._seen.items()))
+            if seen_at >= min_seen_at:
+                break
+            del self._seen[video_id]
+            evicted += 1
+        return evicted
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
@@ -0,0 +1,122 @@
+from typing import Dict, Iterable, List, Union
+import heapq
+import random
+from datetime import datetime
+import dateutil.parser
+from dateutil import tz
+
+
+class TemplateRotation:
+    """ Picks the template comment to post on a channel: a template never posted on the channel
+    if there is one (at random), otherwise the one posted the longest time ago.
+
+    Every channel has a min-heap of the templates of its pool keyed by the time each one was
+    last posted on the channel (never posted templates sort first, in random order), so the
+    next template is popped in O(log n). A template posted again is pushed back with its new
+    time and the outdated entry it leaves in the heap is skipped when it reaches the top. The
+    heap of a channel is (re)built from the last-used times the first time it is needed after
+    its pool changes.
+    """
+
+    NEVER = datetime.min
+
+    def __init__(self) -> None:
+        # channel ID -> template -> last time it was posted on the channel (utc)
+        self._last_used = {}
+        # channel ID -> templates the channel can be commented with
+        self._pools = {}
+        # channel ID -> heap of (last used, random tie-breaker, template)
+        self._heaps = {}
+
+    def set_pools(self, templates: Dict[str, List[str]], self_comments_flags: Dict[str, int]) -> None:
+        """ Sets the template pools of the channels, e.g. after the templates are reloaded.
+
+        Args:
+            templates: The `default` templates and the templates of specific channels
+            self_comments_flags: Whether each channel should only be commented with its own
+                                 templates (1), if it has any
+        """
+
+        for channel_id, self_comments_only in self_comments_flags.items():
+            pool = templates.get('default', [])
+            if channel_id in templates:
+                pool = templates[channel_id] if self_comments_only == 1 \
+                    else templates[channel_id] + pool
+            pool = set(pool)
+            if pool != self._pools.get(channel_id):
+                self._pools[channel_id] = pool
+                self._heaps.pop(channel_id, None)
+
+    def load(self, comments: Iterable[Dict]) -> None:
+        """ Bulk loads the comments posted in the past, e.g. from the comments table.
+
+        Args:
+            comments: Dicts with the `channel_id`, `comment` and `comment_time` (utc, a datetime
+                      or in iso format) of each comment
+        """
+
+        for comment in comments:
+            self.mark_used(comment['channel_id'], comment['comment'], comment['comment_time'])
+
+    def mark_used(self, channel_id: str, template: str,
+                  used_at: Union[datetime, str] = None) -> None:
+        """ Records that a template was posted on a channel.
+
+        Args:
+            channel_id:
+            template: The text of the comment
+            used_at: When it was posted (utc), defaults to now
+        """
+
+        used_at = self._parse_time(used_at) if used_at is not None else datetime.utcnow()
+        last_used = self._last_used.setdefault(channel_id, {})
+        if used_at <= last_used.get(template, self.NEVER):
+            return
+        last_used[template] = used_at
+        heap = self._heaps.get(channel_id)
+        if heap is not None and template in self._pools[channel_id]:
+            heapq.heappush(heap, (used_at, random.random(), template))
+            if len(heap) > 2 * len(self._pools[channel_id]):  # Too many outdated entries
+                del self._heaps[channel_id]
+
+    def next(self, channel_id: str) -> str:
+        """ Returns the template to post on the channel next and marks it as used now,
+        so the following call picks another one even before this one is posted.
+
+        Raises:
+            KeyError: If the channel has no template pool
+        """
+
+        pool = self._pools[channel_id]
+        if not pool:
+            raise KeyError(f"No template comments for channel {channel_id}")
+        heap = self._heaps.get(channel_id)
+        if heap is None:
+            heap = self._build_heap(channel_id)
+        last_used = self._last_used.setdefault(channel_id, {})
+        while True:
+            used_at, _, template = heap[0]
+            if used_at == last_used.get(template, self.NEVER):
+                break
+            heapq.heappop(heap)  # Outdated, the template was used again since
+        self.mark_used(channel_id, template)
+        return template
+
+    def _build_heap(self, channel_id: str) -> List:
+        last_used = self._last_used.get(channel_id, {})
+        heap = [(last_used.get(template, self.NEVER), random.random(), template)
+                for template in self._pools[channel_id]]
+        heapq.heapify(heap)
+        self._heaps[channel_id] = heap
+        return heap
+
+    @staticmethod
+    def _parse_time(value: Union[datetime, str]) -> datetime:
+        if isinstance(value, str):
+            try:  # Fast path for the times stored with `datetime.isoformat()`
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                value = dateutil.parser.parse(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(tz.UTC).replace(tzinfo=None)
+        return value
@@ -0,0 +1,231 @@
+from typing import Callable, Dict, Iterable, List, Union
+import hmac
+import hashlib
+import queue
+import time
+from threading import Thread, Event, Lock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import xml.etree.ElementTree as ElementTree
+import requests
+from youbot import ColorLogger
+
+logger = ColorLogger(logger_name='WebSub', color='green')
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+YT_NS = '{http://www.youtube.com/xml/schemas/2015}'
+TOPIC_URL = 'https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}'
+
+
+class WebSubServer:
+    """ A local WebSub (PubSubHubbub) callback server for YouTube upload notifications.
+
+    It subscribes to the uploads feed of every channel through the hub, answers the hub's
+    verification requests, and queues every upload that gets pushed to it. The callback is
+    public, so only the notifications signed by the hub with the secret are accepted. """
+
+    def __init__(self, callback_url: str, secret: str, host: str = '0.0.0.0', port: int = 8080,
+                 hub_url: str = 'https://pubsubhubbub.appspot.com/subscribe',
+                 lease_seconds: int = 432000) -> None:
+        """
+        Args:
+            callback_url: The public URL the hub will post the notifications to
+            secret: Used by the hub to sign the notifications (HMAC-SHA1)
+            host: The interface the server listens on
+            port: The port the server listens on (0 picks a free port)
+            hub_url: The subscribe URL of the hub
+            lease_seconds: The requested duration of every subscription
+        """
+
+        if not secret:
+            raise ValueError("A secret is required, otherwise anyone could push fake uploads.")
+        self.callback_url = callback_url
+        self.hub_url = hub_url
+        self.secret = secret
+        self.lease_seconds = lease_seconds
+        self.uploads = queue.Queue()
+        self._notified = Event()
+        self._subscriptions = {}
+        self._lock = Lock()
+        self._subscriber = None
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True, name='WebSubServer')
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> 'WebSubServer':
+        self._thread.start()
+        logger.info(f"Listening for upload notifications on port {self.port}..")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _due_subscriptions(self, channel_ids: Iterable[str]) -> List[str]:
+        """ The channels that are not subscribed yet or whose lease is about to expire. """
+
+        renew_before = time.time() + self.lease_seconds * 0.2
+        with self._lock:
+            return [channel_id for channel_id in channel_ids
+                    if self._subscriptions.get(channel_id, 0) <= renew_before]
+
+    def subscribe_in_background(self, channel_ids: Iterable[str]) -> None:
+        """ Runs `subscribe` on a background thread, so the requests to the hub don't block the
+        caller. Does nothing while the previous subscriptions are still being sent (the next
+        call picks up the channels they missed). """
+
+        due_channel_ids = self._due_subscriptions(channel_ids)
+        if not due_channel_ids or (self._subscriber is not None and self._subscriber.is_alive()):
+            return
+        self._subscriber = Thread(target=self.subscribe, args=(due_channel_ids,), daemon=True,
+                                  name='WebSubSubscriber')
+        self._subscriber.start()
+
+    def subscribe(self, channel_ids: Iterable[str]) -> None:
+        """ Subscribes to the channels that are not subscribed yet or whose lease is about to
+        expire (the hub verifies every subscription asynchronously).
+
+        Args:
+            channel_ids: The channel IDs to receive notifications for
+        """
+
+        for channel_id in self._due_subscriptions(channel_ids):
+            with self._lock:
+                expires_at = self._subscriptions.get(channel_id)
+                # Registered before the request, the hub may verify it right away
+                self._subscriptions[channel_id] = time.time() + self.lease_seconds
+            data = {'hub.callback': self.callback_url,
+                    'hub.mode': 'subscribe',
+                    'hub.topic': TOPIC_URL.format(channel_id=channel_id),
+                    'hub.verify': 'async',
+                    'hub.lease_seconds': self.lease_seconds,
+                    'hub.secret': self.secret}
+            try:
+                response = requests.post(self.hub_url, data=data, timeout=10)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Failed to subscribe to channel {channel_id}: {e}")
+                with self._lock:
+                    if expires_at is None:
+                        self._subscriptions.pop(channel_id, None)
+                    else:
+                        self._subscriptions[channel_id] = expires_at
+
+    def wait(self, timeout: float) -> bool:
+        """ Blocks until an upload is pushed or until the timeout expires.
+
+        Returns:
+            Whether an upload was pushed
+        """
+
+        notified = self._notified.wait(timeout)
+        self._notified.clear()
+        return notified
+
+    def put_back(self, uploads: Iterable[Dict]) -> None:
+        """ Queues again uploads returned by `get_uploads` that were not handled. """
+
+        for upload in uploads:
+            self.uploads.put(upload)
+
+    def get_uploads(self) -> List[Dict]:
+        """ Returns (and removes) the uploads pushed so far. """
+
+        uploads = []
+        while True:
+            try:
+                uploads.append(self.uploads.get_nowait())
+            except queue.Empty:
+                return uploads
+
+    def _verify_intent(self, query: Dict) -> Union[str, None]:
+        """ Returns the challenge if the hub asks to verify a subscription we requested. """
+
+        topic = query.get('hub.topic', [''])[0]
+        channel_id = parse_qs(urlparse(topic).query).get('channel_id', [None])[0]
+        mode = query.get('hub.mode', [''])[0]
+        with self._lock:
+            if channel_id not in self._subscriptions:
+                return None
+            if mode == 'subscribe':
+                lease_seconds = int(query.get('hub.lease_seconds', [self.lease_seconds])[0])
+                self._subscriptions[channel_id] = time.time() + lease_seconds
+            elif mode == 'unsubscribe':
+                del self._subscriptions[channel_id]
+        return query.get('hub.challenge', [None])[0]
+
+    def _is_signed(self, body: bytes, signature: Union[str, None]) -> bool:
+        if signature is None or '=' not in signature:
+            return False
+        method, digest = signature.split('=', 1)
+        if method not in ('sha1', 'sha256', 'sha384', 'sha512'):
+            return False
+        expected = hmac.new(self.secret.encode(), body, getattr(hashlib, method)).hexdigest()
+        return hmac.compare_digest(expected, digest)
+
+    def _push(self, body: bytes) -> None:
+        for upload in self.parse_feed(body):
+            self.uploads.put(upload)
+        self._notified.set()
+
+    @staticmethod
+    def parse_feed(body: bytes) -> List[Dict]:
+        """ Transforms an Atom upload notification into upload Dicts.
+
+        Args:
+            body: The Atom feed posted by the hub
+        """
+
+        uploads = []
+        feed = ElementTree.fromstring(body)
+        for entry in feed.findall(f'{ATOM_NS}entry'):
+            video_id = entry.findtext(f'{YT_NS}videoId')
+            if video_id is None:
+                continue
+            author = entry.find(f'{ATOM_NS}author')
+            uploads.append({'id': video_id,
+                            'published_at': entry.findtext(f'{ATOM_NS}published'),
+                            'title': entry.findtext(f'{ATOM_NS}title', default=''),
+                            'channel_title': author.findtext(f'{ATOM_NS}name', default='')
+                            if author is not None else '',
+                            'channel_id': entry.findtext(f'{YT_NS}channelId')})
+        return uploads
+
+    def _handler(self) -> Callable:
+        websub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, status: int, body: bytes = b'') -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                challenge = websub._verify_intent(parse_qs(urlparse(self.path).query))
+                if challenge is None:
+                    self._reply(404)
+                else:
+                    self._reply(200, challenge.encode())
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not websub._is_signed(body, self.headers.get('X-Hub-Signature')):
+                    logger.warn("Ignoring a notification with an invalid signature.")
+                    # The hub must still get a success response
+                    self._reply(202)
+                    return
+                try:
+                    websub._push(body)
+                except ElementTree.ParseError as e:
+                    logger.error(f"Failed to parse a notification: {e}")
+                self._reply(204)
+
+        return Handler
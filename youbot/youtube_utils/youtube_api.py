@@ -1,27 +1,32 @@
-from typing import List, Tuple, Dict, Union, Any
+from typing import List, Tuple, Dict, Union, Any, AsyncIterator
 from abc import ABC, abstractmethod
 import os
 import re
 import math
+import time
 from datetime import datetime, timedelta, timezone
 import dateutil.parser
 from oauth2client.file import Storage
 from oauth2client.tools import argparser, run_flow
-from oauth2client.client import OAuth2WebServerFlow
+from oauth2client.client import OAuth2WebServerFlow, OAuth2Credentials
 import googleapiclient
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import httplib2
-from threading import Thread
-import time
-from itertools import islice, cycle
 import traceback
+from collections import deque
 from youbot import ColorLogger
+from .async_uploads import AsyncUploads
+from .credential_pool import CredentialPool
+from .parallel_uploads import ParallelUploads
+from .playlist_cache import PlaylistCache
+from .websub import WebSubServer
 
 logger = ColorLogger(logger_name='YoutubeApi', color='green')
 
 
 class AbstractYoutubeApi(ABC):
-    __slots__ = ('channel_name', 'channel_id', '_apis', 'tag', 'playlist_ids')
+    __slots__ = ('channel_name', 'channel_id', '_apis', '_credentials', 'tag', 'playlist_ids')
 
     @abstractmethod
     def __init__(self, config: Dict, tag: str) -> None:
@@ -34,16 +39,23 @@ class AbstractYoutubeApi(ABC):
         self.channel_playlists = None
         self.tag = tag
         self._apis = []
+        self._credentials = {}
         for cr_ind, creds in enumerate(config['credentials']):
-            _api = self._build_api(
+            credentials = self._get_credentials(
                 client_id=creds['client_id'],
                 client_secret=creds['client_secret'],
-                api_version=config['api_version'],
                 read_only_scope=config['read_only_scope'],
                 tag=f'{self.tag}_{cr_ind}')
+            _api = self._build_api(credentials=credentials, api_version=config['api_version'])
             self._apis.append(_api)
+            self._credentials[_api] = credentials
         self.channel_name, self.channel_id = self._get_my_username_and_id()
 
+    @staticmethod
+    @abstractmethod
+    def _get_credentials(*args, **kwargs):
+        pass
+
     @staticmethod
     @abstractmethod
     def _build_api(*args, **kwargs):
@@ -59,19 +71,35 @@ class YoutubeApiV3(AbstractYoutubeApi):
     def __init__(self, config: Dict, tag: str):
         global logger
         logger = ColorLogger(logger_name=f'[{tag}] YoutubeApi', color='green')
-        self.parallel_uploads = ParallelUploads()
+        self.parallel_uploads = ParallelUploads(
+            connection_factory=lambda api: self._authorized_http(self._credentials[api]),
+            num_workers=int(config['num_workers']) if 'num_workers' in config else 8,
+            latency_budget=float(config['latency_budget']) if 'latency_budget' in config else 1.0)
+        self.max_concurrency = int(config['max_concurrency']) \
+            if 'max_concurrency' in config else 100
+        self.connections_per_credential = int(config['connections_per_credential']) \
+            if 'connections_per_credential' in config else 20
+        self.async_uploads = None
+        self.playlist_cache = PlaylistCache()
+        self.websub_conf = config['websub'] if 'websub' in config else {}
+        self.websub = None
+        self._push_calls = 0
         super().__init__(config, tag)
+        self.credential_pool = CredentialPool(
+            daily_quota=int(config['daily_quota']) if 'daily_quota' in config else 10000)
+        for api_ind, api in enumerate(self._apis):
+            self.credential_pool.add(api, name=f'{self.tag}_{api_ind}')
+        self.credential_pool.spend(self._apis[0], 'channels.list')  # The self username request
 
     @staticmethod
-    def _build_api(client_id: str, client_secret: str, api_version: str, read_only_scope: str,
-                   tag: str) -> googleapiclient.discovery.Resource:
+    def _get_credentials(client_id: str, client_secret: str, read_only_scope: str,
+                         tag: str) -> OAuth2Credentials:
         """
-        Build a YouTube api connection.
+        Load the stored YouTube credentials or run the OAuth flow to create them.
 
         Args:
             client_id:
             client_secret:
-            api_version:
             read_only_scope:
             tag:
         """
@@ -88,10 +116,60 @@ class YoutubeApiV3(AbstractYoutubeApi):
             args = []  # ['--noauth_local_webserver']
             flags = argparser.parse_args(args=args)
             credentials = run_flow(flow, storage, flags)
+        return credentials
+
+    @staticmethod
+    def _build_api(credentials: OAuth2Credentials,
+                   api_version: str) -> googleapiclient.discovery.Resource:
+        """
+        Build a YouTube api connection.
+
+        Args:
+            credentials:
+            api_version:
+        """
 
         api = build('youtube', api_version, http=credentials.authorize(httplib2.Http()))
         return api
 
+    @staticmethod
+    def _authorized_http(credentials: Union[OAuth2Credentials, None],
+                         timeout: int = 30) -> httplib2.Http:
+        """
+        Create a new http connection authorized with the specified credentials.
+
+        Args:
+            credentials:
+            timeout: The socket timeout in seconds
+        """
+
+        http = httplib2.Http(timeout=timeout)
+        if credentials is None:
+            return http
+        return credentials.authorize(http)
+
+    def _execute(self, api, request: googleapiclient.http.HttpRequest, operation: str,
+                 http: httplib2.Http = None) -> Dict:
+        """
+        Execute a request made with the specified api and record its quota cost.
+        The api is quarantined if it has exceeded its quota.
+
+        Args:
+            api:
+            request:
+            operation: The API method, e.g. `playlistItems.list`
+            http: The connection to use instead of the one of the api
+        """
+
+        try:
+            return request.execute(http=http)
+        except Exception as e:
+            if self.credential_pool.is_quota_exceeded(e):
+                self.credential_pool.quarantine(api)
+            raise
+        finally:
+            self.credential_pool.spend(api, operation)
+
     def _get_my_username_and_id(self) -> Tuple[str, str]:
         channels_response = self._apis[0].channels().list(
             part="snippet",
@@ -108,16 +186,23 @@ class YoutubeApiV3(AbstractYoutubeApi):
             raise Exception(error_msg)
         return my_username, my_id
 
-    def comment(self, video_id: str, comment_text: str) -> None:
+    def comment(self, video_id: str, comment_text: str,
+                http: httplib2.Http = None) -> Union[str, None]:
+        """ Comments on a video.
 
-        try:
-            properties = {'snippet.channelId': self.channel_id,
-                          'snippet.videoId': video_id,
-                          'snippet.topLevelComment.snippet.textOriginal': comment_text}
-            self._comment_threads_insert(properties=properties,
-                                         part='snippet')
-        except Exception as exc:
-            logger.error(f"An error occurred:\n{exc}")
+        Returns:
+            The ID of the new comment thread
+
+        Raises:
+            The error of the request if the comment was not posted
+        """
+
+        properties = {'snippet.channelId': self.channel_id,
+                      'snippet.videoId': video_id,
+                      'snippet.topLevelComment.snippet.textOriginal': comment_text}
+        response = self._comment_threads_insert(properties=properties, http=http,
+                                                part='snippet')
+        return response.get('id')
 
     def get_channel_info_by_username(self, username: str) -> Union[Dict, None]:
         """ Queries YouTube for a channel using the specified username.
@@ -126,11 +211,12 @@ class YoutubeApiV3(AbstractYoutubeApi):
             username (str): The username to search for
         """
 
-        channels_response = self._apis[0].channels().list(
+        api = self.credential_pool.get()
+        channels_response = self._execute(api, api.channels().list(
             forUsername=username,
             part="snippet",
             fields='items(id,snippet(title))'
-        ).execute()
+        ), 'channels.list')
         if channels_response:
             channel = self._yt_to_channel_dict(channels_response)
             if channel is not None:
@@ -147,71 +233,212 @@ class YoutubeApiV3(AbstractYoutubeApi):
             channel_id (str): The channel ID to search for
         """
 
-        channels_response = self._apis[0].channels().list(
+        api = self.credential_pool.get()
+        channels_response = self._execute(api, api.channels().list(
             id=channel_id,
             part="snippet",
             fields='items(id,snippet(title))'
-        ).execute()
+        ), 'channels.list')
 
         return self._yt_to_channel_dict(channels_response)
 
     def get_uploads_parallel(self, channels: List, max_posted_hours: int = 2) -> Dict:
+        """ Retrieves new uploads for the specified channels using a pool of worker threads.
+        The uploads are yielded in channel-priority order (within `latency_budget` seconds).
+
+        Args:
+            channels(list): A list with channel IDs sorted by priority
+            max_posted_hours:
+        """
 
-        max_channels = 50
         # Refresh playlists if needed
         if self.channel_playlists is None:
             self.refresh_playlists(channels)
-        if len(channels) <= max_channels:
-            for upload in self._get_uploads(api=self._apis[0],
-                                            channels=channels,
-                                            max_posted_hours=max_posted_hours):
+
+        def fetch(api, http, ch_id):
+            return list(self._get_channel_uploads(api=api, ch_id=ch_id,
+                                                  max_posted_hours=max_posted_hours, http=http))
+
+        for upload in self.parallel_uploads.get(channels=channels,
+                                                apis=self.credential_pool.available(),
+                                                fetch=fetch):
+            yield upload
+
+    def get_uploads_burst(self, channels: List, until: datetime, interval: float = 1,
+                          max_polls: int = None, max_posted_hours: int = 2) -> Dict:
+        """ Polls a few channels every `interval` seconds until `until` (utc) using the worker
+        pool, rotating the available credentials between the polls. Every upload is yielded
+        only the first time it is seen, with its `detected_at` (utc) time.
+        The first poll opens the connections of the workers and primes the ETags of the
+        playlists, so the burst should start shortly before the uploads are expected.
+
+        Args:
+            channels(list): A list with channel IDs sorted by priority
+            until: When to stop polling
+            interval: Seconds between the polls
+            max_polls: Stop after that many polls (each costs one quota unit per channel)
+            max_posted_hours:
+        """
+
+        # Refresh playlists if needed
+        if self.channel_playlists is None:
+            self.refresh_playlists(channels)
+
+        def fetch(api, http, ch_id):
+            return list(self._get_channel_uploads(api=api, ch_id=ch_id,
+                                                  max_posted_hours=max_posted_hours, http=http))
+
+        seen = set()
+        polls = 0
+        while channels and datetime.utcnow() < until and (max_polls is None or polls < max_polls):
+            poll_start = time.monotonic()
+            apis = self.credential_pool.available()
+            apis = apis[polls % len(apis):] + apis[:polls % len(apis)]
+            for upload in self.parallel_uploads.get(channels=channels, apis=apis, fetch=fetch):
+                if upload['id'] in seen:
+                    continue
+                seen.add(upload['id'])
+                upload['detected_at'] = datetime.utcnow()
                 yield upload
-        else:
-            self.parallel_uploads.uploads = []
-            self.parallel_uploads.done = 0
-            # smart way of keeping the ordering (mostly)
-            # assuming two splits
-            # TODO: implement for more than 2 - general case
-            channels = channels[::2] + channels[1::2]
-            channels_lists = self.split_list(channels, max_channels)
-            if len(self._apis) < len(channels_lists):
-                apis = list(islice(cycle(self._apis), len(channels_lists)))
-            else:
-                apis = self._apis
-            threads = []
-            for channels, api in zip(channels_lists, apis):
-                t = Thread(target=self.parallel_uploads.get, args=(channels, api, max_posted_hours,
-                                                                   self._get_uploads))
-                t.start()
-                threads.append(t)
-            start_t = time.time()
-            while self.parallel_uploads.done < len(channels_lists) and time.time() - start_t < 30:
-                if len(self.parallel_uploads.uploads) > 0:
-                    yield self.parallel_uploads.uploads.pop()
-            for t in threads:
-                t.join()
+            polls += 1
+            time.sleep(max(0.0, interval - (time.monotonic() - poll_start)))
+        logger.info(f"Burst: Polled {len(channels)} channels {polls} times.")
+
+    def get_uploads_async(self, channels: List, max_posted_hours: int = 2) -> Dict:
+        """ Retrieves new uploads for the specified channels by polling all of them
+        concurrently on an event loop. The uploads are yielded as soon as they arrive.
+
+        Args:
+            channels(list): A list with channel IDs
+            max_posted_hours:
+        """
+
+        if self.async_uploads is None:
+            self.async_uploads = AsyncUploads(connection_factory=self._authorized_http,
+                                              max_concurrency=self.max_concurrency,
+                                              connections_per_credential=self.connections_per_credential)
+        loop = self.async_uploads.loop
+        uploads = self.aiter_uploads(channels=channels, max_posted_hours=max_posted_hours)
+        try:
+            while True:
+                try:
+                    upload = loop.run_until_complete(uploads.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield upload
+        finally:
+            loop.run_until_complete(uploads.aclose())
+
+    async def aiter_uploads(self, channels: List, max_posted_hours: int = 2) -> AsyncIterator[Dict]:
+        """ Asynchronously iterates over the new uploads of the specified channels.
+        Must be consumed on the event loop of `self.async_uploads`.
+
+        Args:
+            channels(list): A list with channel IDs
+            max_posted_hours:
+        """
+
+        # Refresh playlists if needed
+        if self.channel_playlists is None:
+            self.refresh_playlists(channels)
+        requests = []
+        apis = {}
+        for ch_id in channels:
+            if ch_id not in self.channel_playlists:
+                continue
+            playlist_id = self.channel_playlists[ch_id]["contentDetails"]["relatedPlaylists"]["uploads"]
+            # Recorded before executing so that the requests are spread across the credentials
+            api = apis[ch_id] = self.credential_pool.get()
+            self.credential_pool.spend(api, 'playlistItems.list')
+            requests.append((ch_id, self._credentials[api],
+                             self._playlist_items_request(api, playlist_id)))
+        async for ch_id, response, exception in self.async_uploads.execute(requests):
+            if ch_id not in self.channel_playlists:
+                continue
+            playlist = self.channel_playlists[ch_id]
+            playlist_id = playlist["contentDetails"]["relatedPlaylists"]["uploads"]
+            if exception is not None and self.credential_pool.is_quota_exceeded(exception):
+                logger.warn(f"Quota exceeded while checking channel {ch_id}.")
+                self.credential_pool.quarantine(apis[ch_id])
+                continue
+            if exception is not None and not self._is_not_modified(exception):
+                self._skip_playlist(ch_id, playlist_id, exception)
+                continue
+            for upload in self._parse_playlist_items(playlist_id, response, max_posted_hours):
+                if upload is None:
+                    continue
+                upload['channel_title'] = playlist['snippet']['title']
+                upload['channel_id'] = playlist['id']
+                yield upload
+
+    def get_uploads_push(self, channels: List, max_posted_hours: int = 2) -> Dict:
+        """ Retrieves the new uploads that were pushed to the WebSub callback server since the
+        last call. Every `poll_every` calls the channels are also polled (batched) as a
+        safety net for the notifications that never arrived.
+
+        Args:
+            channels(list): A list with channel IDs
+            max_posted_hours:
+        """
+
+        if self.websub is None:
+            self.websub = WebSubServer(
+                callback_url=self.websub_conf['callback_url'],
+                secret=self.websub_conf.get('secret'),
+                host=self.websub_conf.get('host', '0.0.0.0'),
+                port=int(self.websub_conf.get('port', 8080)),
+                hub_url=self.websub_conf.get('hub_url', 'https://pubsubhubbub.appspot.com/subscribe'),
+                lease_seconds=int(self.websub_conf.get('lease_seconds', 432000))).start()
+        self.websub.subscribe_in_background(channels)
+        self._push_calls += 1
+        if self._push_calls >= int(self.websub_conf.get('poll_every', 60)):
+            self._push_calls = 0
+            for upload in self.get_uploads_batch(channels=channels, max_posted_hours=max_posted_hours):
+                yield upload
+        # Keep the priority order and skip the notifications of updated old videos
+        priorities = {ch_id: priority for priority, ch_id in enumerate(channels)}
+        min_published_at = (datetime.utcnow() - timedelta(hours=max_posted_hours)).replace(
+            tzinfo=timezone.utc)
+        uploads = [upload for upload in self.websub.get_uploads()
+                   if upload['channel_id'] in priorities]
+        uploads = deque(sorted(uploads, key=lambda _upload: priorities[_upload['channel_id']]))
+        try:
+            while uploads:
+                if dateutil.parser.parse(uploads[0]['published_at']) >= min_published_at:
+                    yield uploads[0]
+                uploads.popleft()
+        finally:  # Queue again the uploads not handled (e.g. the caller raised or stopped early)
+            self.websub.put_back(uploads)
 
     def get_uploads(self, channels: List, max_posted_hours: int = 2) -> Dict:
         max_channels = 50
         # Refresh playlists if needed
         if self.channel_playlists is None:
             self.refresh_playlists(channels)
-        if len(channels) <= max_channels:
-            for upload in self._get_uploads(api=self._apis[0],
+        for channels in self.split_list(channels, max_channels):
+            for upload in self._get_uploads(api=self.credential_pool.get(),
                                             channels=channels,
                                             max_posted_hours=max_posted_hours):
                 yield upload
-        else:
-            channels_lists = self.split_list(channels, max_channels)
-            if len(self._apis) < len(channels_lists):
-                apis = list(islice(cycle(self._apis), len(channels_lists)))
-            else:
-                apis = self._apis
-            for channels, api in zip(channels_lists, apis):
-                for upload in self._get_uploads(api=api,
-                                                channels=channels,
-                                                max_posted_hours=max_posted_hours):
-                    yield upload
+
+    def get_uploads_batch(self, channels: List, max_posted_hours: int = 2) -> Dict:
+        """ Retrieves new uploads for the specified channels by grouping the per-channel
+        playlist polls into multipart batch requests of up to 50 sub-requests each.
+
+        Args:
+            channels(list): A list with channel IDs
+            max_posted_hours:
+        """
+
+        max_channels = 50
+        # Refresh playlists if needed
+        if self.channel_playlists is None:
+            self.refresh_playlists(channels)
+        for channels in self.split_list(channels, max_channels):
+            for upload in self._get_uploads_batch(api=self.credential_pool.get(),
+                                                  channels=channels,
+                                                  max_posted_hours=max_posted_hours):
+                yield upload
 
     def _get_uploads(self, api, channels: List, max_posted_hours: int = 2) -> Dict:
         """ Retrieves new uploads for the specified channels.
@@ -245,12 +472,86 @@ class YoutubeApiV3(AbstractYoutubeApi):
             for upload in iter_uploads(channels, self.channel_playlists, api, max_posted_hours):
                 yield upload
         except Exception as e:
+            if self.credential_pool.is_quota_exceeded(e):
+                raise  # Retrying with the same api would fail as well
             logger.warn(e)
             logger.warn("Refreshing Playlists and retrying..")
             self.refresh_playlists(channels)
             for upload in iter_uploads(channels, self.channel_playlists, api, max_posted_hours):
                 yield upload
 
+    def _get_channel_uploads(self, api, ch_id: str, max_posted_hours: int = 2,
+                             http: httplib2.Http = None) -> Dict:
+        """ Retrieves new uploads for a single channel.
+
+        Args:
+            api:
+            ch_id (str): The channel ID
+            max_posted_hours:
+            http: The connection to use instead of the one of the api
+        """
+
+        playlist = self.channel_playlists.get(ch_id)
+        if playlist is None:
+            return
+        playlist_id = playlist["contentDetails"]["relatedPlaylists"]["uploads"]
+        for upload in self._get_uploads_playlist(api, ch_id, playlist_id, max_posted_hours, http):
+            if upload is None:
+                continue
+            upload['channel_title'] = playlist['snippet']['title']
+            upload['channel_id'] = playlist['id']
+            yield upload
+
+    def _get_uploads_batch(self, api, channels: List, max_posted_hours: int = 2) -> Dict:
+        """ Retrieves new uploads for the specified channels with a single batch request.
+
+        Args:
+            api:
+            channels(list): A list with up to 50 channel IDs
+            max_posted_hours:
+        """
+
+        responses = {}
+
+        def store_response(request_id, response, exception):
+            if exception is not None and self.credential_pool.is_quota_exceeded(exception):
+                logger.warn(f"Quota exceeded while checking channel {request_id}.")
+                self.credential_pool.quarantine(api)
+            elif exception is not None and not self._is_not_modified(exception):
+                playlist_id = self.channel_playlists[request_id]["contentDetails"][
+                    "relatedPlaylists"]["uploads"]
+                self._skip_playlist(request_id, playlist_id, exception)
+            else:  # A None response means the playlist was not modified
+                responses[request_id] = response
+
+        batch = api.new_batch_http_request(callback=store_response)
+        requested_channels = []
+        for ch_id in channels:
+            if ch_id not in self.channel_playlists:
+                continue
+            playlist_id = self.channel_playlists[ch_id]["contentDetails"]["relatedPlaylists"]["uploads"]
+            batch.add(self._playlist_items_request(api, playlist_id), request_id=ch_id)
+            requested_channels.append(ch_id)
+        if not requested_channels:
+            return
+        try:
+            batch.execute()
+        finally:
+            # Every sub-request costs as much as the same request outside of a batch
+            self.credential_pool.spend(api, 'playlistItems.list', count=len(requested_channels))
+        # Yield in the order the channels were requested (priority order)
+        for ch_id in requested_channels:
+            if ch_id not in responses:
+                continue
+            playlist = self.channel_playlists[ch_id]
+            playlist_id = playlist["contentDetails"]["relatedPlaylists"]["uploads"]
+            for upload in self._parse_playlist_items(playlist_id, responses[ch_id], max_posted_hours):
+                if upload is None:
+                    continue
+                upload['channel_title'] = playlist['snippet']['title']
+                upload['channel_id'] = playlist['id']
+                yield upload
+
     def refresh_playlists(self, channels_lists):
         playlist_ids_lst = []
         if len(channels_lists) > 50:
@@ -259,11 +560,12 @@ class YoutubeApiV3(AbstractYoutubeApi):
             channels_lists = [channels_lists]
         for channels in channels_lists:
             try:
-                channels_response = self._apis[0].channels().list(
+                api = self.credential_pool.get()
+                channels_response = self._execute(api, api.channels().list(
                     id=",".join(channels),
                     part="contentDetails,snippet",
                     fields="items(id,contentDetails(relatedPlaylists(uploads)),snippet(title))"
-                ).execute()
+                ), 'channels.list')
 
                 if "items" not in channels_response:
                     logger. error(
@@ -281,23 +583,25 @@ class YoutubeApiV3(AbstractYoutubeApi):
 
     def get_video_comments(self, url: str, search_terms: str = None) -> List:
         """ Populates a list with comments (and their replies).
+        Only used for the comments stored without their ID, the others are refreshed 50 at a
+        time with `get_comments_by_id`.
 
         Args:
             url:
             search_terms:
         """
-        # TODO: Make it more efficient by checking 50 comments at a time
         if not search_terms:
             search_terms = self.channel_name
         video_id = re.search(r"^.*(youtu\.be\/|vi?\/|u\/\w\/|embed\/|\?vi?=|\&vi?=)([^#\&\?]*).*",
                              url).group(2)
         page_token = ""  # "&pageToken={}".format(page_token)
-        comment_threads_response = self._apis[0].commentThreads().list(
+        api = self.credential_pool.get()
+        comment_threads_response = self._execute(api, api.commentThreads().list(
             part="snippet",
             maxResults=100,
             videoId="{}{}".format(video_id, page_token),
             searchTerms=search_terms
-        ).execute()
+        ), 'commentThreads.list')
 
         comments = []
         for comment_thread in comment_threads_response['items']:
@@ -321,6 +625,40 @@ class YoutubeApiV3(AbstractYoutubeApi):
 
         return comments
 
+    def get_comments_by_id(self, comment_ids: List[str]) -> List[Dict]:
+        """ Gets the like and reply counts of comment threads, 50 threads per request.
+
+        Args:
+            comment_ids: The IDs of the comment threads
+
+        Returns:
+            The comments in the format of `get_video_comments`, without the deleted ones
+        """
+
+        comments = []
+        for chunk in range(0, len(comment_ids), 50):
+            api = self.credential_pool.get()
+            comment_threads_response = self._execute(api, api.commentThreads().list(
+                part="snippet",
+                id=','.join(comment_ids[chunk:chunk + 50]),  # maxResults is not allowed with id
+                fields='items(id,snippet(videoId,totalReplyCount,'
+                       'topLevelComment(snippet(likeCount,publishedAt))))'
+            ), 'commentThreads.list')
+            for comment_thread in comment_threads_response.get('items', []):
+                try:
+                    snippet = comment_thread['snippet']
+                    video_id = snippet['videoId']
+                    comments.append({"url": f'https://youtube.com/watch?v={video_id}',
+                                     "video_id": video_id,
+                                     "comment_id": comment_thread['id'],
+                                     "like_count": snippet['topLevelComment']['snippet']['likeCount'],
+                                     "reply_count": snippet['totalReplyCount'],
+                                     "comment_time": snippet['topLevelComment']['snippet']['publishedAt']})
+                except Exception as e:
+                    logger.error(f"Exception in get_comments_by_id() for {comment_thread}.")
+                    logger.error(f"{e}")
+        return comments
+
     def get_profile_pictures(self, channels: List = None) -> List[Tuple[str, str]]:
         """ Gets the profile picture urls for a list of channel ids (or for the self channel).
 
@@ -331,8 +669,9 @@ class YoutubeApiV3(AbstractYoutubeApi):
             profile_pictures: [(channel_id, thumbnail_url), ..]
         """
 
+        api = self.credential_pool.get()
         if channels is None:
-            profile_pictures_requests = [self._apis[0].channels().list(
+            profile_pictures_requests = [api.channels().list(
                 mine="true",
                 part="snippet",
                 fields='items(id,snippet(thumbnails(default)))'
@@ -341,7 +680,7 @@ class YoutubeApiV3(AbstractYoutubeApi):
             channels_list = self.split_list(channels, 50)
             profile_pictures_requests = []
             for channels in channels_list:
-                profile_pictures_requests.append(self._apis[0].channels().list(
+                profile_pictures_requests.append(api.channels().list(
                     id=",".join(channels),
                     part="snippet",
                     fields='items(id,snippet(thumbnails(default)))'
@@ -349,7 +688,8 @@ class YoutubeApiV3(AbstractYoutubeApi):
 
         profile_pictures_responses = []
         for profile_pictures_request in profile_pictures_requests:
-            profile_pictures_response = profile_pictures_request.execute()
+            profile_pictures_response = self._execute(api, profile_pictures_request,
+                                                      'channels.list')
             profile_pictures_responses.append(profile_pictures_response)
 
         profile_pictures_result = []
@@ -366,11 +706,12 @@ class YoutubeApiV3(AbstractYoutubeApi):
         videos_found = []
         # Get the Playlist IDs of each channel
         for videos in videos_lists:
-            channels_response = self._apis[0].videos().list(
+            api = self.credential_pool.get()
+            channels_response = self._execute(api, api.videos().list(
                 id=",".join(videos),
                 part="contentDetails,snippet",
                 fields="items(id,snippet(channelId,publishedAt,title))"
-            ).execute()
+            ), 'videos.list')
             videos_found.extend(channels_response["items"])
 
         for video in videos_found:
@@ -424,7 +765,7 @@ class YoutubeApiV3(AbstractYoutubeApi):
         return output_list
 
     def _get_uploads_playlist(self, api, ch_id: str, uploads_list_id: str,
-                              max_posted_hours: int = 2) -> Dict:
+                              max_posted_hours: int = 2, http: httplib2.Http = None) -> Dict:
         """ Retrieves uploads using the specified playlist ID which were had been added
         since the last check.
 
@@ -433,49 +774,127 @@ class YoutubeApiV3(AbstractYoutubeApi):
             ch_id (str):
             uploads_list_id (str): The ID of the uploads playlist
             max_posted_hours:
+            http: The connection to use instead of the one of the api
         """
 
         # Construct the request
+        playlist_items_request = self._playlist_items_request(api, uploads_list_id)
+
+        try:
+            try:
+                playlist_items_response = self._execute(api, playlist_items_request,
+                                                        'playlistItems.list', http=http)
+            except HttpError as e:
+                if not self._is_not_modified(e):
+                    raise
+                playlist_items_response = None
+            for video in self._parse_playlist_items(uploads_list_id, playlist_items_response,
+                                                    max_posted_hours):
+                yield video
+        except Exception as e:
+            if self.credential_pool.is_quota_exceeded(e):
+                raise  # Not a problem of the playlist
+            self._skip_playlist(ch_id, uploads_list_id, e)
+
+    def _playlist_items_request(self, api, uploads_list_id: str) -> googleapiclient.http.HttpRequest:
+        """ Builds the request for the latest item of an uploads playlist. If the playlist has
+        been polled before, the request is conditional on its ETag.
+
+        Args:
+            api:
+            uploads_list_id (str): The ID of the uploads playlist
+        """
+
         playlist_items_request = api.playlistItems().list(
             playlistId=uploads_list_id,
             part="snippet",
-            fields='items(id,snippet(title,publishedAt,resourceId(videoId)))',
+            fields='etag,items(id,snippet(title,publishedAt,resourceId(videoId)))',
             maxResults=1
         )
+        etag = self.playlist_cache.etag(uploads_list_id)
+        if etag is not None:
+            playlist_items_request.headers['If-None-Match'] = etag
+        return playlist_items_request
 
-        try:
-            playlist_items_response = playlist_items_request.execute()
-            for playlist_item in playlist_items_response["items"]:
-                published_at = dateutil.parser.parse(playlist_item['snippet']['publishedAt'])
-                video = dict()
+    def _parse_playlist_items(self, uploads_list_id: str, playlist_items_response: Union[Dict, None],
+                              max_posted_hours: int = 2) -> Dict:
+        """ Transforms a playlistItems response into video Dicts.
+        Yields None for the items that were published more than `max_posted_hours` ago.
+        Unchanged items are served from the playlist cache instead of being parsed again.
+
+        Args:
+            uploads_list_id (str): The ID of the uploads playlist
+            playlist_items_response: The response, or None if the playlist was not modified
+            max_posted_hours:
+        """
+
+        min_published_at = (datetime.utcnow() - timedelta(hours=max_posted_hours)).replace(
+            tzinfo=timezone.utc)
+        if playlist_items_response is None:  # 304: Same as the cached response
+            cached = self.playlist_cache.get(uploads_list_id)
+            if cached is not None and cached['video'] is not None:
                 # Return the video only if it was published in the last `last_n_hours` hours
-                if published_at >= (datetime.utcnow() - timedelta(hours=max_posted_hours)).replace(
-                        tzinfo=timezone.utc):
-                    video['id'] = playlist_item["snippet"]["resourceId"]["videoId"]
-                    video['published_at'] = playlist_item["snippet"]["publishedAt"]
-                    video['title'] = playlist_item["snippet"]["title"]
-                    yield video
-                else:
-                    yield None
+                yield cached['video'].copy() if cached['published_at'] >= min_published_at else None
+            return
+        etag = playlist_items_response.get('etag')
+        if not playlist_items_response["items"]:
+            self.playlist_cache.store(uploads_list_id, etag=etag)
+        # Only the newest item is requested
+        for playlist_item in playlist_items_response["items"][:1]:
+            video_id = playlist_item["snippet"]["resourceId"]["videoId"]
+            cached = self.playlist_cache.get(uploads_list_id, video_id=video_id)
+            if cached is not None:  # Same newest video as the cached response
+                self.playlist_cache.update_etag(uploads_list_id, etag)
+            else:
+                video = dict()
+                video['id'] = video_id
+                video['published_at'] = playlist_item["snippet"]["publishedAt"]
+                video['title'] = playlist_item["snippet"]["title"]
+                published_at = dateutil.parser.parse(video['published_at'])
+                self.playlist_cache.store(uploads_list_id, etag=etag, video_id=video_id,
+                                          published_at=published_at, video=video)
+                cached = {'published_at': published_at, 'video': video}
+            # Return the video only if it was published in the last `last_n_hours` hours
+            yield cached['video'].copy() if cached['published_at'] >= min_published_at else None
+
+    @staticmethod
+    def _is_not_modified(e: Exception) -> bool:
+        """ Whether the exception is a `304 Not Modified` response to a conditional request. """
+
+        return isinstance(e, HttpError) and e.resp.status == 304
+
+    def _skip_playlist(self, ch_id: str, uploads_list_id: str, e: Exception) -> None:
+        """ Removes a channel whose uploads playlist failed from the polled playlists.
+
+        Args:
+            ch_id (str):
+            uploads_list_id (str): The ID of the uploads playlist
+            e: The exception raised
+        """
+
+        try:
+            logger.error(e)
+            if ch_id in self.channel_playlists:
+                logger.warn(f"Skipping upload list {uploads_list_id} for channel {ch_id}..")
+                del self.channel_playlists[ch_id]
         except Exception as e:
-            try:
-                logger.error(e)
-                if ch_id in self.channel_playlists:
-                    logger.warn(f"Skipping upload list {uploads_list_id} for channel {ch_id}..")
-                    del self.channel_playlists[ch_id]
-            except Exception as e:
-                logger.error(e)
+            logger.error(e)
 
-    def _comment_threads_insert(self, properties: Dict, **kwargs: Any) -> Dict:
+    def _comment_threads_insert(self, properties: Dict, http: httplib2.Http = None,
+                                **kwargs: Any) -> Dict:
         """ Comment using the YouTube API.
         Args:
             properties:
+            http: The connection to use instead of the one of the api
             **kwargs:
         """
 
         resource = self._build_resource(properties)
         kwargs = self._remove_empty_kwargs(**kwargs)
-        response = self._apis[0].commentThreads().insert(body=resource, **kwargs).execute()
+        # Always comment with the first credential: It is the one of the self channel
+        api = self._apis[0]
+        response = self._execute(api, api.commentThreads().insert(body=resource, **kwargs),
+                                 'commentThreads.insert', http=http)
         return response
 
     @staticmethod
@@ -529,19 +948,3 @@ class YoutubeApiV3(AbstractYoutubeApi):
                     good_kwargs[key] = value
         return good_kwargs
 
-
-class ParallelUploads:
-    def __init__(self):
-        self.uploads = []
-        self.done = 0
-
-    def get(self, channels, api, max_posted_hours, _get_uploads):
-        try:
-            for upload in _get_uploads(api=api,
-                                       channels=channels,
-                                       max_posted_hours=max_posted_hours):
-                self.uploads.append(upload)
-        except Exception as e:
-            logger.error(e)
-            self.done += 1
-        self.done += 1
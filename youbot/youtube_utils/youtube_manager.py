@@ -1,5 +1,5 @@
 from typing import *
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
 import time
 import arrow
@@ -8,8 +8,17 @@ import string
 import os
 from glob import glob
 
-from youbot import ColorLogger, YoutubeMySqlDatastore, DropboxCloudManager
+from youbot import ColorLogger, YoutubeMySqlDatastore, YoutubeSqliteDatastore, \
+    DropboxCloudManager, CommentArchive
 from .youtube_api import YoutubeApiV3
+from .credential_pool import QuotaExceededError
+from .polling_scheduler import PollingScheduler
+from .burst_scheduler import BurstScheduler
+from .seen_video_index import SeenVideoIndex
+from .template_rotation import TemplateRotation
+from .cloud_sync import CloudFolderSync
+from .log_shipper import LogShipper, DropboxUploadSession
+from .comment_poster import CommentPoster
 
 logger = ColorLogger(logger_name='YoutubeManager', color='cyan')
 
@@ -19,19 +28,28 @@ class YoutubeManager(YoutubeApiV3):
                  'slow_sleep_time', 'max_posted_hours', 'api_type',
                  'template_comments', 'log_path', 'reload_data_every', 'keys_path',
                  'dbox_logs_folder_path', 'dbox_keys_folder_path', 'comments_src',
-                 'comment_search_term', 'crashed_file', 'num_comments_to_check')
+                 'comment_search_term', 'crashed_file', 'num_comments_to_check',
+                 'polling_scheduler', 'burst_scheduler', 'upload_history_size', 'seen_videos',
+                 'comment_poster', '_poster_http', 'template_rotation', 'template_files',
+                 'template_sync', 'sync_interval', 'sync_workers', 'log_shipper')
 
     def __init__(self, config: Dict, db_conf: Dict, cloud_conf: Dict, comments_conf: Dict,
                  sleep_time: int, fast_sleep_time: int, slow_sleep_time: int, max_posted_hours: int,
                  api_type: str, tag: str, log_path: str):
         global logger
         logger = ColorLogger(logger_name=f'[{tag}] YoutubeManager', color='cyan')
-        self.db = YoutubeMySqlDatastore(config=db_conf['config'], tag=tag)
+        if db_conf['type'] == 'mysql':
+            self.db = YoutubeMySqlDatastore(config=db_conf['config'], tag=tag)
+        elif db_conf['type'] == 'sqlite':
+            self.db = YoutubeSqliteDatastore(config=db_conf['config'], tag=tag)
+        else:
+            raise YoutubeManagerError(f"Datastore type `{db_conf['type']}` is not supported!")
         self.comments_conf = None
         if comments_conf is not None:
             self.comments_src = comments_conf['type']
             self.comments_conf = comments_conf['config']
         self.dbox = None
+        self.log_shipper = None
         if cloud_conf is not None:
             cloud_conf = cloud_conf['config']
             self.dbox = DropboxCloudManager(config=cloud_conf)
@@ -39,6 +57,18 @@ class YoutubeManager(YoutubeApiV3):
             self.dbox_keys_folder_path = cloud_conf['keys_folder_path']
             self.reload_data_every = int(
                 cloud_conf['reload_data_every']) if 'reload_data_every' in cloud_conf else 100
+            self.sync_interval = float(
+                cloud_conf['sync_interval']) if 'sync_interval' in cloud_conf else 300
+            self.sync_workers = int(
+                cloud_conf['sync_workers']) if 'sync_workers' in cloud_conf else 4
+            self.log_shipper = LogShipper(
+                uploader=DropboxUploadSession(api_key=cloud_conf['api_key']), log_path=log_path,
+                upload_folder=self.dbox_logs_folder_path,
+                interval=float(cloud_conf['log_upload_interval'])
+                if 'log_upload_interval' in cloud_conf else 600,
+                max_bytes=int(cloud_conf['max_log_bytes'])
+                if 'max_log_bytes' in cloud_conf else 10 * 1024 * 1024,
+                backups=int(cloud_conf['log_backups']) if 'log_backups' in cloud_conf else 3)
         elif self.comments_conf is not None:
             if self.comments_src == 'dropbox':
                 raise YoutubeManagerError("Requested `dropbox` comments type "
@@ -47,8 +77,14 @@ class YoutubeManager(YoutubeApiV3):
         self.fast_sleep_time = fast_sleep_time
         self.slow_sleep_time = slow_sleep_time
         self.max_posted_hours = max_posted_hours
+        self.seen_videos = SeenVideoIndex(window_hours=max_posted_hours)
+        self.comment_poster = None
+        self._poster_http = None
         self.api_type = api_type
         self.template_comments = {}
+        self.template_rotation = TemplateRotation()
+        self.template_files = {}
+        self.template_sync = None
         base_path = os.path.dirname(os.path.abspath(__file__))
         self.crashed_file = os.path.join(base_path, '../../.crashed')
         if self.api_type == 'simulated':
@@ -56,6 +92,18 @@ class YoutubeManager(YoutubeApiV3):
         elif self.api_type == 'parallel':
             self.get_uploads = super().get_uploads_parallel
             logger.info("Starting in Threading mode.")
+        elif self.api_type == 'async':
+            self.get_uploads = super().get_uploads_async
+            logger.info("Starting in Asyncio mode.")
+        elif self.api_type == 'push':
+            if not (config.get('websub') or {}).get('secret'):
+                raise YoutubeManagerError("The `websub` `secret` is required in push mode, "
+                                          "the callback server is public.")
+            self.get_uploads = super().get_uploads_push
+            logger.info("Starting in Push mode.")
+        elif self.api_type == 'batch':
+            self.get_uploads = super().get_uploads_batch
+            logger.info("Starting in Batch mode.")
         else:  # normal
             self.get_uploads = super().get_uploads
         self.keys_path = config['keys_path']
@@ -66,6 +114,35 @@ class YoutubeManager(YoutubeApiV3):
         self.num_comments_to_check = 50
         if 'num_comments_to_check' in config:
             self.num_comments_to_check = config['num_comments_to_check']
+        self.upload_history_size = int(config['upload_history_size']) \
+            if 'upload_history_size' in config else 5000
+        self.polling_scheduler = None
+        if 'adaptive_polling' in config:
+            if self.api_type == 'push':
+                logger.warn("Adaptive polling is not used in push mode.")
+            else:
+                polling_conf = config['adaptive_polling'] or {}
+                self.polling_scheduler = PollingScheduler(
+                    fast_interval=float(polling_conf.get('fast_interval', sleep_time)),
+                    slow_interval=float(polling_conf.get('slow_interval', slow_sleep_time)),
+                    default_interval=float(polling_conf.get('default_interval', sleep_time)),
+                    window_minutes=int(polling_conf.get('window_minutes', 20)),
+                    min_uploads=int(polling_conf.get('min_uploads', 5)))
+                logger.info("Using adaptive polling.")
+        self.burst_scheduler = None
+        if 'burst' in config:
+            if self.api_type in ('push', 'simulated'):
+                logger.warn(f"Burst mode is not used in {self.api_type} mode.")
+            else:
+                burst_conf = config['burst'] or {}
+                self.burst_scheduler = BurstScheduler(
+                    size=int(burst_conf.get('size', 5)),
+                    interval=float(burst_conf.get('interval', 1)),
+                    start_before=float(burst_conf.get('start_before', 5)),
+                    duration=float(burst_conf.get('duration', 30)),
+                    min_share=float(burst_conf.get('min_share', 0.2)),
+                    quota_share=float(burst_conf.get('quota_share', 0.2)))
+                logger.info("Using burst mode in the hot minute.")
         if 'load_keys_from_cloud' in config:
             if config['load_keys_from_cloud'] is True:
                 self.load_keys_from_cloud()
@@ -76,8 +153,7 @@ class YoutubeManager(YoutubeApiV3):
     def _get_channel_data(self):
         channel_data = list(self.db.get_channels(channel_cols=['channel_id',
                                                                'self_comments_only',
-                                                               'delay_comment', 'priority'],
-                                                 complex_sort_key=3))
+                                                               'delay_comment', 'priority']))
         channel_ids = [channel['channel_id'] for channel in channel_data]
         self_comments_flags_lst = [channel['self_comments_only'] for channel in channel_data]
         delay_comment_lst = [channel['delay_comment'] for channel in channel_data]
@@ -94,111 +170,239 @@ class YoutubeManager(YoutubeApiV3):
         sleep_time = self.default_sleep_time
         loop_cnt = 0
         errors = 0
-        apis = self._apis
         self.load_template_comments()
         channel_ids, self_comments_flags, delay_comment = self._get_channel_data()
         self.refresh_playlists(channel_ids)
-        _, video_links_commented = self.get_comments(channel_ids=channel_ids,
-                                                     n_recent=500)
-        commented_comments, _ = self.get_comments(channel_ids=channel_ids,
-                                                  min_likes=5,
-                                                  n_recent=500)
+        self.load_upload_history()
+        commented_comments = self.load_comment_history(channel_ids=channel_ids,
+                                                       min_likes=5,
+                                                       n_recent=500)
+        self.template_rotation.set_pools(self.template_comments, self_comments_flags)
+        for channel_comments in commented_comments.values():
+            self.template_rotation.load(channel_comments)
+        self.comment_poster = CommentPoster(post=self._post_comment).start()
+        if self.log_shipper is not None:
+            self.log_shipper.start()
         sleep_time_prev = -1  # Define a different value than sleep_time so it prints the first time
         logger.info("Done")
         # Start the main loop
-        while True:
-            if sleep_time != sleep_time_prev:
-                logger.info(f'New sleep time: {sleep_time}')
-            sleep_time_prev = sleep_time
-            time.sleep(sleep_time)
-            # Reload stuff and upload logs
-            loop_cnt += 1
-            if (loop_cnt > self.reload_data_every and sleep_time > self.fast_sleep_time) \
-                    or sleep_time > self.slow_sleep_time:
-                channel_ids, self_comments_flags, delay_comment = self._get_channel_data()
-                self.load_template_comments()
-                self.refresh_playlists(channel_ids)
-                self._apis = apis  # Retry the failed apis
-                if self.dbox is not None:
+        try:
+            while True:
+                if sleep_time != sleep_time_prev:
+                    logger.info(f'New sleep time: {sleep_time}')
+                sleep_time_prev = sleep_time
+                if self.websub is not None:
+                    self.websub.wait(sleep_time)  # Wakes up as soon as an upload is pushed
+                else:
+                    time.sleep(sleep_time)
+                # Reload stuff and upload logs
+                loop_cnt += 1
+                if (loop_cnt > self.reload_data_every and sleep_time > self.fast_sleep_time) \
+                        or sleep_time > self.slow_sleep_time:
+                    channel_ids, self_comments_flags, delay_comment = self._get_channel_data()
+                    self.load_template_comments()
+                    self.template_rotation.set_pools(self.template_comments, self_comments_flags)
+                    self.refresh_playlists(channel_ids)
+                    logger.info(f"Playlist cache: {self.playlist_cache}")
+                    logger.info(f"Quota usage: {self.credential_pool}")
+                    self.load_upload_history()
                     self.upload_logs()
-                loop_cnt = 0
-            comments_added = []
-            added_comment = False  # Flag to check if commented on raised error
+                    loop_cnt = 0
 
-            # Sort the videos by the priority of the channels (channel_ids are sorted by priority)
-            # and comment in the videos not already commented
-            try:
-                loop_start = time.time()
-                for video in self.get_uploads(channels=channel_ids,
-                                              max_posted_hours=self.max_posted_hours):
-                    video_url = f'https://youtube.com/watch?v={video["id"]}'
-                    if video_url not in video_links_commented:
-                        comment_text = \
-                            self.get_next_template_comment(channel_id=video["channel_id"],
-                                                           commented_comments=commented_comments,
-                                                           self_comments_flags=self_comments_flags)
-                        self.comment(video_id=video["id"], comment_text=comment_text)
-                        added_comment = True
-                        # Add the info of the new comment to be added in the DB after this loop
-                        curr_loop_time = time.time() - loop_start
-                        if curr_loop_time < delay_comment[video["channel_id"]] - sleep_time:
-                            ch_delay = int(
-                                delay_comment[video["channel_id"]] - curr_loop_time - sleep_time)
-                            logger.info(f"Requested Delay: {delay_comment[video['channel_id']]}")
-                            logger.info(f"Seconds Passed: {curr_loop_time}")
-                            logger.info(f"Sleeping for extra: {ch_delay}")
-                            time.sleep(ch_delay)
-                        video_links_commented.append(video_url)
-                        comments_added.append((video, video_url, comment_text,
-                                               datetime.utcnow().isoformat()))
-                errors = 0
-            except Exception as e:
-                if added_comment is True:  # Raise fatal exception if error after commented
-                    self.raise_fatal(e, 'Error after leaving a comment')
-                elif 'SERVICE_UNAVAILABLE' in str(e):
-                    logger.warn("YT Service unavailable..")
-                elif 'quotaExceeded' in str(e):
-                    logger.warn(f"Quota Exceeded..")
-                    if len(self._apis) > 1:
-                        self._apis = [self._apis[0]]  # Fix by using only first api
+                # Sort the videos by the priority of the channels (channel_ids are sorted by priority)
+                # and comment in the videos not already commented
+                try:
+                    loop_start = time.time()
+                    burst = self.burst_scheduler is not None \
+                        and self.burst_scheduler.seconds_until_burst() == 0
+                    if burst:
+                        burst_channel_ids, burst_end = self.burst_scheduler.start_burst(channel_ids)
+                        headroom = sum(self.credential_pool.headroom(api)
+                                       for api in self.credential_pool.available())
+                        max_polls, burst_interval = self.burst_scheduler.budget(
+                            num_channels=len(burst_channel_ids), headroom=headroom,
+                            seconds_until_reset=self.credential_pool.seconds_until_reset())
+                        logger.info(f"Starting a burst for {len(burst_channel_ids)} channels: "
+                                    f"{max_polls} polls every {burst_interval:.1f}s "
+                                    f"(up to {max_polls * len(burst_channel_ids)} quota units).")
+                        uploads = self.get_uploads_burst(channels=burst_channel_ids,
+                                                         until=burst_end,
+                                                         interval=burst_interval,
+                                                         max_polls=max_polls,
+                                                         max_posted_hours=self.max_posted_hours)
+                    else:
+                        if self.polling_scheduler is not None:
+                            polled_channel_ids = self.polling_scheduler.due_channels(channel_ids)
+                        else:
+                            polled_channel_ids = channel_ids
+                        uploads = self.get_uploads(channels=polled_channel_ids,
+                                                   max_posted_hours=self.max_posted_hours)
+                    for video in uploads:
+                        if burst:
+                            self.burst_scheduler.record(video)
+                        video_url = f'https://youtube.com/watch?v={video["id"]}'
+                        if video["id"] not in self.seen_videos:
+                            comment_text = self.get_next_template_comment(channel_id=video["channel_id"])
+                            # Posted by the comment poster once the delay of the channel expires,
+                            # so the detection of the other channels goes on in the meantime
+                            curr_loop_time = time.time() - loop_start
+                            ch_delay = delay_comment[video["channel_id"]] - curr_loop_time - sleep_time
+                            if ch_delay > 0:
+                                logger.info(f"Requested Delay: {delay_comment[video['channel_id']]}")
+                                logger.info(f"Will comment on {video_url} in {ch_delay:.1f} seconds")
+                            self.comment_poster.schedule({'video': video, 'video_url': video_url,
+                                                          'comment_text': comment_text},
+                                                         delay=ch_delay)
+                            self.seen_videos.add(video["id"])
+                    if burst:
+                        logger.info(self.burst_scheduler)
+                    errors = 0
+                except Exception as e:
+                    if 'SERVICE_UNAVAILABLE' in str(e):
+                        logger.warn("YT Service unavailable..")
+                    elif 'quotaExceeded' in str(e):
+                        # The credential that exceeded its quota is quarantined by the pool
+                        logger.warn(f"Quota Exceeded.. Quota usage: {self.credential_pool}")
+                        if isinstance(e, QuotaExceededError):  # No credentials left
+                            errors += 1
                     else:
+                        error_txt = f"Unknown Exception in the main loop:\n{e}"
+                        logger.error(error_txt)
                         errors += 1
+                    if errors > 5:
+                        sleep_time = self.seconds_until_next_hour()
+                        logger.info(f"More than 5 errors! Will sleep until {datetime.now() + timedelta(seconds=sleep_time)}")
+                        self.upload_logs()
+                        loop_cnt = 0
                 else:
-                    error_txt = f"Unknown Exception in the main loop:\n{e}"
-                    logger.error(error_txt)
-                    errors += 1
-                if errors > 5:
-                    self._apis = apis
-                    sleep_time = self.seconds_until_next_hour()
-                    logger.info(f"More than 5 errors! Will sleep until {datetime.now() + timedelta(seconds=sleep_time)}")
-                    self.upload_logs()
-                    loop_cnt = 0
-            else:
-                if 4 <= datetime.utcnow().hour <= 11:
-                    sleep_time = self.slow_sleep_time
-                elif datetime.utcnow().minute >= 58 or datetime.utcnow().minute <= 1:
-                    sleep_time = self.fast_sleep_time  # check every second when close to new hour
-                else:
-                    sleep_time = self.default_sleep_time
-                if self.exceeds_hot_minute(sleep_time):
-                    sleep_time = self.seconds_until_next_hour()
-                    logger.info(f"Will sleep until {datetime.now() + timedelta(seconds=sleep_time)}")
-            # Save the new comments added in the DB
-            try:
-                for (video, video_url, comment_text, comment_time) in comments_added:
-                    self.db.add_comment(video["channel_id"],
-                                        video_link=video_url,
-                                        comment_text=comment_text,
-                                        upload_time=video["published_at"],
-                                        video_title=video['title'])
-                    # Update commented_comments, so we don't have to reload it from the DB
-                    commented_comments[video['channel_id']].append({'channel_id': video['channel_id'],
-                                                                    'video_link': video_url,
-                                                                    'comment': comment_text,
-                                                                    'comment_time': comment_time})
-                    logger.info(f"Added comment: {video_url}")
-            except Exception as e:
-                self.raise_fatal(e, 'FatalMySQL error while storing comment')
+                    if self.polling_scheduler is not None:
+                        # Wake up when the next channel is due but at least every `sleep_time` secs
+                        sleep_time = min(max(self.polling_scheduler.seconds_until_due(channel_ids), 1),
+                                         self.default_sleep_time)
+                    elif 4 <= datetime.utcnow().hour <= 11:
+                        sleep_time = self.slow_sleep_time
+                    elif self.burst_scheduler is None and \
+                            (datetime.utcnow().minute >= 58 or datetime.utcnow().minute <= 1):
+                        sleep_time = self.fast_sleep_time  # check every second when close to new hour
+                    else:
+                        sleep_time = self.default_sleep_time
+                    if self.burst_scheduler is not None:
+                        # The hot minute is handled by the bursts
+                        sleep_time = min(sleep_time, self.burst_scheduler.seconds_until_burst())
+                    elif self.exceeds_hot_minute(sleep_time):
+                        sleep_time = self.seconds_until_next_hour()
+                        logger.info(f"Will sleep until {datetime.now() + timedelta(seconds=sleep_time)}")
+                # Save the comments posted in the meantime in the DB (in the order they were posted)
+                try:
+                    self._store_posted_comments()
+                except Exception as e:
+                    self.raise_fatal(e, 'Error after leaving a comment')
+        finally:
+            # Also when the loop is interrupted, so that no posted comment is left out of the DB
+            # (the bot would comment on the same videos again after a restart)
+            self._stop_comment_poster()
+
+    def _store_posted_comments(self) -> None:
+        """ Stores the comments posted by the comment poster since the last call in the DB, in the
+        order they were posted.
+
+        Raises:
+            YoutubeManagerError: If some posted comments could not be stored
+        """
+
+        posted_comments = self.comment_poster.posted()
+        not_stored = self.db.add_comments([{'ch_id': posted['video']['channel_id'],
+                                            'video_link': posted['video_url'],
+                                            'comment_text': posted['comment_text'],
+                                            'comment_time': posted['comment_time'],
+                                            'comment_id': posted.get('comment_id'),
+                                            'upload_time': posted['video']['published_at'],
+                                            'video_title': posted['video']['title']}
+                                           for posted in posted_comments])
+        for posted in posted_comments:
+            video, video_url = posted['video'], posted['video_url']
+            # Update the template rotation, so we don't have to reload it from the DB
+            self.template_rotation.mark_used(video['channel_id'], posted['comment_text'],
+                                             posted['comment_time'])
+            logger.info(f"Added comment: {video_url}")
+        if not_stored:
+            raise YoutubeManagerError(
+                f"{len(not_stored)} posted comments could not be stored: "
+                f"{', '.join(comment['video_link'] for comment in not_stored)}")
+
+    def _stop_comment_poster(self) -> None:
+        """ Stops the comment poster, letting the comment being posted finish, and stores the
+        comments it posted. The comments still waiting for the delay of their channel were not
+        posted and are dropped. """
+
+        if self.comment_poster is None:
+            return
+        self.comment_poster.stop(timeout=60)
+        try:
+            self._store_posted_comments()
+        except Exception as e:
+            self.raise_fatal(e, 'Error while storing the posted comments')
+
+    def _post_comment(self, pending: Dict) -> None:
+        """ Posts a pending comment of the comment poster. Runs on the thread of the poster,
+        so it uses a connection of its own (httplib2 connections are not thread-safe).
+        Raises if the comment was not posted, so that the poster does not hand it back. """
+
+        if self._poster_http is None:
+            self._poster_http = self._authorized_http(self._credentials[self._apis[0]])
+        pending['comment_id'] = self.comment(video_id=pending['video']['id'],
+                                             comment_text=pending['comment_text'],
+                                             http=self._poster_http)
+        pending['comment_time'] = datetime.utcnow().isoformat()
+
+    def load_comment_history(self, channel_ids: List[str], n_recent: int,
+                             min_likes: int) -> Dict[str, List[Dict]]:
+        """ Loads, with a single query, the comments the template comments of every channel are
+        picked against and the videos commented within the window of the seen videos index.
+
+        Returns:
+            The `n_recent` latest comments with at least `min_likes` likes of every channel
+        """
+
+        since = (datetime.utcnow() - self.seen_videos.window).isoformat()
+        commented_comments = {channel_id: [] for channel_id in channel_ids}
+        seen = []
+        for comment in self.db.get_comment_history(channel_ids=channel_ids, since=since,
+                                                   n_recent=n_recent, min_likes=min_likes):
+            if comment['top']:
+                commented_comments[comment['channel_id']].append(
+                    {key: comment[key] for key in ('channel_id', 'video_link', 'comment',
+                                                   'comment_time')})
+            if comment['recent']:
+                seen.append((self.seen_videos.video_id(comment['video_link']),
+                             comment['comment_time']))
+        self.seen_videos.load(seen)
+        logger.info(f"Loaded the comments of {len(channel_ids)} channels, "
+                    f"{len(self.seen_videos)} videos commented recently.")
+        return commented_comments
+
+    def load_upload_history(self) -> None:
+        """ Feeds the upload times of the videos commented so far to the polling and the
+        burst schedulers. """
+
+        if self.polling_scheduler is None and self.burst_scheduler is None:
+            return
+        upload_times = {}
+        for comment in self.db.get_comments(comment_cols=['channel_id', 'upload_time'],
+                                            n_recent=self.upload_history_size):
+            upload_time = comment['upload_time']
+            if upload_time in (None, 'None', '-1'):
+                continue
+            if isinstance(upload_time, str):  # Legacy schema
+                upload_time = parser.parse(upload_time)
+            if upload_time.tzinfo is not None:
+                upload_time = upload_time.astimezone(timezone.utc).replace(tzinfo=None)
+            upload_times.setdefault(comment['channel_id'], []).append(upload_time)
+        if self.polling_scheduler is not None:
+            self.polling_scheduler.fit(upload_times)
+            logger.info(f"Polling scheduler: {self.polling_scheduler}")
+        if self.burst_scheduler is not None:
+            self.burst_scheduler.fit(upload_times)
 
     def accumulator(self):
         # Initialize
@@ -207,26 +411,41 @@ class YoutubeManager(YoutubeApiV3):
             try:
                 time.sleep(sleep_time)
                 # Load recent comments
-                recent_commented_links = [comment["video_link"] for comment in
-                                          self.db.get_comments(comment_cols=['video_link'],
-                                                               n_recent=self.num_comments_to_check)]
-                # Get info for recent comments with YT api
+                links_by_id = {}
+                links_without_id = []
+                for comment in self.db.get_comments(comment_cols=['video_link', 'comment_id'],
+                                                    n_recent=self.num_comments_to_check):
+                    if comment['comment_id'] in (None, 'None', '-1'):
+                        links_without_id.append(comment['video_link'])
+                    else:
+                        links_by_id[comment['comment_id']] = comment['video_link']
+                # Get info for recent comments with YT api: the ones with a known ID are looked
+                # up 50 at a time, the others are searched for in the comments of their video
                 comments = []
                 exceptions = []
                 cnt = 0
-                for cnt, link in enumerate(recent_commented_links):
+                if links_by_id:
+                    cnt += 1
+                    try:
+                        for comment_dict in self.get_comments_by_id(list(links_by_id)):
+                            comment_dict['url'] = links_by_id[comment_dict['comment_id']]
+                            comments.append(comment_dict)
+                    except Exception as e:
+                        exceptions.append(e)
+                for link in links_without_id:
+                    cnt += 1
                     try:
                         comments.extend(self.get_video_comments(url=link,
                                                                 search_terms=self.comment_search_term))
                     except Exception as e:
                         exceptions.append(e)
                 # Update comment data in the DB
-                for comment_dict in comments:
-                    self.db.update_comment(video_link=comment_dict['url'],
-                                           comment_id=comment_dict['comment_id'],
-                                           like_cnt=comment_dict['like_count'],
-                                           reply_cnt=comment_dict['reply_count'],
-                                           comment_time=comment_dict['comment_time'])
+                self.db.update_comments([{'video_link': comment_dict['url'],
+                                          'comment_id': comment_dict['comment_id'],
+                                          'like_cnt': comment_dict['like_count'],
+                                          'reply_cnt': comment_dict['reply_count'],
+                                          'comment_time': comment_dict['comment_time']}
+                                         for comment_dict in comments])
                 logger.warn(f"{len(exceptions)}/{cnt} exceptions occurred!")
                 if len(exceptions) == cnt and cnt > 0:
                     logger.error(f"Raising the first exception.")
@@ -240,24 +459,30 @@ class YoutubeManager(YoutubeApiV3):
                 sleep_time = self.default_sleep_time
 
     def list_channels(self) -> None:
-        channels = [[row["priority"], row["username"].title(), row["channel_id"],
+        rows = list(self.db.get_channels(
+            channel_cols=['priority', 'username', 'channel_id', 'added_on', 'last_commented',
+                          'delay_comment', 'channel_photo']))
+        # The priority keys are gapped, show the position of each channel instead
+        positions = {row["channel_id"]: position for position, row in enumerate(rows, start=1)}
+        rows.sort(key=lambda row: (row["delay_comment"], row["priority"]))
+        channels = [[positions[row["channel_id"]], row["username"].title(), row["channel_id"],
                      arrow.get(row["added_on"]).humanize(),
                      arrow.get(row["last_commented"]).humanize(),
                      row["channel_photo"]
                      ]
-                    for row in self.db.get_channels(
-                channel_cols=['priority', 'username', 'channel_id', 'added_on', 'last_commented',
-                              'delay_comment', 'channel_photo'])]
+                    for row in rows]
         headers = ['Priority', 'Channel Name', 'Channel ID', 'Added On', 'Last Commented', 'Delay',
                    'Channel Photo']
         self.pretty_print(headers, channels)
 
     def list_comments(self, n_recent: int = 50, min_likes: int = -1,
                       min_replies: int = -1, max_likes: int = 99999, max_replies: int = 99999,
-                      max_latency: int = 99999) -> None:
+                      max_latency: int = 99999, page_size: int = 1000) -> None:
         comment_cols = ['comment_time', 'upload_time', 'comment_time', 'like_count',
                         'reply_count', 'comment_link', 'comment']
         channel_cols = ['username']
+        headers = ['Channel', 'Comment', 'Comment At', 'Latency', 'Likes', 'Replies',
+                   'Comment URL']
         comments = []
         for row in self.db.get_comments(comment_cols=comment_cols, channel_cols=channel_cols,
                                         n_recent=n_recent, max_likes=max_likes,
@@ -265,7 +490,7 @@ class YoutubeManager(YoutubeApiV3):
                                         min_likes=min_likes, min_replies=min_replies):
             username = row["username"].title()
             comment_time = arrow.get(row["comment_time"]).humanize()
-            if row["upload_time"] != "-1" and row["upload_time"] != "None":
+            if row["upload_time"] not in (None, "-1", "None"):
                 upload_seconds_passed = int(
                     arrow.get(row["upload_time"]).humanize(granularity='second').split(" ")[0])
                 comment_seconds_passed = int(
@@ -277,10 +502,11 @@ class YoutubeManager(YoutubeApiV3):
                 continue
             comments.append([username, row["comment"], comment_time,
                              late, row["like_count"], row["reply_count"], row["comment_link"]])
-
-            headers = ['Channel', 'Comment', 'Comment At', 'Latency', 'Likes', 'Replies',
-                       'Comment URL']
-            self.pretty_print(headers, comments)
+            # Print a page at a time so that the memory does not grow with n_recent
+            if len(comments) == page_size:
+                self.pretty_print(headers, comments)
+                comments = []
+        self.pretty_print(headers, comments)
 
     def add_channel(self, channel_id: str = None,
                     username: str = None,
@@ -342,6 +568,17 @@ class YoutubeManager(YoutubeApiV3):
         else:
             raise YoutubeManagerError("Channel not found!")
 
+    def migrate_schema(self, chunk_size: int = 1000) -> None:
+        self.db.migrate_schema(chunk_size=chunk_size)
+
+    def archive_comments(self, archive_path: str, older_than_days: int = 180,
+                         chunk_size: int = 1000) -> None:
+        before = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+        archived = self.db.archive_comments(archive=CommentArchive(archive_path), before=before,
+                                            chunk_size=chunk_size)
+        logger.info(f"Archived {archived} comments older than {older_than_days} days "
+                    f"to `{archive_path}`.")
+
     def fill_upload_times(self, n_recent, min_likes, min_replies):
         video_ids = [row['video_link'].split("?v=")[-1]
                      for row in self.db.get_comments(comment_cols=['video_link'],
@@ -389,102 +626,74 @@ class YoutubeManager(YoutubeApiV3):
             if channel_id not in current_channel_ids:
                 self.add_channel(channel_id=channel_id, active=False)
 
-    def get_comments(self, n_recent, channel_ids, min_likes: int = -1):
-        comment_cols = ['channel_id', 'video_link', 'comment', 'comment_time']
-        commented_comments = {}
-        video_links_commented = []
-        for channel_id in channel_ids:
-            commented_comments[channel_id] = list(self.db.get_comments(comment_cols=comment_cols,
-                                                                       channel_id=channel_id,
-                                                                       n_recent=n_recent,
-                                                                       min_likes=min_likes))
-            video_links_commented += [comment['video_link'] for comment in
-                                      commented_comments[channel_id]]
-        return commented_comments, video_links_commented
-
     def load_template_comments(self):
         if self.comments_conf is None:
             raise YoutubeManagerError("Tried to load template comments "
                                       "but `comments` is not set in the config!")
-        # Download files from dropbox
-        if self.comments_src == 'dropbox':
-            # TODO: implement this in the dropbox lib
-            if not os.path.exists(self.comments_conf["local_folder_name"]):
-                os.makedirs(self.comments_conf["local_folder_name"])
-            for file in self.dbox.ls(self.comments_conf['dropbox_folder_name']).keys():
-                if file[-4:] == '.txt':
-                    self.dbox.download_file(f'{self.comments_conf["dropbox_folder_name"]}/{file}',
-                                            f'{self.comments_conf["local_folder_name"]}/{file}')
-        # Load comments from files
+        # Download files from dropbox: synced once here and then in the background
+        if self.comments_src == 'dropbox' and self.template_sync is None:
+            self.template_sync = CloudFolderSync(cloud=self.dbox,
+                                                 remote_path=self.comments_conf['dropbox_folder_name'],
+                                                 local_path=self.comments_conf['local_folder_name'],
+                                                 suffix='.txt', max_workers=self.sync_workers)
+            self.template_sync.sync()
+            self.template_sync.start(interval=self.sync_interval)
+        # Load comments from files, parsing only the files changed since the last load
         if self.comments_src in ('local', 'dropbox'):
             base_path = os.path.dirname(os.path.abspath(__file__))
             comments_path = os.path.join(base_path, '../..', self.comments_conf['local_folder_name'],
                                          "*.txt")
-            for file in glob(comments_path):
+            files = glob(comments_path)
+            for file in files:
                 file_name = file.split('/')[-1][:-4]
+                stat = os.stat(file)
+                if self.template_files.get(file) == (stat.st_mtime_ns, stat.st_size):
+                    continue
                 with open(file) as f:
                     self.template_comments[file_name] = [_f.rstrip() for _f in f.readlines()]
+                self.template_files[file] = (stat.st_mtime_ns, stat.st_size)
+                logger.info(f"Loaded the template comments of `{file_name}`.")
+            for file in set(self.template_files) - set(files):  # Deleted
+                del self.template_files[file]
+                self.template_comments.pop(file.split('/')[-1][:-4], None)
 
-    def get_next_template_comment(self, channel_id: str,
-                                  commented_comments: Dict,
-                                  self_comments_flags: Dict) -> str:
-        """ TODO: Probably much more efficient with numpy or sql. """
-        commented_comments = commented_comments[channel_id]
-        self_comments_flags = self_comments_flags[channel_id]
-        available_comments = self.template_comments['default'].copy()
-        # Build the comments pool
-        if channel_id in self.template_comments:
-            if self_comments_flags == 1:
-                available_comments = self.template_comments[channel_id]
-            else:
-                available_comments = self.template_comments[channel_id] + available_comments
-        # Extract unique comments commented
-        unique_com_coms = set(data['comment'] for data in commented_comments)
-        new_comments = list(set(available_comments) - unique_com_coms)
-        random.shuffle(new_comments)
-        if new_comments:  # If we have new template comments
-            comment = next(iter(new_comments))
-        else:  # Otherwise, pick the oldest one (with duplicate handling)
-            comment_dates = {}
-            for unique_comment in unique_com_coms:
-                comment_dates[unique_comment] = parser.parse('1994-04-30T08:00:00.000000')
-                for com_data in commented_comments:
-                    if com_data['comment'] == unique_comment:
-                        comment_time = parser.parse(com_data['comment_time'])
-                        if comment_time > comment_dates[unique_comment]:
-                            comment_dates[unique_comment] = parser.parse(com_data['comment_time'])
-            comment = [k for k, v in sorted(comment_dates.items(),
-                                            key=lambda p: p[1], reverse=False)][0]
-
-        return comment
+    def get_next_template_comment(self, channel_id: str) -> str:
+        """ Picks the template comment to post on the channel: one never posted on it yet if
+        there is one, otherwise the one posted the longest time ago. """
+
+        return self.template_rotation.next(channel_id)
 
     def upload_logs(self):
-        log_name = self.log_path.split(os.sep)[-1][:-4]
-        day = datetime.today().day
-        hour = datetime.today().hour
-        log_name += f'_day{day}_hour{hour}.txt'
-        upload_path = os.path.join(self.dbox_logs_folder_path, log_name)
-        with open(self.log_path, 'rb') as f:
-            file_to_upload = f.read()
-        self.dbox.upload_file(file_bytes=file_to_upload, upload_path=upload_path)
+        """ Asks the log shipper to upload the new log lines, without waiting for it. """
+
+        if self.log_shipper is not None:
+            self.log_shipper.request()
+
+    def stop_log_shipper(self):
+        """ Uploads the last log lines and stops the log shipper, if it is running. """
+
+        if self.log_shipper is None:
+            return
+        try:
+            self.log_shipper.stop()
+        except Exception as e:
+            logger.error(f"Failed to upload the last log lines: {e}")
 
     def load_keys_from_cloud(self):
         if self.dbox is None:
             raise YoutubeManagerError("`load_keys_from_cloud` was set to True "
                                       "but no `cloudstore` config was given!")
 
-        if not os.path.exists(self.keys_path):
-            os.makedirs(self.keys_path)
-        for file in self.dbox.ls(self.dbox_keys_folder_path).keys():
-            if file[-5:] == '.json':
-                self.dbox.download_file(f'{self.dbox_keys_folder_path}/{file}',
-                                        f'{self.keys_path}/{file}')
+        CloudFolderSync(cloud=self.dbox, remote_path=self.dbox_keys_folder_path,
+                        local_path=self.keys_path, suffix='.json',
+                        max_workers=self.sync_workers).sync()
 
     def raise_fatal(self, e, txt):
         # Create file that prevents restarting
         self.touch(self.crashed_file)
         error_txt = f"{txt}:\n{e}"
         logger.error(error_txt)
+        self.stop_log_shipper()
         raise e
 
     def simulate_uploads(self, channels: List, max_posted_hours: int = 2) -> Dict:
@@ -542,7 +751,7 @@ class YoutubeManager(YoutubeApiV3):
                 if len(str(column)) > 54 and idx != 6:
                     row[idx] = row[idx][:50] + "(..)"
                 if len(str(row[idx])) > col_widths[idx]:
-                    col_widths[idx] = len(row[idx])
+                    col_widths[idx] = len(str(row[idx]))
 
         for row in output:
             for idx, column in enumerate(row):
@@ -1,13 +1,48 @@
-from youbot import ColorLogger, HighMySQL
+from youbot import ColorLogger, PooledHighMySQL, YoutubeDatastore
 from typing import *
 from datetime import datetime
+import time
 
 logger = ColorLogger(logger_name='YoutubeMySqlDatastore', color='red')
 
 
-class YoutubeMySqlDatastore(HighMySQL):
-    CHANNEL_TABLE = 'channels'
-    COMMENTS_TABLE = 'comments'
+class YoutubeMySqlDatastore(PooledHighMySQL, YoutubeDatastore):
+    CHANNELS_SCHEMA = \
+        """
+        channel_id     varchar(100)              not null,
+        username       varchar(100)              not null,
+        added_on       datetime(6)               not null,
+        last_commented datetime(6)               not null,
+        priority       int auto_increment,
+        channel_photo  varchar(255)              null,
+        active             tinyint(1)   default 1    not null,
+        self_comments_only tinyint(1)   default 0    not null,
+        delay_comment      int          default 10    not null,
+        constraint id_pk PRIMARY KEY (channel_id),
+        constraint priority unique (priority),
+        constraint username unique (username)"""
+    COMMENTS_SCHEMA = \
+        """
+        channel_id   varchar(100)              not null,
+        video_link   varchar(100)              not null,
+        comment      varchar(255)              not null,
+        comment_time datetime(6)               not null,
+        upload_time  datetime(6)               null,
+        like_count   int                       null,
+        reply_count  int                       null,
+        comment_id   varchar(100)              null,
+        video_id     varchar(100)              null,
+        comment_link varchar(255)              null,
+        video_title  varchar(255)              null,
+        constraint video_link_pk PRIMARY KEY (video_link),
+        index channel_id_comment_time (channel_id, comment_time),
+        index comment_time (comment_time)"""
+    # The table methods of the datastore, which bind their values, not the ones of HighMySQL
+    insert_into_table = YoutubeDatastore.insert_into_table
+    update_table = YoutubeDatastore.update_table
+    select_from_table = YoutubeDatastore.select_from_table
+    # The times of the legacy schema, e.g. `2021-06-01T16:59:00Z` or `2021-06-01 16:59:00.123456`
+    LEGACY_TIME_REGEXP = '^[0-9]{4}-[0-9]{2}-[0-9]{2}[ T][0-9]{2}:[0-9]{2}:[0-9]{2}([.][0-9]{1,6})?Z?$'
 
     def __init__(self, config: Dict, tag: str) -> None:
         """
@@ -17,413 +52,155 @@ class YoutubeMySqlDatastore(HighMySQL):
         """
         global logger
         logger = ColorLogger(logger_name=f'[{tag}] YoutubeMySqlDatastore', color='red')
-        super().__init__(config)
+        YoutubeDatastore.__init__(self, tag=tag)
+        PooledHighMySQL.__init__(self, config)
         self.create_tables_if_not_exist()
+        self.schema_version = self.get_schema_version()
+        if self.schema_version < self.SCHEMA_VERSION:
+            logger.warn(f"The tables use the legacy schema (v{self.schema_version}), "
+                        f"run `-m migrate_schema` to convert them to v{self.SCHEMA_VERSION}.")
 
     def create_tables_if_not_exist(self):
-        channels_schema = \
-            """
-            channel_id     varchar(100) default ''   not null,
-            username       varchar(100)              not null,
-            added_on       varchar(100)              not null,
-            last_commented varchar(100)              not null,
-            priority       int auto_increment,
-            channel_photo  varchar(100) default '-1' null,
-            active             tinyint(1)   default 1    not null,
-            self_comments_only tinyint(1)   default 0    not null,
-            delay_comment      int          default 10    not null,
-            constraint id_pk PRIMARY KEY (channel_id),
-            constraint channel_id unique (channel_id),
-            constraint priority unique (priority),
-            constraint username unique (username)"""
-        comments_schema = \
-            """
-            channel_id   varchar(100)              not null,
-            video_link   varchar(100)              not null,
-            comment      varchar(255)              not null,
-            comment_time varchar(100)              not null,
-            upload_time varchar(100)              not null,
-            like_count   int          default -1   null,
-            reply_count  int          default -1   null,
-            comment_id   varchar(100) default '-1' null,
-            video_id     varchar(100) default '-1' null,
-            comment_link varchar(100) default '-1' null,
-            video_title varchar(255) default '-1' null,
-            constraint video_link_pk PRIMARY KEY (video_link),
-            constraint video_link     unique (video_link)"""
-
-        self.create_table(table=self.CHANNEL_TABLE, schema=channels_schema)
-        self.create_table(table=self.COMMENTS_TABLE, schema=comments_schema)
-
-    def get_channels(self, channel_cols: List, comment_cols: List = None,
-                     where: str = 'active IS TRUE',
-                     join_type: str = 'INNER',
-                     complex_sort_key: int = None) -> List[Dict]:
-        """ Retrieve all channels from the database. """
-        if comment_cols is not None:
-            result = self.select_join(left_table=self.CHANNEL_TABLE,
-                                      right_table=self.COMMENTS_TABLE,
-                                      left_columns=','.join(channel_cols),
-                                      right_columns=','.join(comment_cols),
-                                      join_key_left='channel_id',
-                                      join_key_right='channel_id',
-                                      order_by='l.delay_comment, l.priority',
-                                      asc_or_desc='asc',
-                                      join_type=join_type,
-                                      where=where)
-            col_names = channel_cols + comment_cols
-        elif complex_sort_key is None:
-            result = self.select_from_table(table=self.CHANNEL_TABLE,
-                                            columns=','.join(channel_cols),
-                                            order_by='delay_comment, priority',
-                                            asc_or_desc='asc',
-                                            where=where)
-            col_names = channel_cols
-            for row in result:
-                yield self._row_to_dict(row, col_names)
-        else:
-            max_key = -1
-            while True:
-                table = f'(SELECT * ' \
-                        f'FROM {self.CHANNEL_TABLE} ' \
-                        f'WHERE priority>{max_key} ' \
-                        f'ORDER BY priority ' \
-                        f'LIMIT 50) a'
-                result = list(self.select_from_table(table=table,
-                                                     columns=','.join(channel_cols),
-                                                     order_by='delay_comment, priority',
-                                                     asc_or_desc='asc',
-                                                     where=where))
-                if len(result) == 0:
-                    break
-                max_key = sorted(result, key=lambda x: x[complex_sort_key])[-1][complex_sort_key]
-                col_names = channel_cols
-                for row in result:
-                    yield self._row_to_dict(row, col_names)
-
-    def add_channel(self, channel_data: Dict, active: bool = True) -> None:
-        """ Insert the provided channel into the database"""
-
-        try:
-            # TODO: Implement if_not_exists=True in HighMySQL
-            if not active:
-                channel_data['active'] = 'FALSE'
-            self.insert_into_table(table=self.CHANNEL_TABLE, data=channel_data)
-        except Exception as e:
-            # TODO: except HighMySQL.mysql.connector.errors.IntegrityError as e:
-            # Expose mysql in HighMySQL
-            logger.error(f"MySQL error: {e}")
-
-    def set_priority(self, channel_data: Dict, priority: str) -> None:
-        """ Insert the provided channel into the database"""
-        priority = int(priority)
-        req_priority = priority
-        req_channel_id = channel_data['channel_id']
-        channels = list(self.get_channels(channel_cols=['channel_id', 'priority'], where='TRUE'))
-        try:
-            # Give all channels a temp priority
-            for channel in channels:
-                channel_id = channel['channel_id']
-                # Execute the update command
-                self.update_table(table=self.CHANNEL_TABLE,
-                                  set_data={'priority': -int(channel['priority'])},
-                                  where=f"channel_id='{channel_id}'")
-            # Update the other channels
-            ch_cnt = 1
-            for channel in channels:
-                channel_id = channel['channel_id']
-                if channel_id == req_channel_id:
-                    continue
-                if channel['priority'] < req_priority:
-                    set_data = {'priority': ch_cnt}
-                    ch_cnt += 1
-                else:
-                    set_data = {'priority': priority + 1}
-                    priority += 1
-                # Execute the update command
-                self.update_table(table=self.CHANNEL_TABLE,
-                                  set_data=set_data,
-                                  where=f"channel_id='{channel_id}'")
-            # Update the requested channel
-            self.update_table(table=self.CHANNEL_TABLE,
-                              set_data={'priority': req_priority},
-                              where=f"channel_id='{req_channel_id}'")
-        except Exception as e:
-            # TODO: except HighMySQL.mysql.connector.errors.IntegrityError as e:
-            # Expose mysql in HighMySQL
-            logger.error(f"MySQL error: {e}")
-
-    def get_channel_by_id(self, ch_id: str) -> Tuple:
-        """Retrieve a channel from the database by its ID
-        Args:
-            ch_id (str): The channel ID
-        """
-
-        where_statement = f"channel_id='{ch_id}'"
-        result = self.select_from_table(table=self.CHANNEL_TABLE, where=where_statement)
-        if len(result) > 1:
-            logger.warning("Duplicate channel retrieved from SELECT statement:{result}")
-        elif len(result) == 0:
-            result.append(())
-
-        return result[0]
-
-    def get_channel_by_username(self, ch_username: str) -> Tuple:
-        """Retrieve a channel from the database by its Username
-        Args:
-            ch_username (str): The channel ID
-        """
-
-        where_statement = f"username='{ch_username}'"
-        result = self.select_from_table(table=self.CHANNEL_TABLE, where=where_statement)
-        if len(result) > 1:
-            logger.warning("Duplicate channel retrieved from SELECT statement:{result}")
-        elif len(result) == 0:
-            result.append(())
-
-        return result[0]
-
-    def remove_channel_by_id(self, ch_id: str) -> None:
-        """Retrieve a channel from the database by its ID
-        Args:
-            ch_id (str): The channel ID
-        """
-
-        where_statement = f"channel_id='{ch_id}'"
-        self.update_table(table=self.CHANNEL_TABLE,
-                          set_data={'active': 'false'},
-                          where=where_statement)
-
-    def remove_channel_by_username(self, ch_username: str) -> None:
-        """Delete a channel from the database by its Username
-        Args:
-            ch_username (str): The channel ID
-        """
-
-        where_statement = f"username='{ch_username}'"
-        self.update_table(table=self.CHANNEL_TABLE,
-                          set_data={'active': 'false'},
-                          where=where_statement)
-
-    def update_channel_photo(self, channel_id: str, photo_url: str) -> None:
-        """
-        Update the profile picture link of a channel.
-        Args:
-            channel_id:
-            photo_url:
-        """
-
-        set_data = {'channel_photo': photo_url}
-        self.update_table(table=self.CHANNEL_TABLE,
-                          set_data=set_data,
-                          where=f"channel_id='{channel_id}'")
-
-    def add_comment(self, ch_id: str, video_link: str, comment_text: str,
-                    upload_time: str, video_title: str) -> None:
-        """ TODO: check the case where a comment contains single quotes
-        Add comment data and update the `last_commented` channel column.
+        self.create_table(table=self.CHANNEL_TABLE, schema=self.CHANNELS_SCHEMA)
+        self.create_table(table=self.COMMENTS_TABLE, schema=self.COMMENTS_SCHEMA)
+
+    def get_schema_version(self, table: str = None) -> int:
+        """ Detects the schema version of the comments table from the type of `comment_time`. """
+
+        result = self.execute("SELECT DATA_TYPE FROM information_schema.COLUMNS "
+                              "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s "
+                              "AND COLUMN_NAME='comment_time'", (table or self.COMMENTS_TABLE,))
+        data_type = result[0][0] if result else ''
+        if isinstance(data_type, (bytes, bytearray)):
+            data_type = data_type.decode()
+        return 2 if data_type.lower() == 'datetime' else 1
+
+    def migrate_schema(self, chunk_size: int = 1000, pause: float = 0.05) -> None:
+        """
+        Converts the legacy (v1) tables to the current schema without locking them for long,
+        so the commenter and the accumulator can keep running.
+
+        The rows are copied into new `<table>_v2` tables in primary key order, one short
+        INSERT ... SELECT per chunk (an interrupted migration resumes where it stopped). The rows
+        with an invalid required time are reported and left out (they stay in `<table>_v1`).
+        The channels are then copied again to pick up the rows changed in the meantime, the
+        tables are swapped with one atomic RENAME (the legacy ones are kept as `<table>_v1`)
+        and the rows added to them during the copy are carried over. The comment metrics
+        changed during the copy are refreshed by the next accumulator run. The running bots
+        detect the new schema before they write (see `_check_schema_version`).
         Args:
-            ch_id:
-            video_link:
-            comment_text:
-            upload_time:
-            video_title:
-        """
-
-        datetime_now = datetime.utcnow().isoformat()
-        # TODO: Fix string sanitizing in highsql
-        comments_data = {'channel_id': ch_id,
-                         'video_link': video_link,
-                         'comment': comment_text.replace("'", "''"),
-                         'comment_time': datetime_now,
-                         'upload_time': upload_time,
-                         'video_title': video_title.replace("'", "''")}
-        update_data = {'last_commented': datetime_now}
-        where_statement = f"channel_id='{ch_id}'"
-
-        try:
-            self.insert_into_table(self.COMMENTS_TABLE, data=comments_data)
-            # Update Channel's last_commented timestamp
-            # TODO: Do that with foreign keys
-            self.update_table(table=self.CHANNEL_TABLE, set_data=update_data, where=where_statement)
-        except Exception as e:
-            # TODO: except HighMySQL.mysql.connector.errors.IntegrityError as e:
-            # Expose mysql in HighMySQL
-            logger.error(f"MySQL Error: {e}")
-
-    def get_comments(self, comment_cols: List[str], channel_cols: List[str] = None,
-                     n_recent: int = 50,
-                     min_likes: int = -1,
-                     max_likes: int = 999999,
-                     min_replies: int = -1,
-                     max_replies: int = 999999,
-                     channel_id: str = None,
-                     only_null_upload: bool = False,
-                     only_null_comment_id: bool = False,
-                     only_null_video_title: bool = False,
-                     order_by: str = 'comment_time',
-                     join_type: str = 'INNER') -> List[Dict]:
-        """
-        Get the latest n_recent comments from the comments table.
-        Args:
-            comment_cols:
-            channel_cols:
-            n_recent:
-            min_likes:
-            max_likes:
-            min_replies:
-            max_replies:
-            channel_id:
-            only_null_upload:
-            only_null_comment_id:
-            only_null_video_title:
-            order_by:
-            join_type:
-        """
-
-        where = f"like_count>={min_likes} AND reply_count>={min_replies} AND " \
-                f"like_count<={max_likes} AND reply_count<={max_replies} "
-        if channel_id is not None:
-            where += f"AND channel_id='{channel_id}' "
-        if only_null_upload is True:
-            where += "AND (upload_time='None' OR upload_time='-1') "
-        if only_null_comment_id is True:
-            where += "AND (comment_id='None' OR comment_id='-1') "
-        if only_null_video_title is True:
-            where += "AND (video_title='None' OR video_title='-1') "
-
-        if channel_cols is not None:
-            result = self.select_join(left_table=self.COMMENTS_TABLE,
-                                      right_table=self.CHANNEL_TABLE,
-                                      left_columns=','.join(comment_cols),
-                                      right_columns=','.join(channel_cols),
-                                      join_key_left='channel_id',
-                                      join_key_right='channel_id',
-                                      where=where,
-                                      order_by=order_by,
-                                      asc_or_desc='desc',
-                                      limit=n_recent,
-                                      join_type=join_type)
-            col_names = comment_cols + channel_cols
-        else:
-            result = self.select_from_table(table=self.COMMENTS_TABLE,
-                                            columns=','.join(comment_cols),
-                                            where=where,
-                                            order_by=order_by,
-                                            asc_or_desc='desc',
-                                            limit=n_recent)
-            col_names = comment_cols
-        for row in result:
-            yield self._row_to_dict(row, col_names)
-
-    def update_comment(self, video_link: str, comment_id: str = None,
-                       like_cnt: int = None, reply_cnt: int = None,
-                       upload_time: str = None, video_title: str = None,
-                       comment_time: str = None) -> None:
-        """
-        Populate a comment entry with additional information.
-        Args:
-            video_link:
-            comment_id:
-            like_cnt:
-            reply_cnt:
-            upload_time:
-            video_title:
-            comment_time:
-        """
-
-        # Get video id
-        video_id = video_link.split('v=')[1].split('&')[0]
-        # Construct the update key-values
-        set_data = {}
-        if video_id is not None:
-            set_data['video_id'] = video_id
-        if comment_id is not None:
-            set_data['comment_id'] = comment_id
-            # Create Comment Link
-            comment_link = f'https://youtube.com/watch?v={video_id}&lc={comment_id}'
-            set_data['comment_link'] = comment_link
-        if like_cnt is not None:
-            set_data['like_count'] = like_cnt
-        if reply_cnt is not None:
-            set_data['reply_count'] = reply_cnt
-        if comment_time is not None:
-            set_data['comment_time'] = comment_time
-        if upload_time is not None:
-            set_data['upload_time'] = upload_time
-        if video_title is not None:
-            set_data['video_title'] = video_title.replace("'", "''")
-        # Execute the update command
-        self.update_table(table=self.COMMENTS_TABLE,
-                          set_data=set_data,
-                          where=f"video_link='{video_link}'")
-
-    # TODO: Add this to HighMySQL
-    def select_join(self, left_table: str, right_table: str,
-                    join_key_left: str, join_key_right: str,
-                    left_columns: str = '', right_columns: str = '', custom_columns: str = '',
-                    join_type: str = 'INNER',
-                    where: str = 'TRUE', order_by: str = 'NULL', asc_or_desc: str = 'ASC',
-                    limit: int = 1000, group_by: str = '', having: str = '') -> List[Tuple]:
-        """
-        Join two tables and select.
-
-        Args:
-            left_table:
-            right_table:
-            left_columns:
-            right_columns:
-            custom_columns: Custom columns for which no `l.` or `r.` will be added automatically
-            join_key_left: The column of join of the left table
-            join_key_right: The column of join of the right table
-            join_type: OneOf(INNER, LEFT, RIGHT)
-            where: Add a `l.` or `.r` before the specified columns
-            order_by: Add a `l.` or `.r` before the specified columns
-            asc_or_desc:
-            limit:
-            group_by: Add a `l.` or `.r` before the specified columns
-            having: Add a `l.` or `.r` before the specified columns
-        """
-
-        # Construct Group By
-        if group_by:
-            if having:
-                having = f'HAVING {having}'
-            group_by = f'GROUP BY {group_by} {having} '
-
-        # Construct Columns
-        if left_columns:
-            left_columns = 'l.' + ', l.'.join(map(str.strip, left_columns.split(',')))
-            if right_columns or custom_columns:
-                left_columns += ', '
-        if right_columns:
-            right_columns = 'r.' + ', r.'.join(map(str.strip, right_columns.split(',')))
-            if custom_columns:
-                right_columns += ', '
-        columns = f'{left_columns} {right_columns} {custom_columns}'
-
-        # Build the Query
-        query = f"SELECT {columns} " \
-                f"FROM {left_table} l " \
-                f"{join_type} JOIN {right_table} r " \
-                f"ON l.{join_key_left}=r.{join_key_right} " \
-                f"WHERE {where} " \
-                f"{group_by}" \
-                f"ORDER BY {order_by} {asc_or_desc} " \
-                f"LIMIT {limit}"
-
+            chunk_size: Rows copied per statement
+            pause: Seconds to sleep between the chunks
+        """
+
+        if self.schema_version >= self.SCHEMA_VERSION:
+            logger.info(f"The tables already use the schema v{self.SCHEMA_VERSION}.")
+            return
+        started_at = datetime.utcnow().isoformat()
+        tables = ((self.CHANNEL_TABLE, 'channel_id', self.CHANNELS_SCHEMA),
+                  (self.COMMENTS_TABLE, 'video_link', self.COMMENTS_SCHEMA))
+        for table, key, schema in tables:
+            self.create_table(table=f'{table}_v2', schema=schema)
+            copied = self._copy_in_chunks(table, f'{table}_v2', key, chunk_size, pause)
+            logger.info(f"Copied {copied} rows of `{table}` to `{table}_v2`.")
+        # The channels are few but their priority, active and last_commented columns change
+        self._copy_in_chunks(self.CHANNEL_TABLE, f'{self.CHANNEL_TABLE}_v2', 'channel_id',
+                             chunk_size, pause, replace=True)
+        renames = ', '.join(f'{table} TO {table}_v1, {table}_v2 TO {table}' for table, _, _ in tables)
+        query = f"RENAME TABLE {renames}"
         logger.debug("Executing: %s" % query)
         self._cursor.execute(query)
-        results = self._cursor.fetchall()
-
-        return results
-
-    @staticmethod
-    def _row_to_dict(row: Tuple, col_names: List) -> Dict:
-        """Transform a table row into a dictionary
-        Args:
-            row (tuple): The database row
-            col_names (list): The names of the columns retrieved
-        """
-
-        return dict(zip(col_names, row))
+        # Carry over the rows added to the legacy tables after they were copied
+        for table, key, _ in tables:
+            if table == self.COMMENTS_TABLE:
+                self._execute_copy(f'{table}_v1', table, where="comment_time>=%s",
+                                   params=(started_at,))
+            else:
+                self._execute_copy(f'{table}_v1', table, where='TRUE')
+        self.schema_version = self.SCHEMA_VERSION
+        logger.info(f"Migrated to the schema v{self.SCHEMA_VERSION}, the legacy tables are "
+                    f"kept as `{self.CHANNEL_TABLE}_v1` and `{self.COMMENTS_TABLE}_v1`.")
+
+    def _copy_in_chunks(self, source: str, target: str, key: str, chunk_size: int,
+                        pause: float, replace: bool = False) -> int:
+        """ Copies (and converts) the rows of a legacy table in key ranges of `chunk_size` rows. """
+
+        copied = 0
+        last_key = None
+        if not replace:  # Resume after the last key copied
+            last_key = self.execute(f"SELECT MAX({key}) FROM {target}")[0][0]
+        while True:
+            # The keys are never NULL, so `key > ''` matches every row
+            after = '' if last_key is None else last_key
+            chunk_last_key, chunk_rows = self.execute(
+                f"SELECT MAX({key}), COUNT(*) FROM "
+                f"(SELECT {key} FROM {source} WHERE {key}>%s ORDER BY {key} LIMIT %s) chunk",
+                (after, chunk_size))[0]
+            if not chunk_rows:
+                return copied
+            skipped = self._execute_copy(source, target, where=f"{key}>%s AND {key}<=%s",
+                                         params=(after, chunk_last_key), replace=replace)
+            copied += chunk_rows - skipped
+            last_key = chunk_last_key
+            time.sleep(pause)
+
+    def _execute_copy(self, source: str, target: str, where: str, params: Tuple = (),
+                      replace: bool = False) -> int:
+        """ Copies the matching rows of a legacy table, converting the varchar times to DATETIME
+        and the '-1'/'None' sentinels to NULL.
+
+        Returns:
+            The number of rows left out because of an invalid required time
+        """
+
+        def valid_time(col):
+            return f"{col} REGEXP '{self.LEGACY_TIME_REGEXP}'"
+
+        def time_col(col):
+            return f"CASE WHEN {valid_time(col)} " \
+                   f"THEN CAST(REPLACE(REPLACE({col}, 'T', ' '), 'Z', '') AS DATETIME(6)) END"
+
+        def str_col(col):
+            return f"NULLIF(NULLIF({col}, '-1'), 'None')"
+
+        if target.startswith(self.CHANNEL_TABLE):
+            key, required_times = 'channel_id', ('added_on', 'last_commented')
+            columns = {'channel_id': 'channel_id', 'username': 'username',
+                       'added_on': time_col('added_on'), 'last_commented': time_col('last_commented'),
+                       'priority': 'priority', 'channel_photo': str_col('channel_photo'),
+                       'active': 'active', 'self_comments_only': 'self_comments_only',
+                       'delay_comment': 'delay_comment'}
+        else:
+            key, required_times = 'video_link', ('comment_time',)
+            video_id = "SUBSTRING_INDEX(SUBSTRING_INDEX(video_link, 'v=', -1), '&', 1)"
+            columns = {'channel_id': 'channel_id', 'video_link': 'video_link', 'comment': 'comment',
+                       'comment_time': time_col('comment_time'),
+                       'upload_time': time_col('upload_time'),
+                       'like_count': 'NULLIF(like_count, -1)',
+                       'reply_count': 'NULLIF(reply_count, -1)',
+                       'comment_id': str_col('comment_id'),
+                       'video_id': f"COALESCE({str_col('video_id')}, {video_id})",
+                       'comment_link': str_col('comment_link'),
+                       'video_title': str_col('video_title')}
+        # The rows with a required time that can't be converted are reported instead of stored
+        invalid = ' OR '.join(f"NOT ({valid_time(col)})" for col in required_times)
+        invalid_rows = self.execute(f"SELECT {key}, {', '.join(required_times)} FROM {source} "
+                                    f"WHERE ({where}) AND ({invalid})", params)
+        if invalid_rows:
+            logger.error(f"Left {len(invalid_rows)} rows of `{source}` with invalid times out of "
+                         f"`{target}`: {invalid_rows}")
+        if replace:
+            statement, on_duplicate = 'REPLACE', ''
+        else:  # Skip the rows already copied
+            statement, on_duplicate = 'INSERT', f" ON DUPLICATE KEY UPDATE {key}={target}.{key}"
+        query = f"{statement} INTO {target} ({', '.join(columns)}) " \
+                f"SELECT {', '.join(columns.values())} FROM {source} " \
+                f"WHERE ({where}) AND NOT ({invalid}){on_duplicate}"
+        self.execute(query, params)
+        return len(invalid_rows)
+
+    def _update_from_query(self, derived_table: str, cols: List[str]) -> str:
+        set_data = ', '.join(f'c.{col}=COALESCE(u.{col}, c.{col})' for col in cols)
+        return f"UPDATE {self.COMMENTS_TABLE} c " \
+               f"JOIN ({derived_table}) u ON c.video_link=u.video_link " \
+               f"SET {set_data}"
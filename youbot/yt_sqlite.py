@@ -0,0 +1,167 @@
+from youbot import ColorLogger, YoutubeDatastore
+from typing import *
+from datetime import datetime
+from contextlib import contextmanager
+import sqlite3
+import threading
+
+logger = ColorLogger(logger_name='YoutubeSqliteDatastore', color='red')
+
+
+class YoutubeSqliteDatastore(YoutubeDatastore):
+    """ A datastore in a local SQLite file, for running the bot without a MySQL server.
+
+    The database is opened in WAL mode, so the readers (e.g. the accumulator) never block the
+    writer (the commenter) and vice versa. Every thread opens its own connection on its first
+    statement. The times are stored as `YYYY-MM-DD HH:MM:SS.ffffff` utc strings, which sort
+    like the DATETIME(6) columns of the MySQL schema.
+    """
+
+    CHANNELS_SCHEMA = \
+        """
+        channel_id     TEXT                  not null,
+        username       TEXT                  not null,
+        added_on       TEXT                  not null,
+        last_commented TEXT                  not null,
+        priority       INTEGER               not null,
+        channel_photo  TEXT                  null,
+        active             INTEGER default 1     not null,
+        self_comments_only INTEGER default 0     not null,
+        delay_comment      INTEGER default 10    not null,
+        constraint id_pk PRIMARY KEY (channel_id),
+        constraint priority unique (priority),
+        constraint username unique (username)"""
+    COMMENTS_SCHEMA = \
+        """
+        channel_id   TEXT                  not null,
+        video_link   TEXT                  not null,
+        comment      TEXT                  not null,
+        comment_time TEXT                  not null,
+        upload_time  TEXT                  null,
+        like_count   INTEGER               null,
+        reply_count  INTEGER               null,
+        comment_id   TEXT                  null,
+        video_id     TEXT                  null,
+        comment_link TEXT                  null,
+        video_title  TEXT                  null,
+        constraint video_link_pk PRIMARY KEY (video_link)"""
+    COMMENTS_INDEXES = {'channel_id_comment_time': 'channel_id, comment_time',
+                        'comment_time': 'comment_time'}
+
+    def __init__(self, config: Dict, tag: str) -> None:
+        """
+        The basic constructor. Creates a new instance of Datastore using the specified database file
+        Args:
+            config: The datastore config with the `db_path` of the database file. Optionally
+                    `busy_timeout` in seconds (default 30), `synchronous` (default NORMAL) and
+                    `statement_cache_size` (compiled statements per connection, default 64)
+            tag:
+        """
+
+        global logger
+        logger = ColorLogger(logger_name=f'[{tag}] YoutubeSqliteDatastore', color='red')
+        super().__init__(tag=tag)
+        self.db_path = config['db_path']
+        self.busy_timeout = float(config['busy_timeout']) if 'busy_timeout' in config else 30
+        self.synchronous = config['synchronous'] if 'synchronous' in config else 'NORMAL'
+        self.statement_cache_size = int(config['statement_cache_size']) \
+            if 'statement_cache_size' in config else 64
+        self._local = threading.local()
+        self.create_tables_if_not_exist()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode, the transactions are started explicitly by `transaction`
+            connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                         isolation_level=None,
+                                         cached_statements=self.statement_cache_size)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _to_qmark(operation: str) -> str:
+        return operation.replace('%s', '?')
+
+    def create_table(self, table: str, schema: str) -> None:
+        self.execute(f"CREATE TABLE IF NOT EXISTS {table} ({schema})")
+
+    def drop_table(self, table: str) -> None:
+        self.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def create_tables_if_not_exist(self) -> None:
+        self.create_table(table=self.CHANNEL_TABLE, schema=self.CHANNELS_SCHEMA)
+        self.create_table(table=self.COMMENTS_TABLE, schema=self.COMMENTS_SCHEMA)
+        for name, columns in self.COMMENTS_INDEXES.items():
+            self.execute(f"CREATE INDEX IF NOT EXISTS {self.COMMENTS_TABLE}_{name} "
+                         f"ON {self.COMMENTS_TABLE} ({columns})")
+
+    def execute(self, operation: str, params: Sequence = (), prepared: bool = True) -> List[Tuple]:
+        """
+        Executes a statement on the connection of the calling thread.
+        Args:
+            operation: The SQL with a `%s` placeholder for every parameter
+            params: The values bound to the placeholders
+            prepared: Unused, sqlite3 caches the statements of every connection by itself
+
+        Returns:
+            The rows of the result set (empty if the statement returns no rows)
+        """
+
+        logger.debug("Executing: %s %s" % (operation, tuple(params)))
+        return self._connection.execute(self._to_qmark(operation), tuple(params)).fetchall()
+
+    def stream(self, operation: str, params: Sequence = (), batch_size: int = 1000,
+               prepared: bool = True) -> Iterator[Tuple]:
+        """ Like `execute` but yields the rows as they are read, `batch_size` at a time. """
+
+        logger.debug("Streaming: %s %s" % (operation, tuple(params)))
+        cursor = self._connection.execute(self._to_qmark(operation), tuple(params))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """ Runs the statements executed in the context in a single transaction, which is
+        committed on exit or rolled back on an exception. The write lock is taken when the
+        transaction starts, so it never fails half-way because of a concurrent writer. """
+
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except Exception:
+            try:
+                connection.execute("ROLLBACK")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to roll back the transaction: {e}")
+            raise
+
+    def _to_db_time(self, value: str) -> Union[str, datetime]:
+        parsed = super()._to_db_time(value)
+        if isinstance(parsed, datetime):
+            return parsed.isoformat(sep=' ', timespec='microseconds')
+        return parsed
+
+    def _update_from_query(self, derived_table: str, cols: List[str]) -> str:
+        set_data = ', '.join(f'{col}=COALESCE(u.{col}, c.{col})' for col in cols)
+        return f"UPDATE {self.COMMENTS_TABLE} AS c SET {set_data} " \
+               f"FROM ({derived_table}) AS u WHERE c.video_link=u.video_link"
+
+    def close(self) -> None:
+        """ Closes the connection of the calling thread. """
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            connection.close()